@@ -0,0 +1,29 @@
+-- Índices secundários para listagem, filtros e buscas reversas
+
+CREATE INDEX IF NOT EXISTS idx_projetos_data_abertura
+ON projetos (data_abertura, id_externo);
+
+CREATE INDEX IF NOT EXISTS idx_projetos_data_ultima_tramitacao
+ON projetos (data_ultima_tramitacao);
+
+CREATE INDEX IF NOT EXISTS idx_projetos_situacao
+ON projetos (situacao_tramitacao, data_abertura);
+
+CREATE INDEX IF NOT EXISTS idx_projetos_tipo
+ON projetos (tipo, data_abertura);
+
+-- A chave primária (projeto_id, autor_id) não serve para "projetos do autor"
+CREATE INDEX IF NOT EXISTS idx_projetos_autores_autor
+ON projetos_autores (autor_id, projeto_id);
+
+CREATE INDEX IF NOT EXISTS idx_analise_mudancas_analise
+ON analise_mudancas (analise_id);
+
+CREATE INDEX IF NOT EXISTS idx_analise_justificativas_analise
+ON analise_justificativas (analise_id);
+
+CREATE INDEX IF NOT EXISTS idx_analise_categorias_analise
+ON analise_categorias (analise_id, nome_categoria);
+
+CREATE INDEX IF NOT EXISTS idx_analise_categorias_nome
+ON analise_categorias (nome_categoria, analise_id);
@@ -0,0 +1,217 @@
+-- Modelo de leitura desnormalizado para a listagem e os filtros do site.
+-- As tabelas são WITHOUT ROWID com chave (data_abertura, id_externo): a
+-- listagem paginada e o filtro por categoria percorrem a própria chave, sem
+-- ordenação nem consultas às tabelas normalizadas.
+
+CREATE VIEW IF NOT EXISTS vw_projetos_listagem AS
+SELECT
+    COALESCE(p.data_abertura, '') AS data_abertura, -- '' fica no fim da ordem decrescente
+    p.id_externo,
+    p.id AS projeto_id,
+    COALESCE(p.tipo, 'PL') || ' ' || COALESCE(p.numero_projeto, p.numero_processo, '?') AS id_pl,
+    p.tipo,
+    p.situacao_tramitacao,
+    p.data_ultima_tramitacao,
+    a.titulo_simplificado,
+    (
+        SELECT json_group_array(nome) FROM (
+            SELECT au.nome || COALESCE(' (' || au.partido || ')', '') AS nome
+            FROM projetos_autores pa
+            JOIN autores au ON au.id = pa.autor_id
+            WHERE pa.projeto_id = p.id
+            ORDER BY au.nome
+        )
+    ) AS autores,
+    (
+        SELECT json_group_array(nome_categoria) FROM (
+            SELECT DISTINCT nome_categoria FROM analise_categorias
+            WHERE analise_id = a.id
+            ORDER BY nome_categoria
+        )
+    ) AS categorias
+FROM projetos p
+LEFT JOIN analises_ia a ON a.projeto_id = p.id;
+
+CREATE TABLE IF NOT EXISTS projetos_listagem (
+    data_abertura DATE NOT NULL,
+    id_externo INTEGER NOT NULL,
+    projeto_id INTEGER NOT NULL,
+    id_pl TEXT NOT NULL,    -- Ex: "PLL 314/25"
+    tipo TEXT,
+    situacao_tramitacao TEXT,
+    data_ultima_tramitacao DATETIME,
+    titulo_simplificado TEXT,
+    autores JSON NOT NULL,  -- ["Nome (PARTIDO)", ...]
+    categorias JSON NOT NULL,
+    PRIMARY KEY (data_abertura, id_externo)
+) WITHOUT ROWID;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_projetos_listagem_projeto
+ON projetos_listagem (projeto_id);
+
+CREATE INDEX IF NOT EXISTS idx_projetos_listagem_situacao
+ON projetos_listagem (situacao_tramitacao, data_abertura, id_externo);
+
+CREATE INDEX IF NOT EXISTS idx_projetos_listagem_tipo
+ON projetos_listagem (tipo, data_abertura, id_externo);
+
+-- Uma linha por (categoria, projeto), na ordem da listagem
+CREATE TABLE IF NOT EXISTS projetos_listagem_categorias (
+    categoria TEXT NOT NULL,
+    data_abertura DATE NOT NULL,
+    id_externo INTEGER NOT NULL,
+    projeto_id INTEGER NOT NULL,
+    PRIMARY KEY (categoria, data_abertura, id_externo)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_projetos_listagem_categorias_projeto
+ON projetos_listagem_categorias (projeto_id);
+
+-- Triggers: toda escrita nas tabelas de origem recalcula a linha do projeto
+
+CREATE TRIGGER IF NOT EXISTS listagem_projetos_insert
+AFTER INSERT ON projetos
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = new.id;
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = new.id;
+    DELETE FROM projetos_listagem_categorias WHERE projeto_id = new.id;
+    INSERT OR IGNORE INTO projetos_listagem_categorias
+    SELECT c.nome_categoria, l.data_abertura, l.id_externo, l.projeto_id
+    FROM projetos_listagem l
+    JOIN analises_ia a ON a.projeto_id = l.projeto_id
+    JOIN analise_categorias c ON c.analise_id = a.id
+    WHERE l.projeto_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_projetos_update
+AFTER UPDATE OF
+    id_externo, tipo, numero_projeto, numero_processo, data_abertura,
+    data_ultima_tramitacao, situacao_tramitacao
+ON projetos
+-- O upsert do writer reescreve as mesmas colunas a cada sincronização
+WHEN old.id_externo IS NOT new.id_externo
+    OR old.tipo IS NOT new.tipo
+    OR old.numero_projeto IS NOT new.numero_projeto
+    OR old.numero_processo IS NOT new.numero_processo
+    OR old.data_abertura IS NOT new.data_abertura
+    OR old.data_ultima_tramitacao IS NOT new.data_ultima_tramitacao
+    OR old.situacao_tramitacao IS NOT new.situacao_tramitacao
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = new.id;
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = new.id;
+    DELETE FROM projetos_listagem_categorias WHERE projeto_id = new.id;
+    INSERT OR IGNORE INTO projetos_listagem_categorias
+    SELECT c.nome_categoria, l.data_abertura, l.id_externo, l.projeto_id
+    FROM projetos_listagem l
+    JOIN analises_ia a ON a.projeto_id = l.projeto_id
+    JOIN analise_categorias c ON c.analise_id = a.id
+    WHERE l.projeto_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_projetos_delete
+AFTER DELETE ON projetos
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = old.id;
+    DELETE FROM projetos_listagem_categorias WHERE projeto_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_autores_insert
+AFTER INSERT ON projetos_autores
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = new.projeto_id;
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = new.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_autores_delete
+AFTER DELETE ON projetos_autores
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = old.projeto_id;
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = old.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_autores_update
+AFTER UPDATE OF nome, partido ON autores
+WHEN old.nome IS NOT new.nome OR old.partido IS NOT new.partido
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id IN (
+        SELECT projeto_id FROM projetos_autores WHERE autor_id = new.id
+    );
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id IN (
+        SELECT projeto_id FROM projetos_autores WHERE autor_id = new.id
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_analises_insert
+AFTER INSERT ON analises_ia
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = new.projeto_id;
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = new.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_analises_update
+AFTER UPDATE OF titulo_simplificado ON analises_ia
+WHEN old.titulo_simplificado IS NOT new.titulo_simplificado
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = new.projeto_id;
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = new.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_categorias_insert
+AFTER INSERT ON analise_categorias
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = new.analise_id);
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = new.analise_id);
+    DELETE FROM projetos_listagem_categorias WHERE projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = new.analise_id);
+    INSERT OR IGNORE INTO projetos_listagem_categorias
+    SELECT c.nome_categoria, l.data_abertura, l.id_externo, l.projeto_id
+    FROM projetos_listagem l
+    JOIN analises_ia a ON a.projeto_id = l.projeto_id
+    JOIN analise_categorias c ON c.analise_id = a.id
+    WHERE l.projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = new.analise_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS listagem_categorias_delete
+AFTER DELETE ON analise_categorias
+BEGIN
+    DELETE FROM projetos_listagem WHERE projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = old.analise_id);
+    INSERT INTO projetos_listagem
+    SELECT * FROM vw_projetos_listagem WHERE projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = old.analise_id);
+    DELETE FROM projetos_listagem_categorias WHERE projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = old.analise_id);
+    INSERT OR IGNORE INTO projetos_listagem_categorias
+    SELECT c.nome_categoria, l.data_abertura, l.id_externo, l.projeto_id
+    FROM projetos_listagem l
+    JOIN analises_ia a ON a.projeto_id = l.projeto_id
+    JOIN analise_categorias c ON c.analise_id = a.id
+    WHERE l.projeto_id = (SELECT projeto_id FROM analises_ia WHERE id = old.analise_id);
+END;
+
+-- @backfill
+-- Carga inicial, em lotes de :batch_size projetos
+
+INSERT INTO projetos_listagem
+SELECT * FROM vw_projetos_listagem
+WHERE projeto_id IN (
+    SELECT id FROM projetos
+    WHERE id NOT IN (SELECT projeto_id FROM projetos_listagem)
+    LIMIT :batch_size
+);
+
+INSERT OR IGNORE INTO projetos_listagem_categorias
+SELECT c.nome_categoria, l.data_abertura, l.id_externo, l.projeto_id
+FROM projetos_listagem l
+JOIN analises_ia a ON a.projeto_id = l.projeto_id
+JOIN analise_categorias c ON c.analise_id = a.id
+WHERE l.projeto_id IN (
+    SELECT a2.projeto_id FROM analises_ia a2
+    WHERE EXISTS (SELECT 1 FROM analise_categorias c2 WHERE c2.analise_id = a2.id)
+      AND a2.projeto_id NOT IN (SELECT projeto_id FROM projetos_listagem_categorias)
+    LIMIT :batch_size
+);
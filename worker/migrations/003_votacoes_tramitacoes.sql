@@ -0,0 +1,28 @@
+-- Votações e histórico de tramitação extraídos das abas da página do projeto.
+-- A chave única de tramitacoes também atende ao MAX(data_chegada) por projeto
+-- que a coleta incremental usa para pedir só as movimentações novas.
+
+CREATE TABLE IF NOT EXISTS votacoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    projeto_id INTEGER NOT NULL,
+    data DATE NOT NULL,
+    titulo TEXT NOT NULL,
+    votos_sim INTEGER,
+    votos_nao INTEGER,
+    abstencoes INTEGER,
+    resultado TEXT NOT NULL,
+    detalhes_url TEXT,
+    UNIQUE (projeto_id, data, titulo),
+    FOREIGN KEY(projeto_id) REFERENCES projetos(id)
+);
+
+CREATE TABLE IF NOT EXISTS tramitacoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    projeto_id INTEGER NOT NULL,
+    setor TEXT NOT NULL,
+    data_chegada DATE NOT NULL,
+    data_saida DATE,
+    situacao TEXT NOT NULL,
+    UNIQUE (projeto_id, data_chegada, setor),
+    FOREIGN KEY(projeto_id) REFERENCES projetos(id)
+);
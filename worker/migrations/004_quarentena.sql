@@ -0,0 +1,13 @@
+-- Linhas rejeitadas na validação (projetos coletados, respostas do modelo),
+-- guardadas com os erros em vez de gravadas no banco. Só a última rejeição de
+-- cada chave fica; uma gravação válida posterior a remove.
+
+CREATE TABLE IF NOT EXISTS quarentena (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    origem TEXT NOT NULL, -- 'projeto' (chave: id_externo) ou 'analise' (chave: projeto_id)
+    chave TEXT NOT NULL,
+    dados JSON NOT NULL,
+    erros JSON NOT NULL,
+    data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (origem, chave)
+);
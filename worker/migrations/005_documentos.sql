@@ -0,0 +1,21 @@
+-- Documentos anexados a cada projeto. O arquivo fica no repositório de blobs,
+-- endereçado pelo SHA-256 do conteúdo: documentos idênticos (no mesmo ou em
+-- projetos diferentes) ocupam um só arquivo. sha256 fica NULL até o download.
+
+CREATE TABLE IF NOT EXISTS documentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    projeto_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    nome TEXT,
+    principal BOOLEAN NOT NULL DEFAULT 0,
+    sha256 TEXT,
+    tamanho INTEGER,
+    paginas INTEGER,
+    data_download TIMESTAMP,
+    UNIQUE (projeto_id, url),
+    FOREIGN KEY(projeto_id) REFERENCES projetos(id)
+);
+
+-- Downloads reaproveitam o blob já conhecido de uma URL
+CREATE INDEX IF NOT EXISTS idx_documentos_url ON documentos (url);
+CREATE INDEX IF NOT EXISTS idx_documentos_sha256 ON documentos (sha256);
@@ -0,0 +1,33 @@
+-- Índice de similaridade entre os textos dos projetos (MinHash + LSH). Cada
+-- assinatura é dividida em bandas; projetos com alguma banda igual são
+-- candidatos, comparados pela assinatura inteira. Os pares acima do limiar de
+-- projetos relacionados ficam em projetos_similares, nos dois sentidos.
+
+CREATE TABLE IF NOT EXISTS assinaturas_minhash (
+    projeto_id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL, -- PDF cujo texto foi assinado
+    assinatura BLOB NOT NULL,
+    FOREIGN KEY(projeto_id) REFERENCES projetos(id)
+);
+
+CREATE TABLE IF NOT EXISTS bandas_minhash (
+    banda INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    projeto_id INTEGER NOT NULL,
+    PRIMARY KEY (banda, hash, projeto_id),
+    FOREIGN KEY(projeto_id) REFERENCES projetos(id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_bandas_minhash_projeto ON bandas_minhash (projeto_id);
+
+CREATE TABLE IF NOT EXISTS projetos_similares (
+    projeto_id INTEGER NOT NULL,
+    similar_id INTEGER NOT NULL,
+    similaridade REAL NOT NULL, -- Jaccard estimado entre os textos
+    PRIMARY KEY (projeto_id, similar_id),
+    FOREIGN KEY(projeto_id) REFERENCES projetos(id),
+    FOREIGN KEY(similar_id) REFERENCES projetos(id)
+) WITHOUT ROWID;
+
+-- Análise copiada de um projeto quase idêntico, em vez de gerada pelo modelo
+ALTER TABLE analises_ia ADD COLUMN reaproveitada_de INTEGER REFERENCES analises_ia(id);
@@ -0,0 +1,17 @@
+-- Fila de tarefas do pipeline (discover → fetch → download → extract → analyze).
+-- Tarefas são arrendadas (lease) em vez de removidas: a de um worker que morre
+-- volta a ficar disponível quando o lease expira.
+
+CREATE TABLE IF NOT EXISTS tarefas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    etapa TEXT NOT NULL,
+    chave TEXT NOT NULL, -- URL, caminho do PDF, id do projeto...
+    payload JSON,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending, running, done, failed
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    disponivel_em REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0), -- Unix time, para backoff
+    lease_ate REAL, -- Unix time em que expira o lease do worker
+    ultimo_erro TEXT,
+    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (etapa, chave)
+);
@@ -0,0 +1,10 @@
+-- Texto extraído dos PDFs, por página, chaveado pelo SHA-256 do arquivo: cópias
+-- renomeadas do mesmo documento reaproveitam o texto, e um documento alterado
+-- nunca lê o texto antigo.
+
+CREATE TABLE IF NOT EXISTS textos_pdf (
+    sha256 TEXT NOT NULL,
+    pagina INTEGER NOT NULL, -- Começa em 1
+    texto BLOB NOT NULL,     -- UTF-8 comprimido com zlib (ver descomprimir_texto)
+    PRIMARY KEY (sha256, pagina)
+) WITHOUT ROWID;
@@ -0,0 +1,14 @@
+-- Cache das respostas do LLM, chaveado por (texto, modelo, prompt, schema):
+-- mudar qualquer um dos quatro invalida a entrada.
+
+CREATE TABLE IF NOT EXISTS cache_llm (
+    chave TEXT PRIMARY KEY, -- SHA-256 dos quatro componentes abaixo
+    texto_sha256 TEXT NOT NULL,
+    modelo TEXT NOT NULL,
+    prompt_sha256 TEXT NOT NULL,
+    schema_sha256 TEXT NOT NULL,
+    resultado JSON NOT NULL,
+    acessos INTEGER NOT NULL DEFAULT 0,
+    ultimo_acesso REAL NOT NULL, -- Unix time, para eviction LRU
+    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,19 @@
+-- Onde cada trecho citado pela IA aparece no texto extraído do PDF, para o
+-- visualizador destacar as citações na página.
+
+CREATE TABLE IF NOT EXISTS trechos_localizacao (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analise_id INTEGER NOT NULL,
+    origem TEXT NOT NULL,   -- mudanca, justificativa, categoria
+    item_id INTEGER NOT NULL, -- id na tabela analise_<origem>
+    trecho_indice INTEGER NOT NULL, -- Posição em trechos_originais
+    encontrado BOOLEAN NOT NULL, -- 0: trecho não existe no PDF (alucinação)
+    pagina INTEGER,         -- Começa em 1; uma linha por página se o trecho atravessa páginas
+    inicio INTEGER,         -- Offsets no texto da página (textos_pdf)
+    fim INTEGER,
+    bbox JSON,              -- [[x0, y0, x1, y1], ...] por linha, em pontos (origem no topo)
+    FOREIGN KEY(analise_id) REFERENCES analises_ia(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_trechos_localizacao_analise
+ON trechos_localizacao (analise_id, pagina);
@@ -0,0 +1,74 @@
+-- Busca textual (FTS5), uma linha por projeto (rowid = projetos.id). Ementa,
+-- título e resumo seguem as tabelas por triggers; o texto do PDF principal é
+-- indexado pelo worker depois da extração.
+-- remove_diacritics 2 faz "saude" encontrar "Saúde"; prefix acelera buscas por prefixo.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS busca_projetos USING fts5(
+    ementa,
+    titulo,  -- analises_ia.titulo_simplificado
+    resumo,  -- analises_ia.resumo_simples
+    texto,   -- Texto do PDF principal, indexado pelo worker
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS busca_projetos_insert AFTER INSERT ON projetos
+BEGIN
+    INSERT OR REPLACE INTO busca_projetos (rowid, ementa) VALUES (new.id, new.ementa);
+END;
+
+CREATE TRIGGER IF NOT EXISTS busca_projetos_update AFTER UPDATE OF ementa ON projetos
+BEGIN
+    UPDATE busca_projetos SET ementa = new.ementa WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS busca_projetos_delete AFTER DELETE ON projetos
+BEGIN
+    DELETE FROM busca_projetos WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS busca_analises_insert AFTER INSERT ON analises_ia
+BEGIN
+    UPDATE busca_projetos
+    SET titulo = new.titulo_simplificado, resumo = new.resumo_simples
+    WHERE rowid = new.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS busca_analises_update
+AFTER UPDATE OF titulo_simplificado, resumo_simples ON analises_ia
+BEGIN
+    UPDATE busca_projetos
+    SET titulo = new.titulo_simplificado, resumo = new.resumo_simples
+    WHERE rowid = new.projeto_id;
+END;
+
+-- @backfill
+-- Projetos gravados antes do índice (ou antes dos triggers), em lotes de
+-- :batch_size
+
+INSERT INTO busca_projetos (rowid, ementa, titulo, resumo)
+SELECT p.id, p.ementa, a.titulo_simplificado, a.resumo_simples
+FROM projetos p
+LEFT JOIN analises_ia a ON a.projeto_id = p.id
+WHERE NOT EXISTS (SELECT 1 FROM busca_projetos b WHERE b.rowid = p.id)
+LIMIT :batch_size;
+
+-- Texto do PDF principal já extraído, com as páginas separadas por form feed
+-- como em text_cache.join_pages
+UPDATE busca_projetos SET texto = (
+    SELECT group_concat(descomprimir_texto(texto), char(12)) FROM (
+        SELECT t.texto FROM documentos d
+        JOIN textos_pdf t ON t.sha256 = d.sha256
+        WHERE d.projeto_id = busca_projetos.rowid AND d.principal
+        ORDER BY t.pagina
+    )
+)
+WHERE rowid IN (
+    SELECT d.projeto_id FROM documentos d
+    WHERE d.principal
+      AND EXISTS (SELECT 1 FROM textos_pdf t WHERE t.sha256 = d.sha256)
+      AND EXISTS (
+        SELECT 1 FROM busca_projetos b WHERE b.rowid = d.projeto_id AND b.texto IS NULL
+      )
+    LIMIT :batch_size
+);
@@ -0,0 +1,201 @@
+-- Projetos alterados desde a última exportação estática (export.py). Toda
+-- escrita que muda os arquivos de um projeto grava nele uma versão maior que
+-- todas as anteriores; o manifesto da exportação guarda a última versão
+-- exportada, e a próxima só reconstrói os projetos acima dela.
+
+CREATE TABLE IF NOT EXISTS projetos_alterados (
+    projeto_id INTEGER PRIMARY KEY,
+    versao INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_projetos_alterados_versao ON projetos_alterados (versao);
+
+-- Inserir um projeto nesta view o marca com a próxima versão
+CREATE VIEW IF NOT EXISTS marcar_alterado AS SELECT NULL AS projeto_id;
+
+CREATE TRIGGER IF NOT EXISTS marcar_alterado_insert
+INSTEAD OF INSERT ON marcar_alterado
+WHEN new.projeto_id IS NOT NULL
+BEGIN
+    INSERT INTO projetos_alterados (projeto_id, versao)
+    VALUES (new.projeto_id, (SELECT COALESCE(MAX(versao), 0) + 1 FROM projetos_alterados))
+    ON CONFLICT (projeto_id) DO UPDATE SET versao = excluded.versao;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_projetos_insert
+AFTER INSERT ON projetos
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_projetos_update
+AFTER UPDATE ON projetos
+-- O upsert do writer reescreve as mesmas colunas a cada sincronização
+WHEN old.tipo IS NOT new.tipo
+    OR old.numero_projeto IS NOT new.numero_projeto
+    OR old.numero_processo IS NOT new.numero_processo
+    OR old.ementa IS NOT new.ementa
+    OR old.data_abertura IS NOT new.data_abertura
+    OR old.data_ultima_tramitacao IS NOT new.data_ultima_tramitacao
+    OR old.situacao_tramitacao IS NOT new.situacao_tramitacao
+    OR old.situacao_plenaria IS NOT new.situacao_plenaria
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_projetos_delete
+AFTER DELETE ON projetos
+BEGIN
+    DELETE FROM projetos_alterados WHERE projeto_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_autores_insert
+AFTER INSERT ON projetos_autores
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_autores_delete
+AFTER DELETE ON projetos_autores
+BEGIN
+    INSERT INTO marcar_alterado VALUES (old.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_autores_update
+AFTER UPDATE OF nome, partido ON autores
+WHEN old.nome IS NOT new.nome OR old.partido IS NOT new.partido
+BEGIN
+    INSERT INTO marcar_alterado
+    SELECT projeto_id FROM projetos_autores WHERE autor_id = new.id;
+END;
+
+-- O título da análise também aparece nos relacionados de outros projetos
+
+CREATE TRIGGER IF NOT EXISTS alterados_analises_insert
+AFTER INSERT ON analises_ia
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+    INSERT INTO marcar_alterado
+    SELECT projeto_id FROM projetos_similares WHERE similar_id = new.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_analises_update
+AFTER UPDATE ON analises_ia
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+    INSERT INTO marcar_alterado
+    SELECT projeto_id FROM projetos_similares WHERE similar_id = new.projeto_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_analises_delete
+AFTER DELETE ON analises_ia
+BEGIN
+    INSERT INTO marcar_alterado VALUES (old.projeto_id);
+    INSERT INTO marcar_alterado
+    SELECT projeto_id FROM projetos_similares WHERE similar_id = old.projeto_id;
+END;
+
+-- Os itens e as localizações dos trechos são apagados e regravados a cada
+-- análise, nunca atualizados
+
+CREATE TRIGGER IF NOT EXISTS alterados_mudancas_insert
+AFTER INSERT ON analise_mudancas
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = new.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_mudancas_delete
+AFTER DELETE ON analise_mudancas
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = old.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_justificativas_insert
+AFTER INSERT ON analise_justificativas
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = new.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_justificativas_delete
+AFTER DELETE ON analise_justificativas
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = old.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_categorias_insert
+AFTER INSERT ON analise_categorias
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = new.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_categorias_delete
+AFTER DELETE ON analise_categorias
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = old.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_trechos_insert
+AFTER INSERT ON trechos_localizacao
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = new.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_trechos_delete
+AFTER DELETE ON trechos_localizacao
+BEGIN
+    INSERT INTO marcar_alterado SELECT projeto_id FROM analises_ia WHERE id = old.analise_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_tramitacoes_insert
+AFTER INSERT ON tramitacoes
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_tramitacoes_update
+AFTER UPDATE ON tramitacoes
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_tramitacoes_delete
+AFTER DELETE ON tramitacoes
+BEGIN
+    INSERT INTO marcar_alterado VALUES (old.projeto_id);
+END;
+
+-- Votações e similares são regravados com INSERT OR REPLACE, que dispara o
+-- trigger de inserção
+
+CREATE TRIGGER IF NOT EXISTS alterados_votacoes_insert
+AFTER INSERT ON votacoes
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_votacoes_delete
+AFTER DELETE ON votacoes
+BEGIN
+    INSERT INTO marcar_alterado VALUES (old.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_similares_insert
+AFTER INSERT ON projetos_similares
+BEGIN
+    INSERT INTO marcar_alterado VALUES (new.projeto_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS alterados_similares_delete
+AFTER DELETE ON projetos_similares
+BEGIN
+    INSERT INTO marcar_alterado VALUES (old.projeto_id);
+END;
+
+-- @backfill
+-- Projetos gravados antes dos triggers entram na versão 1, em lotes de
+-- :batch_size (a primeira exportação com manifesto novo já é completa)
+
+INSERT INTO projetos_alterados (projeto_id, versao)
+SELECT id, 1 FROM projetos
+WHERE id NOT IN (SELECT projeto_id FROM projetos_alterados)
+LIMIT :batch_size;
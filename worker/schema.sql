@@ -66,4 +66,4 @@ CREATE TABLE IF NOT EXISTS analise_categorias (
     nome_categoria TEXT NOT NULL, -- "Saúde", "Educação", etc.
     trechos_originais JSON NOT NULL,
     FOREIGN KEY(analise_id) REFERENCES analises_ia(id)
-);
\ No newline at end of file
+);
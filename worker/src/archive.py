@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import httpx
+
+ARCHIVE_DIR = Path('data/arquivo')
+SEGMENT_SUFFIX = '.arq'
+# Per record: metadata length, body length; then the JSON metadata and the
+# zlib-compressed body
+RECORD_HEADER = struct.Struct('>II')
+# Describe the original transfer, not the decompressed body kept here
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'set-cookie'}
+
+logger = logging.getLogger(__name__)
+
+
+def archive_key(url: httpx.URL | str) -> str:
+    """The URL a response is archived under, without the `_` cache-buster."""
+    return str(httpx.URL(url).copy_remove_param('_'))
+
+
+class ResponseArchive:
+    """Append-only, compressed archive of the responses of a crawl.
+
+    Each run (process) appends to its own segment file, one record per
+    response, so the archive is never rewritten and a crash only loses the
+    record being written. Bodies are compressed one by one, so a record can
+    be read without decompressing the rest of the segment.
+    """
+
+    def __init__(self, root: Path = ARCHIVE_DIR) -> None:
+        self.root = root
+        self._file: BinaryIO | None = None
+        self._lock = threading.Lock()
+        # URLs with an archived response, from this or previous runs; read on
+        # the first response revalidated from the HTTP cache
+        self._urls: set[str] | None = None
+
+    def _archived_urls(self) -> set[str]:
+        if self._urls is None:
+            self._urls = {
+                record.meta['url']
+                for path in sorted(self.root.glob(f'*{SEGMENT_SUFFIX}'))
+                for record in read_segment(path)
+                if 'status' in record.meta
+            }
+        return self._urls
+
+    def _append(self, meta: dict[str, Any], body: bytes = b'') -> None:
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode()
+        body = zlib.compress(body) if body else b''
+        record = RECORD_HEADER.pack(len(meta_bytes), len(body)) + meta_bytes + body
+        with self._lock:
+            if self._urls is not None and 'status' in meta:
+                self._urls.add(meta['url'])
+            if not self._file:
+                self.root.mkdir(parents=True, exist_ok=True)
+                name = f'{datetime.now(UTC):%Y%m%dT%H%M%S}-{os.getpid()}{SEGMENT_SUFFIX}'
+                self._file = (self.root / name).open('ab')
+            self._file.write(record)
+            self._file.flush()
+
+    def record(self, resp: httpx.Response) -> None:
+        """Archive a response (read) with its status, headers and body.
+
+        A response served from the HTTP cache after a 304 is only archived if
+        its URL isn't yet, so recording with a warm cache still captures every
+        page.
+        """
+        key = archive_key(resp.request.url)
+        if resp.extensions.get('not_modified'):
+            with self._lock:
+                if key in self._archived_urls():
+                    return
+        self._append(
+            {
+                'url': key,
+                'status': resp.status_code,
+                'headers': [
+                    (name, value)
+                    for name, value in resp.headers.multi_items()
+                    if name not in DROPPED_HEADERS
+                ],
+                'data': time.time(),
+            },
+            resp.content,
+        )
+
+    def record_blob(self, url: str, sha256: str, size: int | None, pages: int | None) -> None:
+        """Archive which blob a file URL held; its body is in the blob store."""
+        self._append(
+            {
+                'url': archive_key(url),
+                'blob': sha256,
+                'tamanho': size,
+                'paginas': pages,
+                'data': time.time(),
+            },
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+@dataclass
+class ArchivedRecord:
+    meta: dict[str, Any]
+    path: Path
+    offset: int
+    length: int
+
+
+def read_segment(path: Path) -> Iterator[ArchivedRecord]:
+    """The records of a segment, without their bodies; stops at a truncated one."""
+    size = path.stat().st_size
+    with path.open('rb') as f:
+        while header := f.read(RECORD_HEADER.size):
+            meta_size, body_size = (
+                RECORD_HEADER.unpack(header) if len(header) == RECORD_HEADER.size else (0, 0)
+            )
+            offset = f.tell() + meta_size
+            if not meta_size or offset + body_size > size:
+                logger.warning('Registro truncado no fim de %s; ignorado.', path)
+                return
+            meta = json.loads(f.read(meta_size))
+            f.seek(body_size, os.SEEK_CUR)
+            yield ArchivedRecord(meta, path, offset, body_size)
+
+
+class ArchiveIndex:
+    """The latest archived record of each URL, with bodies read on demand."""
+
+    def __init__(self, root: Path = ARCHIVE_DIR) -> None:
+        self.root = root
+        self.records: dict[str, ArchivedRecord] = {}
+        # Segment names start with their UTC start time, so later runs win
+        for path in sorted(root.glob(f'*{SEGMENT_SUFFIX}')):
+            for record in read_segment(path):
+                self.records[record.meta['url']] = record
+        logger.info('%d URLs no arquivo %s.', len(self.records), root)
+
+    def body(self, record: ArchivedRecord) -> bytes:
+        if not record.length:
+            return b''
+        with record.path.open('rb') as f:
+            f.seek(record.offset)
+            return zlib.decompress(f.read(record.length))
+
+    def response(self, request: httpx.Request) -> httpx.Response:
+        """The archived response to a request; a 404 if it was never archived."""
+        record = self.records.get(archive_key(request.url))
+        if not record or 'status' not in record.meta:
+            return httpx.Response(
+                httpx.codes.NOT_FOUND,
+                text=f'{request.url} não está no arquivo',
+                request=request,
+            )
+        return httpx.Response(
+            record.meta['status'],
+            headers=record.meta['headers'],
+            content=self.body(record),
+            request=request,
+        )
+
+    def blob(self, url: str) -> tuple[str, int | None, int | None] | None:
+        """(sha256, size, pages) archived for a file URL."""
+        record = self.records.get(archive_key(url))
+        if not record or 'blob' not in record.meta:
+            return None
+        return record.meta['blob'], record.meta['tamanho'], record.meta['paginas']
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Serves requests from an `ArchiveIndex` instead of the network."""
+
+    def __init__(self, index: ArchiveIndex) -> None:
+        self.index = index
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.index.response(request)
@@ -0,0 +1,482 @@
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+from collections import Counter
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import metrics
+from chunking import MAX_CHUNK_TOKENS, chunk_prompts, merge_results
+from db import connect, init_db
+from evidence import index_analysis
+from ingest import ingest_analysis, validate_response
+from llm import (
+    GeminiBackend,
+    HttpBackend,
+    LLMBackend,
+    RateLimitError,
+    estimate_tokens,
+)
+from llm_cache import LLMCache
+from metrics import RETRIES, STAGE_SECONDS
+from parser import LEGISLATION_SCHEMA, SYSTEM_PROMPT
+from ratelimit import AdaptiveLimiter, TokenBucket
+from search import index_text
+from similarity import REUSE_THRESHOLD, index_project, reusable_analysis
+from text_cache import PageTextCache, extract_pages, join_pages
+
+DB_FILE = Path('voz_civica.db')
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 2.0
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+class BatchAnalyzer:
+    """Runs many analyses concurrently against an `LLMBackend`.
+
+    Concurrency starts at `concurrency` and adapts between 1 and
+    `max_concurrency` as the backend throttles; optional requests/tokens per
+    minute budgets keep the batch under the account quota in the first place.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        *,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        rpm: float | None = None,
+        tpm: float | None = None,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = BACKOFF_SECONDS,
+        text_cache: PageTextCache | None = None,
+        llm_cache: LLMCache | None = None,
+        max_chunk_tokens: int = MAX_CHUNK_TOKENS,
+    ) -> None:
+        self.backend = backend
+        self.limiter = AdaptiveLimiter(concurrency, max_concurrency)
+        self.requests = TokenBucket(rpm / 60, rpm) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, tpm) if tpm else None
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.text_cache = text_cache
+        self.llm_cache = llm_cache
+        self.max_chunk_tokens = max_chunk_tokens
+        # Bounds the documents held in memory while waiting for a slot
+        self._in_flight = asyncio.Semaphore(2 * max_concurrency)
+
+    async def _generate(self, text: str) -> dict[str, Any]:
+        tokens = estimate_tokens(text)
+        for attempt in range(1, self.max_attempts + 1):
+            if self.requests:
+                await self.requests.acquire()
+            if self.tokens:
+                await self.tokens.acquire(tokens)
+
+            async with self.limiter:
+                try:
+                    with STAGE_SECONDS.time(stage='generate'):
+                        result = await self.backend.generate(text)
+                except RateLimitError as e:
+                    if attempt == self.max_attempts:
+                        raise
+                    RETRIES.inc(stage='generate')
+                    self.limiter.throttle()
+                    delay = e.retry_after or self.backoff * 2 ** (attempt - 1)
+                    logger.warning(
+                        'Limite de requisições atingido; concorrência %d, nova tentativa em %.1fs',
+                        self.limiter.limit,
+                        delay,
+                    )
+                except Exception:
+                    if attempt == self.max_attempts:
+                        raise
+                    RETRIES.inc(stage='generate')
+                    delay = self.backoff * 2 ** (attempt - 1)
+                    logger.warning(
+                        'Falha na tentativa %d; nova tentativa em %.1fs',
+                        attempt,
+                        delay,
+                        exc_info=True,
+                    )
+                else:
+                    self.limiter.success()
+                    return result
+            await asyncio.sleep(delay)
+        raise AssertionError('unreachable')
+
+    async def analyze(self, text: str, *, use_cache: bool = True) -> dict[str, Any]:
+        """Analyze a document, mapping its chunks concurrently when it is large."""
+        chunks = chunk_prompts(text, self.max_chunk_tokens)
+        if len(chunks) == 1:
+            return await self._analyze_chunk(text, use_cache=use_cache)
+
+        logger.info('Documento dividido em %d partes.', len(chunks))
+        results = await asyncio.gather(
+            *(self._analyze_chunk(chunk, use_cache=use_cache) for chunk in chunks),
+        )
+        return merge_results(results)
+
+    async def _analyze_chunk(self, text: str, *, use_cache: bool = True) -> dict[str, Any]:
+        use_cache = use_cache and self.llm_cache is not None
+        if use_cache and (
+            cached := await asyncio.to_thread(
+                self.llm_cache.get,
+                text,
+                self.backend.model,
+                SYSTEM_PROMPT,
+                LEGISLATION_SCHEMA,
+            )
+        ):
+            return cached
+
+        result = validate_response(await self._generate(text))
+        if use_cache:
+            await asyncio.to_thread(
+                self.llm_cache.put,
+                text,
+                self.backend.model,
+                SYSTEM_PROMPT,
+                LEGISLATION_SCHEMA,
+                result,
+            )
+        return result
+
+    async def _extract_text(self, pdf_path: str, executor: ProcessPoolExecutor | None) -> str:
+        if self.text_cache:
+            _, pages = await asyncio.to_thread(self.text_cache.pages, pdf_path, executor)
+        else:
+            loop = asyncio.get_running_loop()
+            pages = await loop.run_in_executor(executor, extract_pages, pdf_path)
+        return join_pages(pages)
+
+    async def run(
+        self,
+        items: Iterable[tuple[Any, str]],
+        on_result: Callable[[Any, dict[str, Any]], None],
+        *,
+        use_cache: bool = True,
+        reuse: Callable[[Any, str], bool] | None = None,
+    ) -> tuple[int, int]:
+        """Analyze (key, pdf_path) pairs, passing each result to `on_result`.
+
+        `reuse(key, text)` runs first, and may take care of an item without
+        the model (e.g. from the analysis of a near-identical text) by
+        returning True. Both callbacks run one at a time on a writer thread,
+        so their DB writes and hashing never stall the requests in flight.
+        Returns the number of items that succeeded and failed.
+        """
+        counts = {'ok': 0, 'failed': 0}
+        loop = asyncio.get_running_loop()
+
+        async def process(key: Any, pdf_path: str) -> None:
+            try:
+                text = await self._extract_text(pdf_path, executor)
+                if not (reuse and await loop.run_in_executor(writer, reuse, key, text)):
+                    result = await self.analyze(text, use_cache=use_cache)
+                    await loop.run_in_executor(writer, on_result, key, result)
+            except Exception:
+                logger.exception('Falha ao analisar %s', pdf_path)
+                counts['failed'] += 1
+            else:
+                counts['ok'] += 1
+                logger.info('Analisado: %s', pdf_path)
+            finally:
+                self._in_flight.release()
+
+        with (
+            ProcessPoolExecutor() as executor,
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='batch-writer') as writer,
+        ):
+            async with asyncio.TaskGroup() as group:
+                for key, pdf_path in items:
+                    await self._in_flight.acquire()
+                    group.create_task(process(key, pdf_path))
+        return counts['ok'], counts['failed']
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+
+def pending_projects(conn: sqlite3.Connection, limit: int | None = None) -> list[tuple[int, str]]:
+    """(projeto id, PDF path) of downloaded projects without an analysis."""
+    return conn.execute(
+        """
+        SELECT p.id, p.link_pdf_principal FROM projetos p
+        LEFT JOIN analises_ia a ON a.projeto_id = p.id
+        WHERE a.id IS NULL AND p.link_pdf_principal IS NOT NULL
+        ORDER BY p.data_abertura DESC
+        LIMIT ?
+        """,
+        (limit if limit is not None else -1,),
+    ).fetchall()
+
+
+def make_backend(name: str, api_key: str | None, base_url: str | None) -> LLMBackend:
+    if name == 'http':
+        if not base_url:
+            raise ValueError('--base-url is required for the http backend.')
+        return HttpBackend(base_url)
+    return GeminiBackend(api_key)
+
+
+async def analyze_backlog(
+    analyzer: BatchAnalyzer,
+    db_path: Path,
+    limit: int | None,
+    *,
+    use_cache: bool = True,
+    reuse_threshold: float | None = REUSE_THRESHOLD,
+) -> tuple[int, int]:
+    """Analyze every downloaded project that has no analysis yet.
+
+    Like the pipeline's analyze stage, a project whose text is near-identical
+    to an analyzed one (above `reuse_threshold`; None to never reuse) takes
+    over its analysis instead of calling the model.
+    """
+    # Used by the analyzer's writer thread once the backlog is read
+    conn = connect(db_path, check_same_thread=False)
+    try:
+        projects = pending_projects(conn, limit)
+        logger.info('%d projetos sem análise.', len(projects))
+        return await _analyze_projects(
+            analyzer,
+            conn,
+            projects,
+            use_cache=use_cache,
+            reuse_threshold=reuse_threshold,
+        )
+    finally:
+        conn.close()
+
+
+async def _analyze_projects(
+    analyzer: BatchAnalyzer,
+    conn: sqlite3.Connection,
+    projects: list[tuple[int, str]],
+    *,
+    use_cache: bool,
+    reuse_threshold: float | None,
+) -> tuple[int, int]:
+    model = analyzer.backend.model
+
+    def save(project: tuple[int, str], result: dict[str, Any], origem: int | None) -> None:
+        projeto_id, pdf_path = project
+        analise_id = ingest_analysis(conn, projeto_id, model, result, origem)
+        if analise_id is None:
+            raise ValueError(f'Análise do projeto {projeto_id} inválida; em quarentena')
+        if analyzer.text_cache:
+            _, pages = analyzer.text_cache.pages(pdf_path)
+            index_text(conn, projeto_id, join_pages(pages))
+            index_analysis(conn, analise_id, pages, pdf_path)
+
+    def reuse(project: tuple[int, str], text: str) -> bool:
+        projeto_id, pdf_path = project
+        sha256, _ = analyzer.text_cache.pages(pdf_path)
+        similares = index_project(conn, projeto_id, sha256, text)
+        if reuse_threshold is None or not (
+            reused := reusable_analysis(conn, similares, model, text, reuse_threshold)
+        ):
+            return False
+        origem, result = reused
+        logger.info(
+            'Projeto %d: análise reaproveitada de um texto quase idêntico (análise %d).',
+            projeto_id,
+            origem,
+        )
+        save(project, result, origem)
+        return True
+
+    return await analyzer.run(
+        ((project, project[1]) for project in projects),
+        lambda project, result: save(project, result, None),
+        use_cache=use_cache,
+        # The similarity index is built from the cached page text
+        reuse=reuse if analyzer.text_cache else None,
+    )
+
+
+def output_paths(paths: Iterable[Path], out_dir: Path) -> dict[Path, Path]:
+    """The JSON file in `out_dir` of each PDF in `paths` (files or directories).
+
+    PDFs found in a directory keep their path relative to it, so files of the
+    same name in different project folders (e.g. `Projeto.pdf`) don't
+    overwrite each other's results.
+    """
+    outputs = {}
+    for path in paths:
+        if path.is_dir():
+            for pdf in sorted(path.rglob('*.pdf')):
+                outputs[pdf] = out_dir / pdf.relative_to(path).with_suffix('.json')
+        else:
+            outputs[path] = out_dir / f'{path.stem}.json'
+    if clashes := [out for out, count in Counter(outputs.values()).items() if count > 1]:
+        raise ValueError(
+            f'Several PDFs would be written to {clashes[0]}; pass their directory instead.',
+        )
+    return outputs
+
+
+async def analyze_files(
+    analyzer: BatchAnalyzer,
+    paths: list[Path],
+    out_dir: Path,
+    *,
+    use_cache: bool = True,
+) -> tuple[int, int]:
+    """Analyze PDF files or directories of them, writing the JSON into `out_dir`.
+
+    See `output_paths` for where each result goes.
+    """
+    outputs = output_paths(paths, out_dir)
+
+    def on_result(pdf_path: Path, result: dict[str, Any]) -> None:
+        out_path = outputs[pdf_path]
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with out_path.open('w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    return await analyzer.run(
+        ((path, str(path)) for path in outputs),
+        on_result,
+        use_cache=use_cache,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Analyze many legislation PDFs concurrently.',
+    )
+    parser.add_argument(
+        'paths',
+        type=Path,
+        nargs='*',
+        help='PDF files or directories to analyze (default: the DB backlog)',
+    )
+    parser.add_argument(
+        '--out',
+        type=Path,
+        default=Path('data/analises'),
+        help='Output directory for the JSON of PDFs given as paths',
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Maximum number of backlog projects to analyze',
+    )
+    parser.add_argument(
+        '--backend',
+        choices=('gemini', 'http'),
+        default='gemini',
+        help='LLM backend (http: a server speaking the stub protocol)',
+    )
+    parser.add_argument(
+        '--base-url',
+        type=str,
+        default=None,
+        help='Base URL of the http backend',
+    )
+    parser.add_argument(
+        '--api-key',
+        type=str,
+        default=None,
+        help='Gemini API key (or set GEMINI_API_KEY env var)',
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help='Initial number of concurrent requests',
+    )
+    parser.add_argument(
+        '--max-concurrency',
+        type=int,
+        default=MAX_CONCURRENCY,
+        help='Upper bound for the adaptive concurrency',
+    )
+    parser.add_argument('--rpm', type=float, default=None, help='Requests per minute budget')
+    parser.add_argument('--tpm', type=float, default=None, help='Tokens per minute budget')
+    parser.add_argument(
+        '--max-chunk-tokens',
+        type=int,
+        default=MAX_CHUNK_TOKENS,
+        help='Split documents larger than this into chunks analyzed in parallel',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Bypass the LLM cache for this run',
+    )
+    parser.add_argument(
+        '--no-reuse',
+        action='store_true',
+        help='Analyze every backlog project, even if a near-identical one was analyzed',
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics on this local port',
+    )
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
+    init_db(DB_FILE)
+    text_cache = PageTextCache(DB_FILE)
+    llm_cache = LLMCache(DB_FILE)
+    analyzer = BatchAnalyzer(
+        make_backend(args.backend, args.api_key, args.base_url),
+        concurrency=args.concurrency,
+        max_concurrency=args.max_concurrency,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        text_cache=text_cache,
+        llm_cache=llm_cache,
+        max_chunk_tokens=args.max_chunk_tokens,
+    )
+
+    async def run() -> tuple[int, int]:
+        try:
+            if args.paths:
+                return await analyze_files(
+                    analyzer,
+                    args.paths,
+                    args.out,
+                    use_cache=not args.no_cache,
+                )
+            return await analyze_backlog(
+                analyzer,
+                DB_FILE,
+                args.limit,
+                use_cache=not args.no_cache,
+                reuse_threshold=None if args.no_reuse else REUSE_THRESHOLD,
+            )
+        finally:
+            await analyzer.aclose()
+
+    try:
+        ok, failed = asyncio.run(run())
+        logger.info('%d análises concluídas, %d falharam.', ok, failed)
+        logger.info('Resumo:\n%s', metrics.summary())
+    finally:
+        llm_cache.close()
+        text_cache.close()
+
+
+if __name__ == '__main__':
+    main()
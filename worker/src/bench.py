@@ -0,0 +1,708 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import resource
+import tempfile
+import threading
+import time
+import urllib.parse
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import fitz
+import httpx
+
+import metrics
+from chunking import approx_tokens
+from crawler import DEFAULT_CONCURRENCY, AsyncCrawler
+from db import connect, init_db
+from ingest import ingest_analysis
+from jobs import JobQueue
+from parser import MODEL_NAME, LegislationParser
+from pipeline import DEFAULT_WORKERS, Pipeline
+from ratelimit import HostRateLimiter
+from schemas import Categoria
+from scraper import DB_FILE, TIPOS, CamaraScraper
+from text_cache import PageTextCache
+
+FIRST_PROJECT_ID = 140_000
+# Listing pages link this many pages on each side, like a windowed paginator
+PAGINATION_WINDOW = 2
+# Tables whose rows are counted for the DB rows/s figure
+COUNTED_TABLES = (
+    'projetos',
+    'autores',
+    'projetos_autores',
+    'documentos',
+    'tramitacoes',
+    'votacoes',
+    'textos_pdf',
+    'analises_ia',
+    'analise_mudancas',
+    'analise_justificativas',
+    'analise_categorias',
+)
+GENERATE_CONTENT_PATTERN = re.compile(r'^/[^/]+/models/[^/:]+:generateContent$')
+# Engines that scrape the site: `CamaraScraper`, then `LegislationParser` over
+# the downloads; `AsyncCrawler`, likewise; or `Pipeline`, which does both
+MODES = ('scraper', 'crawler', 'pipeline')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _respond(self, method: str) -> None:
+        app: FakeService = self.server.app  # type: ignore[attr-defined]
+        url = urllib.parse.urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if app.latency:
+            time.sleep(app.latency * app.random.uniform(0.5, 1.5))
+        if app.random.random() < app.error_rate:
+            status, content_type, content = app.error_status, 'text/plain', b'erro simulado'
+        else:
+            status, content_type, content = app.handle(
+                method,
+                url.path,
+                urllib.parse.parse_qs(url.query),
+                body,
+            )
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        self._respond('GET')
+
+    def do_POST(self) -> None:
+        self._respond('POST')
+
+
+class FakeService(ABC):
+    """Local HTTP service with simulated latency (mean, seconds) and errors."""
+
+    error_status = 503
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        if not self._server:
+            raise RuntimeError('Service not started.')
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @abstractmethod
+    def handle(
+        self,
+        method: str,
+        path: str,
+        query: dict[str, list[str]],
+        body: bytes,
+    ) -> tuple[int, str, bytes]:
+        """(status, content type, body) of the response to a request."""
+
+    def start(self) -> None:
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.app = self  # type: ignore[attr-defined]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self) -> 'FakeService':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+class FixtureSite(FakeService):
+    """Stand-in for camarapoa.rs.gov.br: listing pages, project pages and PDFs.
+
+    Pages are synthesized in the markup the scraper expects. PDFs are
+    generated, or taken in turn from `pdf_dir` to benchmark on real documents.
+    """
+
+    def __init__(
+        self,
+        projects: int = 200,
+        per_page: int = 20,
+        pdf_pages: int = 4,
+        pdf_dir: Path | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.projects = projects
+        self.per_page = per_page
+        self.pdf_pages = pdf_pages
+        self.pdf_files = sorted(pdf_dir.rglob('*.pdf')) if pdf_dir else []
+        self._pdfs: dict[int, bytes] = {}
+
+    def handle(
+        self,
+        method: str,
+        path: str,
+        query: dict[str, list[str]],
+        body: bytes,
+    ) -> tuple[int, str, bytes]:
+        if path == '/processos':
+            page = int(query.get('page', ['1'])[0])
+            tipo = query.get('tipo', ['PLL'])[0]
+            return 200, 'text/html; charset=utf-8', self._listing(page, tipo).encode()
+        if match := re.fullmatch(r'/processos/(\d+)', path):
+            return 200, 'text/html; charset=utf-8', self._project(int(match[1])).encode()
+        if match := re.fullmatch(r'/documentos/(\d+)\.pdf', path):
+            return 200, 'application/pdf', self._pdf(int(match[1]))
+        return 404, 'text/plain', b'not found'
+
+    def _date(self, number: int, offset: int = 0) -> str:
+        day = number % 28 + 1 + offset
+        return f'{min(day, 28):02d}/{number % 12 + 1:02d}/2025'
+
+    def _tipo(self, number: int) -> str:
+        """Projects cycle through the types."""
+        return TIPOS[number % len(TIPOS)]
+
+    def _listing(self, page: int, tipo: str) -> str:
+        numbers = [n for n in range(self.projects) if self._tipo(n) == tipo]
+        start = (page - 1) * self.per_page
+        articles = ''.join(
+            f'<article class="item"><h2 class="header">'
+            f'<a href="/processos/{FIRST_PROJECT_ID + n}">{tipo} {n + 1}/25</a></h2>'
+            f'<p>Última tramitação: {self._date(n, 3)}</p></article>'
+            for n in numbers[start : start + self.per_page]
+        )
+        page_count = -(-len(numbers) // self.per_page)
+        pagination = ''.join(
+            f'<a class="item" href="/processos?tipo={tipo}&amp;page={number}">{number}</a>'
+            for number in range(
+                max(1, page - PAGINATION_WINDOW),
+                min(page_count, page + PAGINATION_WINDOW) + 1,
+            )
+            if number != page
+        )
+        return (
+            '<html><body><div class="ui grid">'
+            f'<div class="twelve wide column">{articles}'
+            f'<div class="ui pagination menu">{pagination}</div></div>'
+            '<div class="four wide column"></div></div></body></html>'
+        )
+
+    def _project(self, project_id: int) -> str:
+        n = project_id - FIRST_PROJECT_ID
+        tramitacoes = ''.join(
+            f'<tr><td>Setor {k}</td><td>{self._date(n, k)}</td>'
+            f'<td>{self._date(n, k + 1)}</td><td>Encaminhado</td></tr>'
+            for k in range(3)
+        )
+        return (
+            '<html><body>'
+            '<div class="ui tab" data-tab="dados"><dl class="dados">'
+            f'<dt>Processo</dt><dd>{n:05d}/25</dd>'
+            f'<dt>Autores</dt><dd>Vereador {n % 36}</dd>'
+            f'<dt>Data da abertura</dt><dd>{self._date(n)}</dd>'
+            f'<dt>Última tramitação</dt><dd>{self._date(n, 3)}</dd>'
+            '<dt>Situação</dt><dd>Em tramitação</dd></dl></div>'
+            '<div class="ui tab" data-tab="documentos">'
+            f'<a href="/documentos/{project_id}.pdf">Projeto {self._tipo(n)} {n + 1}/25</a></div>'
+            '<div class="ui tab" data-tab="votacoes"><table>'
+            '<thead><tr><th>Data</th><th>Descrição</th><th>Sim</th><th>Não</th>'
+            '<th>Abstenções</th><th>Resultado</th></tr></thead><tbody>'
+            f'<tr><td>{self._date(n, 4)}</td><td>Votação do projeto</td>'
+            '<td>20</td><td>5</td><td>1</td><td>Aprovado</td></tr></tbody></table></div>'
+            '<div class="ui tab" data-tab="tramitacoes"><table>'
+            '<thead><tr><th>Local</th><th>Data de chegada</th><th>Data de saída</th>'
+            f'<th>Ação</th></tr></thead><tbody>{tramitacoes}</tbody></table></div>'
+            '</body></html>'
+        )
+
+    def _pdf(self, project_id: int) -> bytes:
+        if self.pdf_files:
+            return self.pdf_files[project_id % len(self.pdf_files)].read_bytes()
+        if project_id not in self._pdfs:
+            with fitz.open() as doc:
+                for page_number in range(self.pdf_pages):
+                    page = doc.new_page()
+                    page.insert_textbox(
+                        page.rect + (72, 72, -72, -72),
+                        '\n'.join(
+                            f'Art. {page_number * 8 + k + 1}º Fica instituído, no âmbito '
+                            f'do Município, o programa municipal número {project_id}, '
+                            'com as regras e os prazos definidos nesta Lei.'
+                            for k in range(8)
+                        ),
+                        fontsize=11,
+                    )
+                self._pdfs[project_id] = doc.tobytes()
+        return self._pdfs[project_id]
+
+
+class StubLLM(FakeService):
+    """Answers Gemini `generateContent` and `HttpBackend` requests alike.
+
+    The analysis quotes the start of the submitted text, so it passes
+    validation and its evidence can be located. Errors are 429s.
+    """
+
+    error_status = 429
+
+    def _analysis(self, text: str) -> dict[str, Any]:
+        quote = ' '.join(text.split()[:12]) or 'texto'
+        return {
+            'titulo': 'Projeto sintético',
+            'resumo': 'Institui um programa municipal.',
+            'mudancas': [{'texto_simplificado': 'Cria o programa.', 'trechos_originais': [quote]}],
+            'justificativas': [
+                {
+                    'texto_simplificado': 'Segundo o autor, é necessário.',
+                    'trechos_originais': [quote],
+                },
+            ],
+            'categorias': [{'nome': Categoria.OUTROS, 'trechos_originais': [quote]}],
+        }
+
+    def handle(
+        self,
+        method: str,
+        path: str,
+        query: dict[str, list[str]],
+        body: bytes,
+    ) -> tuple[int, str, bytes]:
+        request = json.loads(body or b'{}')
+        if method == 'POST' and GENERATE_CONTENT_PATTERN.match(path):
+            text = ' '.join(
+                part.get('text', '')
+                for content in request.get('contents', [])
+                for part in content.get('parts', [])
+            )
+            response = {
+                'candidates': [
+                    {
+                        'content': {
+                            'role': 'model',
+                            'parts': [{'text': json.dumps(self._analysis(text))}],
+                        },
+                        'finishReason': 'STOP',
+                    },
+                ],
+                'usageMetadata': {
+                    'promptTokenCount': approx_tokens(text),
+                    'candidatesTokenCount': approx_tokens(json.dumps(self._analysis(text))),
+                },
+            }
+            return 200, 'application/json', json.dumps(response).encode()
+        if method == 'POST' and path == '/generate':
+            analysis = self._analysis(str(request.get('contents', '')))
+            return 200, 'application/json', json.dumps(analysis).encode()
+        return 404, 'text/plain', b'not found'
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[round(pct / 100 * (len(ordered) - 1))]
+
+
+def count_rows(conn: Any) -> int:
+    return sum(
+        conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        for table in COUNTED_TABLES
+    )
+
+
+class RequestStats:
+    """Count and time the requests a client makes to the fixture site."""
+
+    def __init__(self) -> None:
+        self.counts = {'listing': 0, 'project': 0, 'pdf': 0, 'errors': 0}
+        self.latencies: list[float] = []
+
+    def on_request(self, request: httpx.Request) -> None:
+        request.extensions['bench_start'] = time.perf_counter()
+
+    def on_response(self, response: httpx.Response) -> None:
+        self.latencies.append(time.perf_counter() - response.request.extensions['bench_start'])
+        path = response.request.url.path
+        if response.status_code >= httpx.codes.BAD_REQUEST:
+            self.counts['errors'] += 1
+        elif path == '/processos':
+            self.counts['listing'] += 1
+        elif path.endswith('.pdf'):
+            self.counts['pdf'] += 1
+        else:
+            self.counts['project'] += 1
+
+    def hook(self, client: httpx.Client | httpx.AsyncClient) -> None:
+        if isinstance(client, httpx.Client):
+            client.event_hooks = {'request': [self.on_request], 'response': [self.on_response]}
+            return
+
+        # An async client awaits its hooks
+        async def on_request(request: httpx.Request) -> None:
+            self.on_request(request)
+
+        async def on_response(response: httpx.Response) -> None:
+            self.on_response(response)
+
+        client.event_hooks = {'request': [on_request], 'response': [on_response]}
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        return {
+            'seconds': elapsed,
+            **self.counts,
+            'pages_per_second': (self.counts['listing'] + self.counts['project']) / elapsed,
+            'pdfs_per_second': self.counts['pdf'] / elapsed,
+            'request_p50_ms': percentile(self.latencies, 50) * 1000,
+            'request_p99_ms': percentile(self.latencies, 99) * 1000,
+        }
+
+
+def bench_scraper(site: FixtureSite, rate: float) -> dict[str, Any]:
+    """Crawl the fixture site with `CamaraScraper`, timing every request."""
+    stats = RequestStats()
+    scraper = CamaraScraper(site.url)
+    scraper.rate_limiter = HostRateLimiter(rate)
+    for client in (scraper.client, scraper.downloader.client):
+        stats.hook(client)
+    start = time.perf_counter()
+    try:
+        for link in scraper.get_project_links():
+            scraper.process_project(link)
+    finally:
+        scraper.close()
+    return stats.report(time.perf_counter() - start)
+
+
+def bench_crawler(site: FixtureSite, rate: float, concurrency: int) -> dict[str, Any]:
+    """Crawl the fixture site with `AsyncCrawler`, timing every request."""
+    stats = RequestStats()
+    scraper = CamaraScraper(site.url)
+    crawler = AsyncCrawler(scraper, concurrency=concurrency, rate=rate)
+    for client in (crawler.client, scraper.downloader.client):
+        stats.hook(client)
+
+    async def crawl() -> None:
+        try:
+            await crawler.run()
+        finally:
+            await crawler.aclose()
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(crawl())
+    finally:
+        scraper.close()
+    return stats.report(time.perf_counter() - start)
+
+
+def bench_pipeline(
+    site: FixtureSite,
+    llm: StubLLM,
+    rate: float,
+    parse_workers: int,
+) -> dict[str, Any]:
+    """Run every `Pipeline` stage against the fixture site and the stub LLM."""
+    init_db(DB_FILE)
+    queue = JobQueue(DB_FILE)
+    pipeline = Pipeline(
+        queue,
+        {**DEFAULT_WORKERS, 'analyze': parse_workers},
+        api_key='bench',
+        use_llm_cache=False,
+        # The generated PDFs differ only in a number; every one goes to the
+        # model, as in the other modes
+        reuse_threshold=None,
+        base_url=site.url,
+        llm_url=llm.url,
+        rate=rate,
+    )
+    start = time.perf_counter()
+    try:
+        pipeline.seed(None)
+        pipeline.run()
+        counts = queue.counts()
+    finally:
+        queue.close()
+    elapsed = time.perf_counter() - start
+
+    conn = connect(DB_FILE)
+    try:
+        projects, pdfs, documents = conn.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM projetos),
+                (SELECT COUNT(*) FROM documentos WHERE sha256 IS NOT NULL),
+                (SELECT COUNT(*) FROM analises_ia)
+            """,
+        ).fetchone()
+    finally:
+        conn.close()
+    return {
+        'seconds': elapsed,
+        'projects': projects,
+        'pdfs': pdfs,
+        'documents': documents,
+        'failed_jobs': sum(statuses.get('failed', 0) for statuses in counts.values()),
+        'projects_per_second': projects / elapsed,
+        'documents_per_second': documents / elapsed,
+        'jobs': counts,
+    }
+
+
+def bench_parser(llm: StubLLM, workers: int) -> dict[str, Any]:
+    """Analyze every downloaded project with `LegislationParser` and save it."""
+    conn = connect(DB_FILE)
+    text_cache = PageTextCache(DB_FILE)
+    parser = LegislationParser('bench', text_cache, base_url=llm.url)
+    projects = conn.execute(
+        'SELECT id, link_pdf_principal FROM projetos WHERE link_pdf_principal IS NOT NULL',
+    ).fetchall()
+
+    def timed_parse(pdf_path: str) -> tuple[float, dict[str, Any]]:
+        start = time.perf_counter()
+        result = parser.parse(pdf_path, use_cache=False)
+        return time.perf_counter() - start, result
+
+    latencies: list[float] = []
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(timed_parse, pdf_path): projeto_id
+                for projeto_id, pdf_path in projects
+            }
+            for future in as_completed(futures):
+                try:
+                    elapsed, result = future.result()
+                except Exception as e:
+                    logger.debug('Falha na análise: %r', e)
+                    failed += 1
+                    continue
+                latencies.append(elapsed)
+                ingest_analysis(conn, futures[future], MODEL_NAME, result)
+    finally:
+        text_cache.close()
+        conn.close()
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'documents': len(latencies),
+        'errors': failed,
+        'documents_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'parse_p50_ms': percentile(latencies, 50) * 1000,
+        'parse_p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def run_benchmark(
+    site: FixtureSite,
+    llm: StubLLM,
+    *,
+    mode: str = 'scraper',
+    rate: float,
+    parse_workers: int,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict[str, Any]:
+    """Scrape then parse (see `MODES`) into a fresh DB in the current directory."""
+    if mode == 'pipeline':
+        reports = {'pipeline': bench_pipeline(site, llm, rate, parse_workers)}
+    elif mode == 'crawler':
+        reports = {'scraper': bench_crawler(site, rate, concurrency)}
+    else:
+        reports = {'scraper': bench_scraper(site, rate)}
+    if mode != 'pipeline':
+        reports['parser'] = bench_parser(llm, parse_workers)
+    conn = connect(DB_FILE)
+    try:
+        rows = count_rows(conn)
+    finally:
+        conn.close()
+    seconds = sum(report['seconds'] for report in reports.values())
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'mode': mode,
+        **reports,
+        'db_rows': rows,
+        'db_rows_per_second': rows / seconds,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'peak_rss_children_mb': children.ru_maxrss / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the scraper and parser against local stand-ins '
+        'for the Câmara site and the LLM.',
+    )
+    parser.add_argument(
+        '--mode',
+        choices=MODES,
+        default='scraper',
+        help='Scrape with CamaraScraper or AsyncCrawler (then parse), or run the Pipeline',
+    )
+    parser.add_argument('--projects', type=int, default=200, help='Projects on the site')
+    parser.add_argument('--per-page', type=int, default=20, help='Projects per listing page')
+    parser.add_argument('--pdf-pages', type=int, default=4, help='Pages of generated PDFs')
+    parser.add_argument(
+        '--pdf-dir',
+        type=Path,
+        default=None,
+        help='Serve the PDFs in this directory instead of generated ones',
+    )
+    parser.add_argument('--latency', type=float, default=0.0, help='Site latency (ms)')
+    parser.add_argument(
+        '--error-rate',
+        type=float,
+        default=0.0,
+        help='Share of site requests answered with a 503',
+    )
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='LLM latency (ms)')
+    parser.add_argument(
+        '--llm-error-rate',
+        type=float,
+        default=0.0,
+        help='Share of LLM requests answered with a 429',
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=1000.0,
+        help='Scraper request budget (requests/s)',
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help='In-flight requests of the crawler mode',
+    )
+    parser.add_argument('--parse-workers', type=int, default=1, help='Documents parsed at once')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the simulated errors')
+    parser.add_argument(
+        '--workdir',
+        type=Path,
+        default=None,
+        help='Directory for the DB and downloads (default: a temporary one)',
+    )
+    parser.add_argument('--json', type=Path, default=None, help='Also write the report here')
+    parser.add_argument('--verbose', action='store_true', help='Keep the per-request logs')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        for name in (
+            'httpx',
+            'google_genai',
+            'scraper',
+            'crawler',
+            'pipeline',
+            'writer',
+            'ingest',
+            'parser',
+        ):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    site = FixtureSite(
+        args.projects,
+        args.per_page,
+        args.pdf_pages,
+        args.pdf_dir.resolve() if args.pdf_dir else None,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    llm = StubLLM(
+        latency=args.llm_latency / 1000,
+        error_rate=args.llm_error_rate,
+        seed=args.seed,
+    )
+    json_path = args.json.resolve() if args.json else None
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp_dir, site, llm:
+        workdir = args.workdir or Path(tmp_dir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        # Every module resolves its DB and data paths against the working directory
+        os.chdir(workdir)
+        try:
+            report = run_benchmark(
+                site,
+                llm,
+                mode=args.mode,
+                rate=args.rate,
+                parse_workers=args.parse_workers,
+                concurrency=args.concurrency,
+            )
+        finally:
+            os.chdir(cwd)
+
+    if pipeline_report := report.get('pipeline'):
+        logger.info(
+            'Pipeline: %.1f projetos/s, %.1f documentos/s, %d PDFs, %d tarefas falhas (%.1fs)',
+            pipeline_report['projects_per_second'],
+            pipeline_report['documents_per_second'],
+            pipeline_report['pdfs'],
+            pipeline_report['failed_jobs'],
+            pipeline_report['seconds'],
+        )
+    else:
+        scraper_report, parser_report = report['scraper'], report['parser']
+        logger.info(
+            'Scraper: %.1f páginas/s, %.1f PDFs/s, latência p50 %.1f ms, p99 %.1f ms, '
+            '%d erros (%.1fs)',
+            scraper_report['pages_per_second'],
+            scraper_report['pdfs_per_second'],
+            scraper_report['request_p50_ms'],
+            scraper_report['request_p99_ms'],
+            scraper_report['errors'],
+            scraper_report['seconds'],
+        )
+        logger.info(
+            'Parser: %.1f documentos/s, latência p50 %.1f ms, p99 %.1f ms, %d erros (%.1fs)',
+            parser_report['documents_per_second'],
+            parser_report['parse_p50_ms'],
+            parser_report['parse_p99_ms'],
+            parser_report['errors'],
+            parser_report['seconds'],
+        )
+    logger.info(
+        'Banco: %d linhas, %.1f linhas/s. Pico de memória: %.1f MB',
+        report['db_rows'],
+        report['db_rows_per_second'],
+        report['peak_rss_mb'],
+    )
+    logger.info('Etapas:\n%s', metrics.summary())
+    if json_path:
+        json_path.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
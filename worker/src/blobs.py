@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+import fitz
+
+BLOB_DIR = Path('data/blobs')
+BLOB_SUFFIX = '.pdf'
+# Bytes kept from each end of a blob, to check the file's structure
+EDGE_BYTES = 2048
+READ_CHUNK_SIZE = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class BlobWriter:
+    """Hashes a blob while it is written; `sha256` and `path` are set on commit.
+
+    The first and last `EDGE_BYTES` are kept in `head` and `tail`.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self.sha256 = ''
+        self.size = 0
+        self.path: Path | None = None
+        self.created = False
+        self.head = b''
+        self.tail = b''
+        self._file = file
+        self._digest = hashlib.sha256()
+
+    def _update(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        if len(self.head) < EDGE_BYTES:
+            self.head += chunk[: EDGE_BYTES - len(self.head)]
+        self.tail = (self.tail + chunk[-EDGE_BYTES:])[-EDGE_BYTES:]
+
+    def _load(self) -> None:
+        """Account for the content already in the file, when appending to it."""
+        self._file.seek(0)
+        while chunk := self._file.read(READ_CHUNK_SIZE):
+            self._update(chunk)
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._update(chunk)
+
+
+class BlobStore:
+    """Content-addressed files, stored as `<root>/ab/cd/<sha256>.pdf`.
+
+    Identical documents are kept once no matter how many projects link them,
+    and a path can never hold the wrong content.
+    """
+
+    def __init__(self, root: Path = BLOB_DIR) -> None:
+        self.root = root
+        self.tmp_dir = root / 'tmp'
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f'{sha256}{BLOB_SUFFIX}'
+
+    def exists(self, sha256: str) -> bool:
+        return self.path(sha256).exists()
+
+    @contextmanager
+    def writer(self, partial: Path | None = None) -> Iterator[BlobWriter]:
+        """Stream a blob to a temporary file, moved to its address on exit.
+
+        The copy is dropped if the blob is already stored, or on an error. A
+        `partial` file is appended to instead, and kept on an error so the
+        write can be resumed.
+        """
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        if partial:
+            tmp_path, file = partial, partial.open('a+b')
+        else:
+            fd, name = tempfile.mkstemp(dir=self.tmp_dir, suffix='.part')
+            tmp_path, file = Path(name), os.fdopen(fd, 'wb')
+        committed = False
+        try:
+            with file:
+                blob = BlobWriter(file)
+                if partial:
+                    blob._load()
+                yield blob
+            blob.sha256 = blob._digest.hexdigest()
+            blob.path = self.path(blob.sha256)
+            if not blob.path.exists():
+                blob.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path.replace(blob.path)
+                blob.created = True
+            committed = True
+        finally:
+            if committed or not partial:
+                tmp_path.unlink(missing_ok=True)
+
+
+def page_count(path: Path | str) -> int | None:
+    try:
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception:
+        logger.warning('Não foi possível abrir %s como PDF.', path)
+        return None
@@ -0,0 +1,119 @@
+import re
+from collections.abc import Iterable
+from typing import Any
+
+from text_cache import PAGE_SEPARATOR
+
+# Rough chars/token ratio for Portuguese text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+MAX_CHUNK_TOKENS = 24_000
+
+# Zero-width, so splitting keeps the text verbatim
+ARTICLE_PATTERN = re.compile(r'(?m)^(?=[ \t]*(?:Art\.?[ \t]*\d|§[ \t]*\d|Parágrafo[ \t]+único))')
+# Used in order on units that still exceed the budget
+FALLBACK_PATTERNS = (
+    re.compile(r'(?m)^(?=[ \t]*[IVXLCDM]+[ \t]*[-–—.)])'),  # incisos
+    re.compile(r'(?m)^(?=[ \t]*[a-z]\)[ \t])'),  # alíneas
+    re.compile(r'(?<=\n)(?=[ \t]*\n)'),  # blank lines
+    re.compile(r'(?<=\n)'),  # any line
+)
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split(text: str, patterns: tuple[re.Pattern, ...], max_chars: int) -> list[str]:
+    if len(text) <= max_chars:
+        return [text]
+    if not patterns:
+        return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
+    return [
+        piece
+        for part in patterns[0].split(text)
+        if part
+        for piece in _split(part, patterns[1:], max_chars)
+    ]
+
+
+def chunk_text(text: str, max_tokens: int = MAX_CHUNK_TOKENS) -> list[str]:
+    """Split a document into chunks of at most `max_tokens` (approximately).
+
+    Chunks are packed from whole articles (Art., §, Parágrafo único) and
+    preferably break at an article or page boundary; only an article that is
+    too big on its own is cut further, at incisos, alíneas and lines.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks: list[str] = []
+    current = ''
+    for number, page in enumerate(text.split(PAGE_SEPARATOR)):
+        units = [
+            unit
+            for article in ARTICLE_PATTERN.split(page)
+            if article
+            for unit in _split(article, FALLBACK_PATTERNS, max_chars)
+        ]
+        for index, unit in enumerate(units):
+            piece = PAGE_SEPARATOR + unit if number and not index else unit
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = unit
+            else:
+                current += piece
+    if current.strip():
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def chunk_prompts(text: str, max_tokens: int = MAX_CHUNK_TOKENS) -> list[str]:
+    """Chunks of a document, labeled so the model knows it sees a part of it."""
+    chunks = chunk_text(text, max_tokens)
+    if len(chunks) == 1:
+        return chunks
+    return [
+        f'[Parte {number} de {len(chunks)} do projeto]\n\n{chunk.strip()}'
+        for number, chunk in enumerate(chunks, start=1)
+    ]
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+def _merge_items(groups: Iterable[list[dict]], key: str) -> list[dict]:
+    merged: dict[str, dict] = {}
+    for item in (item for group in groups for item in group):
+        trechos = item.get('trechos_originais', [])
+        if (name := _normalize(item[key])) in merged:
+            existing = merged[name]['trechos_originais']
+            existing.extend(t for t in trechos if t not in existing)
+        else:
+            merged[name] = {**item, 'trechos_originais': list(dict.fromkeys(trechos))}
+    return list(merged.values())
+
+
+def merge_results(results: list[dict[str, Any]]) -> dict[str, Any]:
+    """Reduce per-chunk analyses into a single `LEGISLATION_SCHEMA` result.
+
+    Title and summary come from the first chunk, which holds the ementa and
+    the opening articles; list items are deduplicated on their normalized
+    text, pooling the evidence of duplicates.
+    """
+    if len(results) == 1:
+        return results[0]
+    return {
+        'titulo': results[0].get('titulo'),
+        'resumo': results[0].get('resumo'),
+        'mudancas': _merge_items(
+            (r.get('mudancas', []) for r in results),
+            'texto_simplificado',
+        ),
+        'justificativas': _merge_items(
+            (r.get('justificativas', []) for r in results),
+            'texto_simplificado',
+        ),
+        'categorias': _merge_items((r.get('categorias', []) for r in results), 'nome'),
+    }
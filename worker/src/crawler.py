@@ -0,0 +1,459 @@
+import argparse
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+
+import metrics
+from archive import ResponseArchive
+from blobs import BlobWriter, page_count
+from db import connect
+from metrics import FAILURES, RETRIES, STAGE_SECONDS, record_response
+from ratelimit import HostRateLimiter
+from schemas import TipoProjeto
+from scraper import (
+    ARCHIVE_DIR,
+    DB_FILE,
+    HTML_PARSER,
+    LISTING_STRAINER,
+    PROJECT_STRAINER,
+    TIPOS,
+    CamaraScraper,
+)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 4.0
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 2.0
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+class AsyncCrawler:
+    """Async crawl engine on top of `CamaraScraper`'s parsing and DB code.
+
+    Listing pages, project pages and PDF downloads run concurrently, capped by
+    `concurrency` in-flight requests and a per-host token bucket of `rate`
+    requests/s.
+    """
+
+    def __init__(
+        self,
+        scraper: CamaraScraper,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: float = DEFAULT_RATE,
+        burst: float | None = None,
+        *,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = BACKOFF_SECONDS,
+    ) -> None:
+        self.scraper = scraper
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = HostRateLimiter(rate, burst)
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        # Projects are saved through the scraper's connection and batch
+        # writer, one at a time, on this thread instead of the event loop
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='crawler-db')
+
+    async def _get(
+        self,
+        url: str,
+        params: dict | None = None,
+        *,
+        store: bool = True,
+        conditional: bool = True,
+    ) -> httpx.Response:
+        if params:
+            params['_'] = int(time.time() * 1000)
+        http_cache = self.scraper.http_cache
+        headers = {}
+        if conditional:
+            # The cache reads and writes files: kept off the event loop
+            headers = await asyncio.to_thread(
+                http_cache.conditional_headers,
+                httpx.URL(url, params=params),
+            )
+        async with self.semaphore:
+            await self.rate_limiter.acquire(url)
+            resp = await self.client.get(url, params=params, headers=headers)
+        record_response(resp, 'page')
+        resolved = await asyncio.to_thread(http_cache.resolve, resp, store=store)
+        if resolved is None:
+            return await self._get(url, params, store=store, conditional=False)
+        resp = resolved
+        resp.raise_for_status()
+        if self.scraper.archive:
+            await asyncio.to_thread(self.scraper.archive.record, resp)
+        return resp
+
+    async def _get_soup(
+        self,
+        url: str,
+        params: dict | None = None,
+        parse_only: SoupStrainer | None = None,
+    ) -> BeautifulSoup:
+        try:
+            resp = await self._get(url, params)
+        except Exception:
+            logger.exception('Erro de conexão ao buscar Soup em %s', url)
+            raise
+        return self.scraper._make_soup(resp, parse_only)
+
+    async def _get_page_items(
+        self,
+        page: int,
+        tipo: TipoProjeto,
+    ) -> tuple[list[tuple[str, date | None]] | None, int | None]:
+        """(link, last movement) pairs of a listing page, and its page count.
+
+        Failed reads are retried with exponential backoff, like the
+        pipeline's jobs; the last failure is counted and raised.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            logger.info('Scraping %s page %d...', tipo, page)
+            try:
+                soup = await self._get_soup(
+                    f'{self.scraper.base_url}/processos',
+                    self.scraper._listing_params(page, tipo),
+                    LISTING_STRAINER,
+                )
+                break
+            except Exception:
+                if attempt == self.max_attempts:
+                    FAILURES.inc(stage='discover')
+                    raise
+                RETRIES.inc(stage='discover')
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+        return (
+            self.scraper._extract_page_items(soup, tipo),
+            self.scraper._extract_page_count(soup),
+        )
+
+    async def _discover_type(
+        self,
+        tipo: TipoProjeto,
+        max_pages: int | None,
+        found: asyncio.Queue[str | None],
+    ) -> None:
+        """Read every listing page of a type, putting new links in `found`.
+
+        The first page tells the page count, and the rest are fetched
+        concurrently. The last page of each batch is checked for more, as the
+        pagination may only link nearby pages; without pagination the pages
+        are read one at a time. A page that fails every attempt is skipped;
+        if it was the last of its batch, the listing ends there.
+        """
+
+        async def read(page: int) -> int | None:
+            """Next page count to reach, or None when the listing ends here."""
+            try:
+                items, page_count = await self._get_page_items(page, tipo)
+            except Exception as e:
+                logger.error('Falha ao buscar a página %d de %s: %s', page, tipo, e)
+                return None
+            if items is None:
+                logger.warning('Nenhum artigo encontrado na página %d de %s.', page, tipo)
+                return None
+            new_links = [link for link, _ in items if link not in self.scraper.processed_links]
+            for link in new_links:
+                found.put_nowait(link)
+            logger.info('Found %d NEW valid %s projects on page %d.', len(new_links), tipo, page)
+            return page_count or page + 1
+
+        read_pages, last_page = 1, await read(1)
+        while last_page:
+            if max_pages:
+                last_page = min(last_page, max_pages)
+            if last_page <= read_pages:
+                break
+            results = await asyncio.gather(
+                *(read(page) for page in range(read_pages + 1, last_page + 1)),
+            )
+            read_pages, last_page = last_page, results[-1]
+
+    async def _sync_type(
+        self,
+        tipo: TipoProjeto,
+        max_pages: int | None,
+        found: asyncio.Queue[str | None],
+    ) -> None:
+        """Async counterpart of `CamaraScraper.sync_project_links`, for one type.
+
+        Listing pages are fetched one at a time, since each decides whether
+        the next one is needed.
+        """
+        page = 1
+        while max_pages is None or page <= max_pages:
+            items, _ = await self._get_page_items(page, tipo)
+            if items is None:
+                logger.warning('Nenhum artigo encontrado na página %d de %s.', page, tipo)
+                break
+
+            changed = self.scraper._select_changed(items)
+            logger.info(
+                'Found %d new or changed %s projects on page %d.',
+                len(changed),
+                tipo,
+                page,
+            )
+            if not changed:
+                break
+            for link in changed:
+                found.put_nowait(link)
+            page += 1
+
+    async def discover(
+        self,
+        max_pages: int | None = None,
+        tipos: Iterable[TipoProjeto] = TIPOS,
+        *,
+        sync: bool = False,
+    ) -> AsyncIterator[str]:
+        """Yield new (or, with `sync`, changed) links as listing pages arrive.
+
+        Every type is discovered concurrently.
+        """
+        found: asyncio.Queue[str | None] = asyncio.Queue()
+        discover_type = self._sync_type if sync else self._discover_type
+
+        async def discover_all() -> None:
+            try:
+                results = await asyncio.gather(
+                    *(discover_type(tipo, max_pages, found) for tipo in tipos),
+                    return_exceptions=True,
+                )
+            finally:
+                found.put_nowait(None)
+            for tipo, result in zip(tipos, results, strict=True):
+                if isinstance(result, BaseException):
+                    logger.error('Falha ao buscar os projetos %s: %s', tipo, result)
+
+        task = asyncio.create_task(discover_all())
+        links: set[str] = set()
+        while (link := await found.get()) is not None:
+            if link not in links:
+                links.add(link)
+                yield link
+        await task
+        logger.info('Total projects found to process: %d', len(links))
+
+    def _conn(self) -> sqlite3.Connection:
+        """This worker thread's connection; the scraper's belongs to the event loop."""
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = connect(DB_FILE, check_same_thread=False)
+            with self._conns_lock:
+                self._conns.append(self._local.conn)
+        return self._local.conn
+
+    def _revalidation(
+        self,
+        url: str,
+    ) -> tuple[tuple[str, int | None, int | None] | None, dict[str, str]]:
+        """The stored blob of a URL and the headers to revalidate it; runs on a thread."""
+        stored = self.scraper._stored_blob(url, self._conn())
+        headers = self.scraper.http_cache.conditional_headers(url) if stored else {}
+        return stored, headers
+
+    def _save_file(
+        self,
+        file: dict,
+        stored: tuple[str, int | None, int | None] | None,
+        blob: BlobWriter | None,
+    ) -> None:
+        """Point a file at its downloaded (or still current) blob; runs on a thread."""
+        if blob:
+            stored = blob.sha256, blob.size, page_count(blob.path)
+            logger.info('Downloaded: %s', file['name'])
+        self.scraper._set_blob(file, *stored, conn=self._conn())
+
+    async def _download(self, file: dict) -> None:
+        url = file['remote_url']
+        blob = None
+        try:
+            # SQLite and disk IO stay off the event loop
+            stored, headers = await asyncio.to_thread(self._revalidation, url)
+            if headers or not stored:
+                async with self.semaphore:
+                    await self.rate_limiter.acquire(url)
+                    # Resuming, limits and validation live in the (thread-safe) downloader
+                    blob = await asyncio.to_thread(self.scraper.downloader.download, url, headers)
+            # A 304 (no blob) keeps the stored one
+            await asyncio.to_thread(self._save_file, file, stored, blob)
+        except Exception:
+            logger.exception('Failed to download PDF %s', url)
+
+    async def _fetch_tab(self, data: dict, name: str, url: str) -> None:
+        resp = await self._get(url)
+        self.scraper._extract_tab(data, name, self.scraper._make_soup(resp))
+
+    async def process_project(self, url: str, *, refresh: bool = False) -> None:
+        if url in self.scraper.processed_links and not refresh:
+            logger.info('Skipping %s (already in DB)', url)
+            return
+
+        with STAGE_SECONDS.time(stage='process_project'):
+            try:
+                logger.info('Processing: %s', url)
+                resp = await self._get(
+                    url,
+                    store=False,
+                    conditional=url in self.scraper.processed_links,
+                )
+                if resp.extensions.get('not_modified'):
+                    logger.info('Not modified: %s', url)
+                    return
+                soup = BeautifulSoup(resp.text, HTML_PARSER, parse_only=PROJECT_STRAINER)
+
+                data = self.scraper._extract_project(url, soup)
+                await asyncio.gather(
+                    *(self._fetch_tab(data, name, u) for name, u in data['tab_urls'].items()),
+                    *(self._download(f) for f in data['files']),
+                )
+
+                await asyncio.get_running_loop().run_in_executor(
+                    self._db,
+                    self.scraper.save_project_to_db,
+                    data,
+                    lambda: self.scraper.http_cache.store(resp),
+                )
+            except Exception:
+                logger.exception('Failed to process %s', url)
+
+    async def run(
+        self,
+        max_pages: int | None = None,
+        tipos: Iterable[TipoProjeto] = TIPOS,
+        *,
+        sync: bool = False,
+    ) -> None:
+        """Process each project as soon as discovery finds it."""
+        tasks = [
+            asyncio.create_task(self.process_project(link, refresh=sync))
+            async for link in self.discover(max_pages, tipos, sync=sync)
+        ]
+        await asyncio.gather(*tasks)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+        await asyncio.to_thread(self._db.shutdown)
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+
+
+async def crawl(
+    max_pages: int | None,
+    concurrency: int,
+    rate: float,
+    tipos: Iterable[TipoProjeto] = TIPOS,
+    *,
+    sync: bool = False,
+    archive: ResponseArchive | None = None,
+) -> None:
+    scraper = CamaraScraper(archive=archive)
+    crawler = AsyncCrawler(scraper, concurrency=concurrency, rate=rate)
+    try:
+        await crawler.run(max_pages, tipos, sync=sync)
+    finally:
+        await crawler.aclose()
+        # Flushes the last batch
+        await asyncio.to_thread(scraper.close)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Crawl camarapoa.rs.gov.br concurrently.',
+    )
+    parser.add_argument(
+        '--pages',
+        type=int,
+        default=None,
+        help='Maximum number of listing pages to crawl per type (default: all)',
+    )
+    parser.add_argument(
+        '--tipos',
+        type=TipoProjeto,
+        nargs='+',
+        choices=TIPOS,
+        default=TIPOS,
+        help='Project types to crawl (default: all)',
+    )
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Re-fetch projects whose last movement changed, stopping at the '
+        'first page with nothing newer',
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help='Maximum number of in-flight requests',
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=DEFAULT_RATE,
+        help='Maximum requests per second per host',
+    )
+    parser.add_argument(
+        '--no-record',
+        action='store_true',
+        help=f'Do not record the responses into {ARCHIVE_DIR} (see replay.py)',
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics on this local port',
+    )
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    archive = None if args.no_record else ResponseArchive(ARCHIVE_DIR)
+    try:
+        asyncio.run(
+            crawl(
+                args.pages,
+                args.concurrency,
+                args.rate,
+                args.tipos,
+                sync=args.sync,
+                archive=archive,
+            ),
+        )
+    except KeyboardInterrupt:
+        logger.warning('Interrompido pelo usuário.')
+    finally:
+        if archive:
+            archive.close()
+        logger.info('Resumo:\n%s', metrics.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,35 @@
+import argparse
+import json
 import logging
 import sqlite3
+import time
+import zlib
 from pathlib import Path
+from typing import Any
 
-SCHEMA_FILE = Path('schema.sql')
+from schemas import AnaliseIA
+
+# Relative to the package, so the scripts work from any directory
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SCHEMA_FILE = ROOT_DIR / 'schema.sql'
+MIGRATIONS_DIR = ROOT_DIR / 'migrations'
+DB_FILE = Path('voz_civica.db')
+
+# Statements after this line of a migration run as batched backfills
+BACKFILL_MARKER = '-- @backfill'
+BACKFILL_BATCH_SIZE = 500
+BACKFILL_PAUSE_SECONDS = 0.05
+
+# WAL lets readers (e.g. the web app) run alongside the crawler's writes, and
+# synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 30000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA mmap_size = 268435456',
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -12,20 +39,271 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _decompress_text(blob: bytes | None) -> str | None:
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+
+def connect(db_path: Path, **kwargs: Any) -> sqlite3.Connection:
+    """Open a connection in WAL mode with the write-friendly pragmas."""
+    conn = sqlite3.connect(db_path, timeout=30, **kwargs)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    # Lets SQL (e.g. migration backfills) read the compressed `textos_pdf.texto`
+    conn.create_function('descomprimir_texto', 1, _decompress_text, deterministic=True)
+    return conn
+
+
+def split_statements(script: str) -> list[str]:
+    """Split a SQL script into statements (trigger bodies included)."""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    if any(
+        line.strip() and not line.strip().startswith('--')
+        for line in buffer.splitlines()
+    ):
+        raise ValueError(f'Comando SQL incompleto: {buffer.strip()[:80]}')
+    return statements
+
+
+def _execute_in_transaction(conn: sqlite3.Connection, statements: list[str]) -> None:
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
 def init_db(db_path: Path) -> None:
+    """Create the base schema and apply pending migrations; safe to run again."""
     if not SCHEMA_FILE.exists():
         logger.error('Erro: Arquivo %s não encontrado.', SCHEMA_FILE)
         return
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    conn = connect(db_path)
+    try:
+        logger.info('Criando tabelas em %s...', db_path)
+        apply_schema(conn)
+    finally:
+        conn.close()
+    logger.info('Banco de dados inicializado com sucesso!')
+
 
-    logger.info('Criando tabelas em %s...', db_path)
+def apply_schema(conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> None:
+    # Every statement is IF NOT EXISTS, so the base schema is re-run as is
+    _execute_in_transaction(
+        conn,
+        split_statements(SCHEMA_FILE.read_text(encoding='utf-8')),
+    )
+    migrate(conn, batch_size)
 
-    with SCHEMA_FILE.open(encoding='utf-8') as f:
-        sql_script = f.read()
-        cursor.executescript(sql_script)
 
+def _ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            backfill_pendente BOOLEAN NOT NULL DEFAULT 0,
+            data_aplicacao DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    )
     conn.commit()
-    conn.close()
-    logger.info('Banco de dados inicializado com sucesso!')
+
+
+def _backfill(
+    conn: sqlite3.Connection,
+    version: int,
+    statements: list[str],
+    batch_size: int,
+) -> None:
+    """Run each statement until it changes no rows, one short transaction per batch.
+
+    Statements must be idempotent and touch at most `:batch_size` rows, so the
+    crawler's writes get the lock between batches and an interrupted backfill
+    resumes where it stopped.
+    """
+    for statement in statements:
+        total = 0
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                changed = conn.execute(statement, {'batch_size': batch_size}).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if changed <= 0:
+                break
+            total += changed
+            time.sleep(BACKFILL_PAUSE_SECONDS)
+        logger.info('Migração %d: %d linhas preenchidas.', version, total)
+
+    conn.execute(
+        'UPDATE schema_version SET backfill_pendente = 0 WHERE versao = ?',
+        (version,),
+    )
+    conn.commit()
+
+
+def migrate(conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> list[int]:
+    """Apply the pending `NNN_name.sql` files of `MIGRATIONS_DIR`, in order.
+
+    The schema changes of each migration and its `schema_version` row commit
+    in one transaction, so a failed migration leaves no trace and concurrent
+    runs apply it once. Statements after `BACKFILL_MARKER` then run in batches
+    (see `_backfill`). Returns the versions applied by this call.
+    """
+    _ensure_version_table(conn)
+
+    new_versions = []
+    for path in sorted(MIGRATIONS_DIR.glob('*.sql')):
+        version = int(path.name.split('_', 1)[0])
+        schema_changes, _, backfill = path.read_text(encoding='utf-8').partition(
+            BACKFILL_MARKER,
+        )
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Checked inside the write transaction: another process may have
+            # applied it since we started
+            row = conn.execute(
+                'SELECT backfill_pendente FROM schema_version WHERE versao = ?',
+                (version,),
+            ).fetchone()
+            if row is None:
+                logger.info('Aplicando migração %s...', path.name)
+                for statement in split_statements(schema_changes):
+                    conn.execute(statement)
+                conn.execute(
+                    """
+                    INSERT INTO schema_version (versao, nome, backfill_pendente)
+                    VALUES (?, ?, ?)
+                    """,
+                    (version, path.stem, bool(backfill.strip())),
+                )
+                new_versions.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if (row is None and backfill.strip()) or (row and row[0]):
+            _backfill(conn, version, split_statements(backfill), batch_size)
+    return new_versions
+
+
+def save_analysis(
+    conn: sqlite3.Connection,
+    projeto_id: int,
+    analise: AnaliseIA,
+    reaproveitada_de: int | None = None,
+) -> int:
+    """Replace the analysis of a project (copied from `reaproveitada_de`, if given)."""
+    cursor = conn.cursor()
+    analise_id = cursor.execute(
+        """
+        INSERT INTO analises_ia (
+            projeto_id, modelo_utilizado, titulo_simplificado, resumo_simples,
+            reaproveitada_de
+        ) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (projeto_id) DO UPDATE SET
+            modelo_utilizado = excluded.modelo_utilizado,
+            titulo_simplificado = excluded.titulo_simplificado,
+            resumo_simples = excluded.resumo_simples,
+            reaproveitada_de = excluded.reaproveitada_de,
+            data_processamento = CURRENT_TIMESTAMP
+        RETURNING id
+        """,
+        (projeto_id, analise.modelo, analise.titulo, analise.resumo, reaproveitada_de),
+    ).fetchone()[0]
+
+    cursor.execute('DELETE FROM analise_mudancas WHERE analise_id = ?', (analise_id,))
+    cursor.execute(
+        'DELETE FROM analise_justificativas WHERE analise_id = ?',
+        (analise_id,),
+    )
+    cursor.execute(
+        'DELETE FROM analise_categorias WHERE analise_id = ?',
+        (analise_id,),
+    )
+    # Child ids change on every save, so the evidence index must be rebuilt
+    cursor.execute(
+        'DELETE FROM trechos_localizacao WHERE analise_id = ?',
+        (analise_id,),
+    )
+
+    cursor.executemany(
+        """
+        INSERT INTO analise_mudancas (analise_id, texto_simplificado, trechos_originais)
+        VALUES (?, ?, ?)
+        """,
+        [
+            (analise_id, item.texto, json.dumps(item.fontes, ensure_ascii=False))
+            for item in analise.mudancas
+        ],
+    )
+    cursor.executemany(
+        """
+        INSERT INTO analise_justificativas (
+            analise_id, texto_simplificado, trechos_originais
+        ) VALUES (?, ?, ?)
+        """,
+        [
+            (analise_id, item.texto, json.dumps(item.fontes, ensure_ascii=False))
+            for item in analise.justificativas
+        ],
+    )
+    cursor.executemany(
+        """
+        INSERT INTO analise_categorias (analise_id, nome_categoria, trechos_originais)
+        VALUES (?, ?, ?)
+        """,
+        [
+            (analise_id, item.categoria, json.dumps(item.fontes, ensure_ascii=False))
+            for item in analise.classificacao
+        ],
+    )
+    conn.commit()
+    return analise_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Create or migrate the database.')
+    parser.add_argument('--db', type=Path, default=DB_FILE, help='Database file')
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=BACKFILL_BATCH_SIZE,
+        help='Rows per backfill transaction',
+    )
+    parser.add_argument(
+        '--status',
+        action='store_true',
+        help='Only list the applied migrations',
+    )
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        if not args.status:
+            apply_schema(conn, args.batch_size)
+        _ensure_version_table(conn)
+        for version, nome, pendente, data in conn.execute(
+            'SELECT versao, nome, backfill_pendente, data_aplicacao FROM schema_version',
+        ):
+            logger.info('%s %s%s', data, nome, ' (backfill pendente)' if pendente else '')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from blobs import BlobStore, BlobWriter
+from http_cache import HttpCache
+from metrics import record_response
+
+MAX_DOWNLOAD_BYTES = 100 << 20
+# Per connect/read; a whole download is bounded by MAX_DOWNLOAD_SECONDS
+DOWNLOAD_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+MAX_DOWNLOAD_SECONDS = 600.0
+MAX_CONNECTIONS = 16
+PDF_HEADER = b'%PDF-'
+PDF_TRAILER = b'%%EOF'
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-\d+/(\d+|\*)')
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadError(Exception):
+    """The server sent something other than the whole, valid file."""
+
+
+def make_client(max_connections: int = MAX_CONNECTIONS) -> httpx.Client:
+    """Pooled client for parallel downloads, shared across threads."""
+    return httpx.Client(
+        # Negotiated via ALPN: HTTP/1.1 servers are still spoken to over HTTP/1.1
+        http2=True,
+        timeout=DOWNLOAD_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        # Byte ranges and lengths must refer to the file itself
+        headers={'Accept-Encoding': 'identity'},
+        follow_redirects=True,
+    )
+
+
+def is_pdf(blob: BlobWriter) -> bool:
+    """Whether a blob starts with a PDF header and ends with its trailer."""
+    return PDF_HEADER in blob.head[:1024] and PDF_TRAILER in blob.tail
+
+
+class Downloader:
+    """Resumable, bounded PDF downloads into a `BlobStore`.
+
+    Each URL is written to its own partial file. An interrupted transfer
+    resumes from there with a Range request, as long as the file's validator
+    still matches. A file is only stored once its length and PDF structure
+    check out, so a truncated or corrupt one never reaches the parser.
+    """
+
+    def __init__(
+        self,
+        blobs: BlobStore,
+        http_cache: HttpCache,
+        client: httpx.Client | None = None,
+        *,
+        max_bytes: int = MAX_DOWNLOAD_BYTES,
+        max_seconds: float = MAX_DOWNLOAD_SECONDS,
+    ) -> None:
+        self.blobs = blobs
+        self.http_cache = http_cache
+        self.client = client or make_client()
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, url: str) -> threading.Lock:
+        # Two threads appending to the same partial file would corrupt it
+        with self._locks_lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def _partial(self, url: str) -> tuple[Path, Path]:
+        """The partial file of a URL and its metadata."""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.blobs.tmp_dir / f'{key}.part', self.blobs.tmp_dir / f'{key}.part.json'
+
+    def _resume_headers(self, part_path: Path, meta_path: Path) -> dict[str, str]:
+        try:
+            size = part_path.stat().st_size
+            validator = json.loads(meta_path.read_text(encoding='utf-8'))['validator']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+        if not size:
+            return {}
+        # A changed file comes back whole (200) instead of the missing range
+        return {'Range': f'bytes={size}-', 'If-Range': validator}
+
+    def _expected_size(self, r: httpx.Response, part_path: Path) -> int | None:
+        """Full size of the file, checking a 206 continues the partial file."""
+        if r.status_code == httpx.codes.PARTIAL_CONTENT:
+            match = CONTENT_RANGE_PATTERN.fullmatch(r.headers.get('content-range', ''))
+            if not match or int(match.group(1)) != part_path.stat().st_size:
+                raise DownloadError(f'Content-Range inesperado: {r.headers.get("content-range")}')
+            return None if match.group(2) == '*' else int(match.group(2))
+        if 'content-length' in r.headers:
+            return int(r.headers['content-length'])
+        return None
+
+    def download(self, url: str, headers: dict[str, str] | None = None) -> BlobWriter | None:
+        """Download a file into the blob store; None if a conditional GET got a 304.
+
+        The partial file is dropped on a `DownloadError`, and kept on network
+        errors and timeouts so the next attempt resumes it.
+        """
+        with self._lock(url):
+            return self._download(url, headers)
+
+    def _download(self, url: str, headers: dict[str, str] | None) -> BlobWriter | None:
+        part_path, meta_path = self._partial(url)
+        # Resuming takes precedence over revalidating a stored copy
+        if resume := self._resume_headers(part_path, meta_path):
+            logger.info('Retomando download de %s (%s)', url, resume['Range'])
+        request_headers = resume or headers or {}
+        try:
+            with self.client.stream('GET', url, headers=request_headers) as r:
+                try:
+                    return self._receive(url, r, part_path, meta_path)
+                finally:
+                    record_response(r, 'pdf')
+        except DownloadError:
+            part_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            raise
+
+    def _receive(
+        self,
+        url: str,
+        r: httpx.Response,
+        part_path: Path,
+        meta_path: Path,
+    ) -> BlobWriter | None:
+        if r.status_code == httpx.codes.NOT_MODIFIED:
+            return None
+        if r.status_code == httpx.codes.REQUESTED_RANGE_NOT_SATISFIABLE:
+            raise DownloadError(f'Arquivo parcial de {url} não corresponde ao remoto')
+        r.raise_for_status()
+
+        expected = self._expected_size(r, part_path)
+        if expected is not None and expected > self.max_bytes:
+            raise DownloadError(f'{url} tem {expected} bytes, acima do limite de {self.max_bytes}')
+        if r.status_code != httpx.codes.PARTIAL_CONTENT:
+            part_path.unlink(missing_ok=True)
+        self.blobs.tmp_dir.mkdir(parents=True, exist_ok=True)
+        if validator := r.headers.get('etag') or r.headers.get('last-modified'):
+            meta_path.write_text(json.dumps({'validator': validator}), encoding='utf-8')
+        else:
+            meta_path.unlink(missing_ok=True)
+
+        deadline = time.monotonic() + self.max_seconds
+        with self.blobs.writer(part_path) as blob:
+            for chunk in r.iter_raw():
+                blob.write(chunk)
+                if blob.size > self.max_bytes:
+                    raise DownloadError(f'{url} excede o limite de {self.max_bytes} bytes')
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'Download de {url} excedeu {self.max_seconds:.0f}s')
+            if expected is not None and blob.size < expected:
+                # Kept: the next attempt asks for the rest
+                raise ConnectionError(
+                    f'Download de {url} incompleto: {blob.size} de {expected} bytes',
+                )
+            if expected is not None and blob.size > expected:
+                raise DownloadError(f'{url} tem {blob.size} bytes, mas {expected} eram esperados')
+            if not is_pdf(blob):
+                raise DownloadError(f'{url} não é um PDF completo')
+
+        meta_path.unlink(missing_ok=True)
+        self.http_cache.store(r, body=False)
+        return blob
+
+    def close(self) -> None:
+        self.client.close()
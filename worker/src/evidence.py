@@ -0,0 +1,306 @@
+import argparse
+import json
+import logging
+import re
+import sqlite3
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+
+import fitz
+
+from db import connect, init_db
+from text_cache import PageTextCache
+
+DB_FILE = Path('voz_civica.db')
+
+# A hyphen between letters, optionally followed by a line break: joins both
+# "trans-\nporte" and "guarda-chuva" the same way in the page and the quote
+HYPHEN_PATTERN = re.compile(r'(?<=\w)[-‐‑­]\s*(?=\w)')
+QUOTE_TRIM = ' \t\n"\'“”‘’«».…[]'
+
+Rect = tuple[float, float, float, float]
+# (page, start, end) of a match within one page's text; a match can span pages
+Segment = tuple[int, int, int]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> tuple[str, list[int]]:
+    """Casefold, drop hyphenation and collapse whitespace.
+
+    Returns the normalized text and, for each of its characters, the index of
+    the original character it came from.
+    """
+    hyphens = {i for m in HYPHEN_PATTERN.finditer(text) for i in range(*m.span())}
+    chars: list[str] = []
+    origins: list[int] = []
+    for i, char in enumerate(text):
+        if i in hyphens:
+            continue
+        if char.isspace():
+            if not chars or chars[-1] == ' ':
+                continue
+            char = ' '
+        chars.append(char.casefold())
+        origins.append(i)
+    return ''.join(chars), origins
+
+
+def normalize_quote(quote: str) -> str:
+    return normalize(quote.strip(QUOTE_TRIM))[0].strip()
+
+
+class QuoteMatcher:
+    """Aho-Corasick automaton finding every pattern in a single pass."""
+
+    def __init__(self, patterns: list[str]) -> None:
+        self.patterns = patterns
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._output: list[list[int]] = [[]]
+        for index, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._output[node].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] += self._output[self._fail[child]]
+
+    def finditer(self, text: str) -> Iterable[tuple[int, int, int]]:
+        """Yield (pattern index, start, end) for every occurrence."""
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for index in self._output[node]:
+                yield index, end - len(self.patterns[index]), end
+
+
+def locate_quotes(pages: list[str], quotes: list[str]) -> list[list[list[Segment]]]:
+    """Every occurrence of each quote in the pages, as per-page segments.
+
+    Pages are searched as one text, so a quote crossing a page break is found
+    and split into one segment per page.
+    """
+    text_parts: list[str] = []
+    origins: list[tuple[int, int] | None] = []
+    for number, page in enumerate(pages, start=1):
+        normalized, page_origins = normalize(page)
+        # Page text usually ends in a line break; the page break replaces it,
+        # so there is a single space, as in the quote, and no segment ends in it
+        if normalized.endswith(' '):
+            normalized, page_origins = normalized[:-1], page_origins[:-1]
+        text_parts.append(normalized + ' ')
+        origins.extend((number, i) for i in page_origins)
+        origins.append(None)
+
+    matcher = QuoteMatcher([normalize_quote(quote) for quote in quotes])
+    matches: list[list[list[Segment]]] = [[] for _ in quotes]
+    for index, start, end in matcher.finditer(''.join(text_parts)):
+        segments: dict[int, list[int]] = {}
+        for origin in origins[start:end]:
+            if origin:
+                page, offset = origin
+                span = segments.setdefault(page, [offset, offset])
+                span[1] = offset
+        matches[index].append(
+            [(page, first, last + 1) for page, (first, last) in segments.items()],
+        )
+    return matches
+
+
+def page_char_boxes(pdf_path: Path | str) -> list[list[tuple[int, Rect] | None]]:
+    """(line number, bbox) of every character of each page's `get_text()`.
+
+    Line breaks get None, so the lists line up with the cached page text.
+    """
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            boxes: list[tuple[int, Rect] | None] = []
+            line_number = 0
+            for block in page.get_text('rawdict')['blocks']:
+                if block['type'] != 0:
+                    continue
+                for line in block['lines']:
+                    boxes.extend(
+                        (line_number, tuple(char['bbox']))
+                        for span in line['spans']
+                        for char in span['chars']
+                    )
+                    boxes.append(None)
+                    line_number += 1
+            pages.append(boxes)
+    return pages
+
+
+def segment_bbox(
+    boxes: list[tuple[int, Rect] | None],
+    start: int,
+    end: int,
+) -> list[Rect]:
+    """One rectangle per text line covered by `start:end`."""
+    lines: dict[int, list[float]] = {}
+    for entry in boxes[start:end]:
+        if entry is None:
+            continue
+        line_number, (x0, y0, x1, y1) = entry
+        if line_number in lines:
+            rect = lines[line_number]
+            rect[:] = min(rect[0], x0), min(rect[1], y0), max(rect[2], x1), max(rect[3], y1)
+        else:
+            lines[line_number] = [x0, y0, x1, y1]
+    return [tuple(round(v, 2) for v in rect) for rect in lines.values()]
+
+
+def index_analysis(
+    conn: sqlite3.Connection,
+    analise_id: int,
+    pages: list[str],
+    pdf_path: Path | str | None = None,
+) -> tuple[int, int]:
+    """Store where each quote of an analysis is in the document.
+
+    Quotes that can't be found (likely hallucinated) get a row with no page and
+    `encontrado = 0`. Returns the number of quotes found and missing.
+    """
+    items = conn.execute(
+        """
+        SELECT 'mudanca', id, trechos_originais FROM analise_mudancas WHERE analise_id = ?
+        UNION ALL
+        SELECT 'justificativa', id, trechos_originais FROM analise_justificativas
+        WHERE analise_id = ?
+        UNION ALL
+        SELECT 'categoria', id, trechos_originais FROM analise_categorias WHERE analise_id = ?
+        """,
+        (analise_id, analise_id, analise_id),
+    ).fetchall()
+    refs = [
+        (origem, item_id, position, quote)
+        for origem, item_id, trechos in items
+        for position, quote in enumerate(json.loads(trechos))
+    ]
+    matches = locate_quotes(pages, [quote for *_, quote in refs])
+
+    boxes = None
+    if pdf_path and Path(pdf_path).exists():
+        boxes = page_char_boxes(pdf_path)
+        if [len(b) for b in boxes] != [len(p) for p in pages]:
+            logger.warning('Texto em cache difere de %s; sem bbox.', pdf_path)
+            boxes = None
+
+    rows = []
+    for (origem, item_id, position, _), occurrences in zip(refs, matches, strict=True):
+        if not occurrences:
+            rows.append((analise_id, origem, item_id, position, False, None, None, None, None))
+        rows.extend(
+            (
+                analise_id,
+                origem,
+                item_id,
+                position,
+                True,
+                page,
+                start,
+                end,
+                json.dumps(segment_bbox(boxes[page - 1], start, end)) if boxes else None,
+            )
+            for segments in occurrences
+            for page, start, end in segments
+        )
+
+    with conn:
+        conn.execute('DELETE FROM trechos_localizacao WHERE analise_id = ?', (analise_id,))
+        conn.executemany(
+            """
+            INSERT INTO trechos_localizacao (
+                analise_id, origem, item_id, trecho_indice, encontrado,
+                pagina, inicio, fim, bbox
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+
+    missing = sum(not occurrences for occurrences in matches)
+    if missing:
+        logger.warning(
+            'Análise %d: %d de %d trechos não encontrados no PDF.',
+            analise_id,
+            missing,
+            len(refs),
+        )
+    return len(refs) - missing, missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Locate the quoted evidence of stored analyses in their PDFs.',
+    )
+    parser.add_argument(
+        '--all',
+        action='store_true',
+        help='Re-index every analysis, not only those never indexed',
+    )
+    args = parser.parse_args()
+
+    init_db(DB_FILE)
+    conn = connect(DB_FILE)
+    text_cache = PageTextCache(DB_FILE)
+    try:
+        analyses = conn.execute(
+            """
+            SELECT a.id, p.link_pdf_principal FROM analises_ia a
+            JOIN projetos p ON p.id = a.projeto_id
+            WHERE p.link_pdf_principal IS NOT NULL
+              AND (? OR NOT EXISTS (
+                SELECT 1 FROM trechos_localizacao t WHERE t.analise_id = a.id
+              ))
+            """,
+            (args.all,),
+        ).fetchall()
+        found = missing = 0
+        for analise_id, pdf_path in analyses:
+            try:
+                _, pages = text_cache.pages(pdf_path)
+                ok, bad = index_analysis(conn, analise_id, pages, pdf_path)
+            except Exception:
+                logger.exception('Falha ao indexar a análise %d', analise_id)
+                continue
+            found += ok
+            missing += bad
+        logger.info(
+            '%d análises indexadas: %d trechos encontrados, %d não encontrados.',
+            len(analyses),
+            found,
+            missing,
+        )
+    finally:
+        text_cache.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
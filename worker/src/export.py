@@ -0,0 +1,450 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from db import connect, init_db
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip copies are written without it
+    brotli = None
+
+DB_FILE = Path('voz_civica.db')
+EXPORT_DIR = Path('data/export')
+MANIFEST_FILE = 'manifest.json'
+PAGE_SIZE = 50
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Snapshot:
+    # Change version (see `projetos_alterados`) the snapshot is up to date with
+    version: int
+    # Path → document of the files to rebuild
+    files: dict[str, Any]
+    # Paths of the files still up to date
+    kept: set[str]
+    # Project ids (id_externo) of each listing page, in order
+    pages: list[list[int]]
+
+
+class SnapshotExporter:
+    """Writes the web app's data as static, pre-compressed JSON files.
+
+    Runs are incremental: the manifest keeps the last change version exported
+    (see `projetos_alterados`), so only the detail files of projects changed
+    since then are rebuilt, along with the listing pages they appear on or
+    that shifted. Files are also content-addressed in the manifest, so only
+    those whose content actually changed are rewritten (and recompressed),
+    and the ones that no longer exist are removed.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        out_dir: Path = EXPORT_DIR,
+        page_size: int = PAGE_SIZE,
+    ) -> None:
+        self.conn = conn
+        self.out_dir = out_dir
+        self.page_size = page_size
+        manifest_path = out_dir / MANIFEST_FILE
+        saved = (
+            json.loads(manifest_path.read_text(encoding='utf-8'))
+            if manifest_path.exists()
+            else {}
+        )
+        if 'arquivos' not in saved:
+            # No manifest, or one from before versions: export everything
+            saved = {'versao': 0, 'paginas': [], 'arquivos': saved}
+        self.version: int = saved['versao']
+        # Project ids (id_externo) of each listing page, in order
+        self.pages: list[list[int]] = saved['paginas']
+        self.manifest: dict[str, str] = saved['arquivos']
+
+    def _evidence(self, ids: str) -> dict[tuple[str, int, int], list[dict[str, Any]]]:
+        evidence: dict[tuple[str, int, int], list[dict[str, Any]]] = defaultdict(list)
+        for origem, item_id, indice, pagina, inicio, fim, bbox in self.conn.execute(
+            """
+            SELECT origem, item_id, trecho_indice, pagina, inicio, fim, bbox
+            FROM trechos_localizacao
+            WHERE encontrado AND analise_id IN (
+                SELECT id FROM analises_ia WHERE projeto_id IN (SELECT value FROM json_each(?))
+            )
+            ORDER BY id
+            """,
+            (ids,),
+        ):
+            evidence[origem, item_id, indice].append(
+                {
+                    'pagina': pagina,
+                    'inicio': inicio,
+                    'fim': fim,
+                    'bbox': json.loads(bbox) if bbox else None,
+                },
+            )
+        return evidence
+
+    def _analysis_items(self, ids: str) -> dict[int, dict[str, list[dict[str, Any]]]]:
+        """The projects' analysis items, with the location of each quote."""
+        evidence = self._evidence(ids)
+        items: dict[int, dict[str, list[dict[str, Any]]]] = defaultdict(
+            lambda: {'mudancas': [], 'justificativas': [], 'categorias': []},
+        )
+        for key, origem, sql in (
+            (
+                'mudancas',
+                'mudanca',
+                'SELECT analise_id, id, texto_simplificado, trechos_originais '
+                'FROM analise_mudancas WHERE analise_id IN ({analyses}) ORDER BY id',
+            ),
+            (
+                'justificativas',
+                'justificativa',
+                'SELECT analise_id, id, texto_simplificado, trechos_originais '
+                'FROM analise_justificativas WHERE analise_id IN ({analyses}) ORDER BY id',
+            ),
+            (
+                'categorias',
+                'categoria',
+                'SELECT analise_id, id, nome_categoria, trechos_originais '
+                'FROM analise_categorias WHERE analise_id IN ({analyses}) ORDER BY id',
+            ),
+        ):
+            analyses = (
+                'SELECT id FROM analises_ia WHERE projeto_id IN (SELECT value FROM json_each(?))'
+            )
+            for analise_id, item_id, texto, trechos in self.conn.execute(
+                sql.format(analyses=analyses),
+                (ids,),
+            ):
+                items[analise_id][key].append(
+                    {
+                        'nome' if key == 'categorias' else 'texto': texto,
+                        'trechos': [
+                            {
+                                'texto': trecho,
+                                'localizacoes': evidence.get((origem, item_id, i), []),
+                            }
+                            for i, trecho in enumerate(json.loads(trechos))
+                        ],
+                    },
+                )
+        return items
+
+    def _timeline(self, ids: str) -> dict[int, dict[str, list[dict[str, Any]]]]:
+        """The projects' movements and votes, oldest first."""
+        timeline: dict[int, dict[str, list[dict[str, Any]]]] = defaultdict(
+            lambda: {'tramitacoes': [], 'votacoes': []},
+        )
+        for projeto_id, setor, chegada, saida, situacao in self.conn.execute(
+            """
+            SELECT projeto_id, setor, data_chegada, data_saida, situacao
+            FROM tramitacoes
+            WHERE projeto_id IN (SELECT value FROM json_each(?))
+            ORDER BY projeto_id, data_chegada, id
+            """,
+            (ids,),
+        ):
+            timeline[projeto_id]['tramitacoes'].append(
+                {
+                    'setor': setor,
+                    'dataChegada': chegada,
+                    'dataSaida': saida,
+                    'situacao': situacao,
+                },
+            )
+        for projeto_id, data, titulo, sim, nao, abstencoes, resultado, url in self.conn.execute(
+            """
+            SELECT
+                projeto_id, data, titulo, votos_sim, votos_nao, abstencoes,
+                resultado, detalhes_url
+            FROM votacoes
+            WHERE projeto_id IN (SELECT value FROM json_each(?))
+            ORDER BY projeto_id, data, id
+            """,
+            (ids,),
+        ):
+            timeline[projeto_id]['votacoes'].append(
+                {
+                    'data': data,
+                    'titulo': titulo,
+                    'votosSim': sim,
+                    'votosNao': nao,
+                    'abstencoes': abstencoes,
+                    'resultado': resultado,
+                    'detalhesUrl': url,
+                },
+            )
+        return timeline
+
+    def _related(self, ids: str) -> dict[int, list[dict[str, Any]]]:
+        """The projects' near-duplicates, most similar first."""
+        related: dict[int, list[dict[str, Any]]] = defaultdict(list)
+        for projeto_id, id_externo, titulo, similaridade in self.conn.execute(
+            """
+            SELECT s.projeto_id, p.id_externo, a.titulo_simplificado, s.similaridade
+            FROM projetos_similares s
+            JOIN projetos p ON p.id = s.similar_id
+            LEFT JOIN analises_ia a ON a.projeto_id = p.id
+            WHERE s.projeto_id IN (SELECT value FROM json_each(?))
+            ORDER BY s.projeto_id, s.similaridade DESC, p.id_externo DESC
+            """,
+            (ids,),
+        ):
+            related[projeto_id].append(
+                {
+                    'idUrl': id_externo,
+                    'tituloSimplificado': titulo,
+                    'similaridade': round(similaridade, 2),
+                },
+            )
+        return related
+
+    def _exported(self, relative: str) -> bool:
+        return relative in self.manifest and (self.out_dir / relative).exists()
+
+    def _details(self, projeto_ids: Iterable[int]) -> dict[str, Any]:
+        """Path → document of the detail file of each project."""
+        ids = json.dumps(list(projeto_ids))
+        analysis_items = self._analysis_items(ids)
+        timeline = self._timeline(ids)
+        related = self._related(ids)
+        rows = self.conn.execute(
+            """
+            SELECT
+                l.projeto_id, l.id_pl, l.id_externo, NULLIF(l.data_abertura, ''), l.autores,
+                l.categorias, p.tipo, p.numero_processo, p.ementa,
+                p.data_ultima_tramitacao, p.situacao_tramitacao, p.situacao_plenaria,
+                a.id, a.modelo_utilizado, a.titulo_simplificado, a.resumo_simples,
+                a.data_processamento
+            FROM projetos_listagem l
+            JOIN projetos p ON p.id = l.projeto_id
+            LEFT JOIN analises_ia a ON a.projeto_id = p.id
+            WHERE l.projeto_id IN (SELECT value FROM json_each(?))
+            """,
+            (ids,),
+        ).fetchall()
+
+        files: dict[str, Any] = {}
+        for (
+            projeto_id,
+            id_pl,
+            id_externo,
+            data_abertura,
+            autores,
+            categorias,
+            tipo,
+            numero_processo,
+            ementa,
+            data_ultima_tramitacao,
+            situacao_tramitacao,
+            situacao_plenaria,
+            analise_id,
+            modelo,
+            titulo,
+            resumo,
+            data_processamento,
+        ) in rows:
+            files[f'projetos/{id_externo}.json'] = {
+                'idPl': id_pl,
+                'idUrl': id_externo,
+                'dataAbertura': data_abertura,
+                'tituloSimplificado': titulo,
+                'autores': json.loads(autores),
+                'categorias': json.loads(categorias),
+                'numeroProcesso': numero_processo,
+                'tipo': tipo,
+                'ementa': ementa,
+                'dataUltimaTramitacao': data_ultima_tramitacao,
+                'situacaoTramitacao': situacao_tramitacao,
+                'situacaoPlenaria': situacao_plenaria,
+                **timeline[projeto_id],
+                'relacionados': related[projeto_id],
+                'analise': {
+                    'modelo': modelo,
+                    'titulo': titulo,
+                    'resumo': resumo,
+                    'dataProcessamento': data_processamento,
+                    **analysis_items[analise_id],
+                }
+                if analise_id
+                else None,
+            }
+        return files
+
+    def build(self) -> Snapshot:
+        """The files to rebuild since the last export.
+
+        Reads a single snapshot of the DB, so the version matches the data.
+        """
+        self.conn.execute('BEGIN')
+        try:
+            version = self.conn.execute(
+                'SELECT COALESCE(MAX(versao), 0) FROM projetos_alterados',
+            ).fetchone()[0]
+            changed = {
+                projeto_id
+                for (projeto_id,) in self.conn.execute(
+                    'SELECT projeto_id FROM projetos_alterados WHERE versao > ?',
+                    (self.version,),
+                )
+            }
+            # The listing read model is already in listing order and aggregated
+            listing = self.conn.execute(
+                """
+                SELECT
+                    projeto_id, id_pl, id_externo, NULLIF(data_abertura, ''),
+                    titulo_simplificado, autores
+                FROM projetos_listagem
+                ORDER BY data_abertura DESC, id_externo DESC
+                """,
+            ).fetchall()
+            rebuilt = {
+                projeto_id
+                for projeto_id, _, id_externo, *_ in listing
+                if not self.version
+                or projeto_id in changed
+                or not self._exported(f'projetos/{id_externo}.json')
+            }
+            files = self._details(rebuilt)
+        finally:
+            self.conn.rollback()
+
+        pages = [
+            listing[start : start + self.page_size]
+            for start in range(0, len(listing), self.page_size)
+        ] or [[]]
+        for number, page in enumerate(pages, start=1):
+            relative = f'listagem/{number}.json'
+            ids = [id_externo for _, _, id_externo, *_ in page]
+            if (
+                self.pages[number - 1 : number] == [ids]
+                and not any(projeto_id in rebuilt for projeto_id, *_ in page)
+                and self._exported(relative)
+            ):
+                continue
+            files[relative] = [
+                {
+                    'idPl': id_pl,
+                    'idUrl': id_externo,
+                    'dataAbertura': data_abertura,
+                    'tituloSimplificado': titulo,
+                    'autores': json.loads(autores),
+                }
+                for _, id_pl, id_externo, data_abertura, titulo, autores in page
+            ]
+        files['listagem/index.json'] = {
+            'total': len(listing),
+            'paginas': len(pages),
+            'tamanhoPagina': self.page_size,
+        }
+        kept = {
+            f'projetos/{id_externo}.json'
+            for projeto_id, _, id_externo, *_ in listing
+            if projeto_id not in rebuilt
+        } | {
+            f'listagem/{number}.json'
+            for number in range(1, len(pages) + 1)
+            if f'listagem/{number}.json' not in files
+        }
+        return Snapshot(
+            version,
+            files,
+            kept,
+            [[id_externo for _, _, id_externo, *_ in page] for page in pages],
+        )
+
+    def _write(self, relative: str, data: bytes) -> None:
+        path = self.out_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        variants = {
+            path: data,
+            path.with_name(f'{path.name}.gz'): gzip.compress(data, 9, mtime=0),
+        }
+        if brotli:
+            variants[path.with_name(f'{path.name}.br')] = brotli.compress(data)
+        for target, content in variants.items():
+            tmp_path = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+            tmp_path.write_bytes(content)
+            tmp_path.replace(target)
+
+    def _remove(self, relative: str) -> None:
+        path = self.out_dir / relative
+        for suffix in ('', '.gz', '.br'):
+            path.with_name(f'{path.name}{suffix}').unlink(missing_ok=True)
+
+    def export(self) -> tuple[int, int]:
+        """Write the changed files; returns how many were written and removed."""
+        snapshot = self.build()
+        manifest = {relative: self.manifest[relative] for relative in snapshot.kept}
+        written = 0
+        for relative, document in snapshot.files.items():
+            data = json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode()
+            digest = hashlib.sha256(data).hexdigest()
+            manifest[relative] = digest
+            if self.manifest.get(relative) != digest or not (self.out_dir / relative).exists():
+                self._write(relative, data)
+                written += 1
+
+        stale = self.manifest.keys() - manifest.keys()
+        for relative in stale:
+            self._remove(relative)
+
+        saved = {'versao': snapshot.version, 'paginas': snapshot.pages, 'arquivos': manifest}
+        self._write(MANIFEST_FILE, json.dumps(saved, indent=1, sort_keys=True).encode())
+        self.version = snapshot.version
+        self.pages = snapshot.pages
+        self.manifest = manifest
+        return written, len(stale)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Export the projects as static JSON files for the web app.',
+    )
+    parser.add_argument(
+        '--out',
+        type=Path,
+        default=EXPORT_DIR,
+        help='Output directory',
+    )
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=PAGE_SIZE,
+        help='Projects per listing page',
+    )
+    args = parser.parse_args()
+
+    init_db(DB_FILE)
+    conn = connect(DB_FILE)
+    try:
+        exporter = SnapshotExporter(conn, args.out, args.page_size)
+        written, removed = exporter.export()
+        logger.info(
+            '%d arquivos escritos, %d removidos, %d inalterados.',
+            written,
+            removed,
+            len(exporter.manifest) - written,
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
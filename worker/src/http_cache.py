@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import httpx
+
+VALIDATOR_HEADERS = ('etag', 'last-modified', 'content-type')
+
+
+class HttpCache:
+    """On-disk cache of response validators and bodies, keyed by URL.
+
+    The volatile `_` cache-buster param is ignored when building keys. Entries
+    without a body (e.g. PDFs, whose body is the downloaded file) only keep
+    the validators used for conditional GETs.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+
+    def _key(self, url: httpx.URL | str) -> str:
+        url = httpx.URL(url).copy_remove_param('_')
+        return hashlib.sha256(str(url).encode()).hexdigest()
+
+    def _paths(self, url: httpx.URL | str) -> tuple[Path, Path]:
+        key = self._key(url)
+        shard = self.cache_dir / key[:2]
+        return shard / f'{key}.json', shard / f'{key}.body'
+
+    def _load_meta(self, url: httpx.URL | str) -> dict | None:
+        meta_path, _ = self._paths(url)
+        try:
+            return json.loads(meta_path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def conditional_headers(self, url: httpx.URL | str) -> dict[str, str]:
+        headers = {}
+        if meta := self._load_meta(url):
+            if etag := meta.get('etag'):
+                headers['If-None-Match'] = etag
+            if last_modified := meta.get('last-modified'):
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def store(self, resp: httpx.Response, *, body: bool = True) -> None:
+        """Save the validators (and optionally the body) of a 200 response.
+
+        A resumed download (206) also holds the validators of the whole file.
+        """
+        resumed = resp.status_code == httpx.codes.PARTIAL_CONTENT and not body
+        if resp.status_code != httpx.codes.OK and not resumed:
+            return
+        meta = {h: resp.headers[h] for h in VALIDATOR_HEADERS if h in resp.headers}
+        if not ('etag' in meta or 'last-modified' in meta):
+            return
+
+        meta_path, body_path = self._paths(resp.request.url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        if body:
+            _atomic_write(body_path, resp.content)
+        meta['has_body'] = body
+        _atomic_write(meta_path, json.dumps(meta).encode())
+
+    def discard(self, url: httpx.URL | str) -> None:
+        for path in self._paths(url):
+            path.unlink(missing_ok=True)
+
+    def resolve(
+        self,
+        resp: httpx.Response,
+        *,
+        store: bool = True,
+    ) -> httpx.Response | None:
+        """Turn a 304 into the cached 200 response, or cache a fresh one.
+
+        Responses served from the cache carry `extensions['not_modified']`. A
+        304 the cache can't serve (its body or meta is gone) drops the entry
+        and returns None: the GET must be sent again, without validators.
+        """
+        if resp.status_code != httpx.codes.NOT_MODIFIED:
+            if store:
+                self.store(resp)
+            return resp
+
+        meta = self._load_meta(resp.request.url)
+        _, body_path = self._paths(resp.request.url)
+        try:
+            if not meta or not meta.get('has_body'):
+                raise FileNotFoundError(body_path)
+            content = body_path.read_bytes()
+        except FileNotFoundError:
+            self.discard(resp.request.url)
+            return None
+
+        headers = {h: meta[h] for h in VALIDATOR_HEADERS if h in meta}
+        return httpx.Response(
+            httpx.codes.OK,
+            headers=headers,
+            content=content,
+            request=resp.request,
+            extensions={'not_modified': True},
+        )
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
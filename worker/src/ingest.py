@@ -0,0 +1,160 @@
+import logging
+import sqlite3
+from collections import defaultdict
+from typing import Any, TypeVar
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pydantic_core import to_json
+
+from db import save_analysis
+from schemas import AnaliseIA, RespostaAnalise
+
+# Keywords of the OpenAPI subset accepted as a Gemini response schema
+GEMINI_SCHEMA_KEYS = {'type', 'format', 'description', 'nullable', 'enum', 'required'}
+
+# Adapters are built once: building the validator is the expensive part
+RESPOSTA_ADAPTER = TypeAdapter(RespostaAnalise)
+ANALISE_ADAPTER = TypeAdapter(AnaliseIA)
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+def gemini_schema(model: type[BaseModel]) -> dict[str, Any]:
+    """The model's JSON schema in the form Gemini accepts.
+
+    References are inlined and keywords Gemini rejects (titles, defaults,
+    constraints) are dropped.
+    """
+    schema = model.model_json_schema()
+    defs = schema.pop('$defs', {})
+
+    def resolve(node: dict[str, Any]) -> dict[str, Any]:
+        if ref := node.get('$ref'):
+            # Siblings of a reference (e.g. the field's description) win
+            node = {**defs[ref.rsplit('/', 1)[-1]], **node}
+        resolved: dict[str, Any] = {}
+        for key, value in node.items():
+            if key == 'properties':
+                resolved[key] = {name: resolve(prop) for name, prop in value.items()}
+            elif key == 'items':
+                resolved[key] = resolve(value)
+            elif key in GEMINI_SCHEMA_KEYS:
+                resolved[key] = value
+        return resolved
+
+    return resolve(schema)
+
+
+def validate_batch(
+    adapter: TypeAdapter[list[T]],
+    items: list[Any],
+) -> tuple[list[T], list[tuple[Any, list[dict[str, Any]]]]]:
+    """Validate a batch in one pass; returns the valid items and the rejected ones.
+
+    Only when the batch fails are the bad items told apart (by the index in
+    each error's location) and the rest validated again.
+    """
+    try:
+        return adapter.validate_python(items), []
+    except ValidationError as e:
+        errors: dict[int, list[dict[str, Any]]] = defaultdict(list)
+        for error in e.errors(include_url=False):
+            index, *loc = error['loc']
+            errors[index].append({**error, 'loc': tuple(loc)})
+    valid = adapter.validate_python([item for i, item in enumerate(items) if i not in errors])
+    return valid, [(items[i], item_errors) for i, item_errors in errors.items()]
+
+
+def validate_response(result: Any) -> dict[str, Any]:
+    """Check a (chunk) response of the model against `RespostaAnalise`."""
+    return RESPOSTA_ADAPTER.validate_python(result).model_dump(mode='json')
+
+
+def to_analise(result: dict[str, Any], modelo: str) -> AnaliseIA:
+    """Map a merged `RespostaAnalise` result onto `AnaliseIA`."""
+    resposta = RESPOSTA_ADAPTER.validate_python(result)
+    return ANALISE_ADAPTER.validate_python(
+        {
+            'modelo': modelo,
+            'titulo': resposta.titulo,
+            'resumo': resposta.resumo,
+            'mudancas': [
+                {'texto': item.texto_simplificado, 'fontes': item.trechos_originais}
+                for item in resposta.mudancas
+            ],
+            'justificativas': [
+                {'texto': item.texto_simplificado, 'fontes': item.trechos_originais}
+                for item in resposta.justificativas
+            ],
+            'classificacao': [
+                {'categoria': item.nome, 'fontes': item.trechos_originais}
+                for item in resposta.categorias
+            ],
+        },
+    )
+
+
+def quarantine(
+    conn: sqlite3.Connection,
+    origem: str,
+    rejected: list[tuple[Any, Any, list[dict[str, Any]]]],
+) -> None:
+    """Keep (key, data, errors) of rejected rows in `quarentena`; doesn't commit.
+
+    Only the latest rejection of each key is kept.
+    """
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO quarentena (origem, chave, dados, erros)
+        VALUES (?, ?, ?, ?)
+        """,
+        [
+            (
+                origem,
+                str(chave),
+                to_json(dados, fallback=str).decode(),
+                to_json(erros, fallback=str).decode(),
+            )
+            for chave, dados, erros in rejected
+        ],
+    )
+    for chave, _, erros in rejected:
+        logger.warning(
+            'Quarentena (%s %s): %s',
+            origem,
+            chave,
+            '; '.join(f'{".".join(map(str, e["loc"]))}: {e["msg"]}' for e in erros),
+        )
+
+
+def release(conn: sqlite3.Connection, origem: str, chaves: list[Any]) -> None:
+    """Drop the quarantined rows of keys that were since saved; doesn't commit."""
+    conn.execute(
+        """
+        DELETE FROM quarentena
+        WHERE origem = ? AND chave IN (SELECT value FROM json_each(?))
+        """,
+        (origem, to_json([str(chave) for chave in chaves]).decode()),
+    )
+
+
+def ingest_analysis(
+    conn: sqlite3.Connection,
+    projeto_id: int,
+    modelo: str,
+    result: dict[str, Any],
+    reaproveitada_de: int | None = None,
+) -> int | None:
+    """Validate and save a merged result; None if it was quarantined instead."""
+    try:
+        analise = to_analise(result, modelo)
+    except ValidationError as e:
+        with conn:
+            quarantine(conn, 'analise', [(projeto_id, result, e.errors(include_url=False))])
+        return None
+
+    # Committed along with the analysis
+    release(conn, 'analise', [projeto_id])
+    return save_analysis(conn, projeto_id, analise, reaproveitada_de)
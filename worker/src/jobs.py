@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from db import connect
+
+
+@dataclass(frozen=True)
+class Job:
+    id: int
+    etapa: str
+    chave: str
+    payload: dict[str, Any]
+    tentativas: int
+
+
+class JobQueue:
+    """Durable work queue backed by the `tarefas` table.
+
+    Jobs are leased rather than popped: a worker that dies mid-job simply lets
+    its lease expire and the job becomes available again.
+    """
+
+    def __init__(self, db_path: Path, lease_seconds: float = 300) -> None:
+        self.lease_seconds = lease_seconds
+        self.conn = connect(db_path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def enqueue(
+        self,
+        etapa: str,
+        chave: str,
+        payload: dict[str, Any] | None = None,
+        *,
+        requeue: bool = False,
+    ) -> None:
+        """Add a job; existing jobs are left alone unless `requeue` is set."""
+        sql = """
+            INSERT INTO tarefas (etapa, chave, payload, disponivel_em)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (etapa, chave) DO NOTHING
+        """
+        if requeue:
+            sql = """
+                INSERT INTO tarefas (etapa, chave, payload, disponivel_em)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (etapa, chave) DO UPDATE SET
+                    payload = excluded.payload,
+                    status = 'pending',
+                    tentativas = 0,
+                    disponivel_em = excluded.disponivel_em,
+                    ultimo_erro = NULL,
+                    data_atualizacao = CURRENT_TIMESTAMP
+                WHERE status != 'running'
+            """
+        with self._lock:
+            self.conn.execute(
+                sql,
+                (etapa, chave, json.dumps(payload or {}), time.time()),
+            )
+
+    def lease(self, etapa: str) -> Job | None:
+        """Claim the oldest available job of a stage, or an expired lease."""
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                """
+                UPDATE tarefas SET
+                    status = 'running',
+                    tentativas = tentativas + 1,
+                    lease_ate = ?,
+                    data_atualizacao = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM tarefas
+                    WHERE etapa = ?
+                      AND (
+                        (status = 'pending' AND disponivel_em <= ?)
+                        OR (status = 'running' AND lease_ate < ?)
+                      )
+                    ORDER BY disponivel_em
+                    LIMIT 1
+                )
+                RETURNING id, etapa, chave, payload, tentativas
+                """,
+                (now + self.lease_seconds, etapa, now, now),
+            ).fetchone()
+        if not row:
+            return None
+        return Job(row[0], row[1], row[2], json.loads(row[3] or '{}'), row[4])
+
+    def complete(self, job: Job) -> None:
+        with self._lock:
+            self.conn.execute(
+                """
+                UPDATE tarefas SET
+                    status = 'done',
+                    lease_ate = NULL,
+                    ultimo_erro = NULL,
+                    data_atualizacao = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (job.id,),
+            )
+
+    def fail(
+        self,
+        job: Job,
+        error: str,
+        *,
+        max_attempts: int,
+        backoff: float,
+    ) -> None:
+        """Reschedule with exponential backoff, or give up after `max_attempts`."""
+        status = 'failed' if job.tentativas >= max_attempts else 'pending'
+        delay = backoff * 2 ** (job.tentativas - 1)
+        with self._lock:
+            self.conn.execute(
+                """
+                UPDATE tarefas SET
+                    status = ?,
+                    lease_ate = NULL,
+                    disponivel_em = ?,
+                    ultimo_erro = ?,
+                    data_atualizacao = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (status, time.time() + delay, error, job.id),
+            )
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        """Number of jobs per stage and status."""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT etapa, status, COUNT(*) FROM tarefas GROUP BY etapa, status',
+            ).fetchall()
+        counts: dict[str, dict[str, int]] = {}
+        for etapa, status, count in rows:
+            counts.setdefault(etapa, {})[status] = count
+        return counts
+
+    def close(self) -> None:
+        self.conn.close()
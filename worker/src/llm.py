@@ -0,0 +1,102 @@
+import json
+from typing import Any, Protocol
+
+import httpx
+from google import genai
+from google.genai import errors
+
+from chunking import approx_tokens
+from metrics import record_usage
+from parser import (
+    LEGISLATION_SCHEMA,
+    MODEL_NAME,
+    SYSTEM_PROMPT,
+    generation_config,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate prompt tokens of a request, system prompt included."""
+    return approx_tokens(SYSTEM_PROMPT) + approx_tokens(text)
+
+
+class RateLimitError(Exception):
+    """The backend rejected a request for quota or rate limit reasons."""
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMBackend(Protocol):
+    """Async client that turns a bill's text into a `LEGISLATION_SCHEMA` dict.
+
+    Implementations raise `RateLimitError` when throttled, so callers can back
+    off and shrink their concurrency.
+    """
+
+    model: str
+
+    async def generate(self, text: str) -> dict[str, Any]: ...
+
+    async def aclose(self) -> None: ...
+
+
+class GeminiBackend:
+    def __init__(self, api_key: str | None = None, model: str = MODEL_NAME) -> None:
+        self.model = model
+        self.client = genai.Client(api_key=api_key)
+
+    async def generate(self, text: str) -> dict[str, Any]:
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=text,
+                config=generation_config(),
+            )
+        except errors.APIError as e:
+            if e.code == httpx.codes.TOO_MANY_REQUESTS:
+                raise RateLimitError(str(e)) from e
+            raise
+        record_usage(response.usage_metadata)
+        return response.parsed if response.parsed else json.loads(response.text)  # type: ignore[attr-defined]
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HttpBackend:
+    """Backend for any server speaking a minimal JSON protocol.
+
+    `POST {base_url}/generate` with `model`, `system_instruction`,
+    `response_schema` and `contents`, answering with the result object. A 429
+    (with an optional Retry-After in seconds) means throttling. Meant for
+    local stub servers standing in for Gemini in tests and benchmarks.
+    """
+
+    def __init__(self, base_url: str, model: str = MODEL_NAME, timeout: float = 300) -> None:
+        self.model = model
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+
+    async def generate(self, text: str) -> dict[str, Any]:
+        resp = await self.client.post(
+            '/generate',
+            json={
+                'model': self.model,
+                'system_instruction': SYSTEM_PROMPT,
+                'response_schema': LEGISLATION_SCHEMA,
+                'contents': text,
+            },
+        )
+        if resp.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            # Only the delay-seconds form; an HTTP-date falls back to backoff
+            retry_after = resp.headers.get('Retry-After', '')
+            raise RateLimitError(
+                f'{resp.status_code} {resp.reason_phrase}',
+                float(retry_after) if retry_after.isdigit() else None,
+            )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from db import connect, init_db
+
+DB_FILE = Path('voz_civica.db')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(value: str | dict | list) -> str:
+    """SHA-256 of a string, or of the canonical JSON of a dict/list."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Persistent cache of LLM results in `cache_llm`.
+
+    Entries are keyed on the hashes of the input text, model, system prompt and
+    response schema, so changing any of them is a miss. Each component is also
+    stored on its own to allow invalidation by model or prompt version.
+    """
+
+    def __init__(self, db_path: Path = DB_FILE, max_entries: int | None = None) -> None:
+        self.max_entries = max_entries
+        self.conn = connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _components(
+        self,
+        text: str,
+        model: str,
+        prompt: str,
+        schema: dict,
+    ) -> tuple[str, str, str, str, str]:
+        texto = fingerprint(text)
+        prompt_sha = fingerprint(prompt)
+        schema_sha = fingerprint(schema)
+        chave = fingerprint([texto, model, prompt_sha, schema_sha])
+        return chave, texto, model, prompt_sha, schema_sha
+
+    def get(
+        self,
+        text: str,
+        model: str,
+        prompt: str,
+        schema: dict,
+    ) -> dict[str, Any] | None:
+        chave = self._components(text, model, prompt, schema)[0]
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                """
+                UPDATE cache_llm SET acessos = acessos + 1, ultimo_acesso = ?
+                WHERE chave = ?
+                RETURNING resultado
+                """,
+                (time.time(), chave),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(
+        self,
+        text: str,
+        model: str,
+        prompt: str,
+        schema: dict,
+        result: dict[str, Any],
+    ) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO cache_llm (
+                    chave, texto_sha256, modelo, prompt_sha256, schema_sha256,
+                    resultado, ultimo_acesso
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    *self._components(text, model, prompt, schema),
+                    json.dumps(result, ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+        if self.max_entries is not None:
+            self.evict(self.max_entries)
+
+    def evict(self, max_entries: int) -> int:
+        """Drop the least recently used entries beyond `max_entries`."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                """
+                DELETE FROM cache_llm WHERE chave IN (
+                    SELECT chave FROM cache_llm
+                    ORDER BY ultimo_acesso DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (max_entries,),
+            )
+        return cursor.rowcount
+
+    def invalidate(
+        self,
+        *,
+        model: str | None = None,
+        prompt_sha256: str | None = None,
+        schema_sha256: str | None = None,
+    ) -> int:
+        """Drop every entry matching all of the given components."""
+        if not (model or prompt_sha256 or schema_sha256):
+            raise ValueError('At least one component must be given.')
+
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                """
+                DELETE FROM cache_llm
+                WHERE (:model IS NULL OR modelo = :model)
+                  AND (:prompt IS NULL OR prompt_sha256 = :prompt)
+                  AND (:schema IS NULL OR schema_sha256 = :schema)
+                """,
+                {'model': model, 'prompt': prompt_sha256, 'schema': schema_sha256},
+            )
+        return cursor.rowcount
+
+    def stats(self) -> list[tuple[str, str, str, int, int]]:
+        """(model, prompt hash, schema hash, entries, hits) per cache version."""
+        with self._lock:
+            return self.conn.execute(
+                """
+                SELECT modelo, prompt_sha256, schema_sha256, COUNT(*), SUM(acessos)
+                FROM cache_llm
+                GROUP BY modelo, prompt_sha256, schema_sha256
+                ORDER BY MAX(ultimo_acesso) DESC
+                """,
+            ).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Inspect and prune the LLM cache.')
+    parser.add_argument('--model', type=str, help='Invalidate entries of this model')
+    parser.add_argument(
+        '--prompt',
+        type=str,
+        help='Invalidate entries of this prompt hash (see the listing)',
+    )
+    parser.add_argument(
+        '--schema',
+        type=str,
+        help='Invalidate entries of this schema hash (see the listing)',
+    )
+    parser.add_argument(
+        '--max-entries',
+        type=int,
+        help='Evict least recently used entries beyond this count',
+    )
+    args = parser.parse_args()
+
+    init_db(DB_FILE)
+    cache = LLMCache(DB_FILE)
+    try:
+        if args.model or args.prompt or args.schema:
+            removed = cache.invalidate(
+                model=args.model,
+                prompt_sha256=args.prompt,
+                schema_sha256=args.schema,
+            )
+            logger.info('%d entradas invalidadas.', removed)
+        if args.max_entries is not None:
+            logger.info('%d entradas removidas.', cache.evict(args.max_entries))
+
+        for model, prompt_sha, schema_sha, entries, hits in cache.stats():
+            logger.info(
+                '%s prompt=%s schema=%s: %d entradas, %d acessos',
+                model,
+                prompt_sha,
+                schema_sha,
+                entries,
+                hits,
+            )
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, ParamSpec, TypeVar
+
+import httpx
+
+# Upper bounds (seconds), from page parsing up to long LLM calls
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+logger = logging.getLogger(__name__)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(names, values, strict=True), *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metric:
+    """Base of the metrics: a value per combination of label values."""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], Any] = {}
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if labels.keys() != set(self.labels):
+            raise ValueError(f'{self.name} expects labels {self.labels}, got {tuple(labels)}.')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def items(self) -> list[tuple[tuple[str, ...], Any]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in self.items():
+            yield f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+
+    def exposition(self) -> str:
+        return '\n'.join(
+            [
+                f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.kind}',
+                *self._samples(),
+            ],
+        )
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class HistogramValue:
+    def __init__(self, buckets: int) -> None:
+        self.buckets = [0] * buckets
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if not (histogram := self._values.get(key)):
+                histogram = self._values[key] = HistogramValue(len(self.buckets))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram.buckets[index] += 1
+            histogram.count += 1
+            histogram.sum += value
+            histogram.max = max(histogram.max, value)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the block, even when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        for key, histogram in self.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.buckets, strict=True):
+                cumulative += count
+                bucket_labels = _format_labels(self.labels, key, le=_format_value(bound))
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            bucket_labels = _format_labels(self.labels, key, le='+Inf')
+            yield f'{self.name}_bucket{bucket_labels} {histogram.count}'
+            labels = _format_labels(self.labels, key)
+            yield f'{self.name}_sum{labels} {_format_value(histogram.sum)}'
+            yield f'{self.name}_count{labels} {histogram.count}'
+
+
+STAGE_SECONDS = Histogram(
+    'worker_stage_seconds',
+    'Duration of each instrumented step.',
+    ('stage',),
+)
+JOB_SECONDS = Histogram(
+    'worker_job_seconds',
+    'Duration of each pipeline job, by stage.',
+    ('stage',),
+)
+HTTP_RESPONSES = Counter(
+    'worker_http_responses_total',
+    'HTTP responses from the Câmara site, by status code.',
+    ('status',),
+)
+DOWNLOADED_BYTES = Counter(
+    'worker_downloaded_bytes_total',
+    'Bytes received from the Câmara site.',
+    ('kind',),
+)
+RETRIES = Counter(
+    'worker_retries_total',
+    'Attempts that failed and were scheduled again.',
+    ('stage',),
+)
+FAILURES = Counter(
+    'worker_failures_total',
+    'Work given up on after its last attempt failed.',
+    ('stage',),
+)
+LLM_TOKENS = Counter(
+    'worker_llm_tokens_total',
+    'Tokens sent to and received from the LLM.',
+    ('direction',),
+)
+QUEUE_DEPTH = Gauge(
+    'worker_queue_depth',
+    'Jobs in the pipeline queue, by stage and status.',
+    ('stage', 'status'),
+)
+METRICS: tuple[Metric, ...] = (
+    STAGE_SECONDS,
+    JOB_SECONDS,
+    HTTP_RESPONSES,
+    DOWNLOADED_BYTES,
+    RETRIES,
+    FAILURES,
+    LLM_TOKENS,
+    QUEUE_DEPTH,
+)
+
+
+def timed(stage: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Record each call of the decorated function under `stage`."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with STAGE_SECONDS.time(stage=stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_response(resp: httpx.Response, kind: str) -> None:
+    """Count a response's status and the bytes of its body read so far."""
+    HTTP_RESPONSES.inc(status=resp.status_code)
+    DOWNLOADED_BYTES.inc(resp.num_bytes_downloaded, kind=kind)
+
+
+def record_usage(usage: Any) -> None:
+    """Count the tokens of a Gemini response's `usage_metadata`."""
+    if usage:
+        LLM_TOKENS.inc(usage.prompt_token_count or 0, direction='input')
+        LLM_TOKENS.inc(usage.candidates_token_count or 0, direction='output')
+
+
+def exposition() -> str:
+    """Every metric in the Prometheus text format."""
+    return '\n'.join(metric.exposition() for metric in METRICS) + '\n'
+
+
+def summary() -> str:
+    """Human-readable run summary; the slowest steps (by total time) first."""
+    lines = []
+    for histogram in (STAGE_SECONDS, JOB_SECONDS):
+        for (stage,), value in sorted(histogram.items(), key=lambda item: -item[1].sum):
+            lines.append(
+                f'{stage}: {value.count}x, total {value.sum:.1f}s, '
+                f'média {value.sum / value.count * 1000:.0f}ms, máx {value.max * 1000:.0f}ms',
+            )
+    for counter in (HTTP_RESPONSES, DOWNLOADED_BYTES, RETRIES, FAILURES, LLM_TOKENS):
+        if values := counter.items():
+            counts = ', '.join(f'{key[0]}={_format_value(value)}' for key, value in values)
+            lines.append(f'{counter.name}: {counts}')
+    return '\n'.join(lines)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve `/metrics` from a daemon thread for the life of the process."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info('Métricas em http://%s:%d/metrics', host, server.server_address[1])
+    return server
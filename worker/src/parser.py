@@ -2,13 +2,21 @@ import argparse
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
-import fitz
 from google import genai
 from google.genai import types
 
+from chunking import MAX_CHUNK_TOKENS, chunk_prompts, merge_results
+from db import init_db
+from ingest import gemini_schema, validate_response
+from llm_cache import LLMCache
+from metrics import record_usage, timed
+from schemas import RespostaAnalise
+from text_cache import PageTextCache, extract_pages, join_pages
+
 MODEL_NAME = 'gemini-3-pro-preview'
 SYSTEM_PROMPT = """
 Você é um especialista em Linguagem Simples (Plain Language) e comunicação legislativa voltada ao cidadão comum.
@@ -26,100 +34,7 @@ DIRETRIZES DE REDAÇÃO:
 Se o projeto for apenas uma homenagem, nome de rua ou data comemorativa, deixe isso claro e seja breve.
 """
 
-LEGISLATION_SCHEMA = {
-    'type': 'object',
-    'properties': {
-        'titulo': {
-            'type': 'string',
-            'description': "Título curto e chamativo (máx 10 palavras) explicando o projeto. Ex: 'Proibição de fogos de artifício com ruído'.",
-        },
-        'resumo': {
-            'type': 'string',
-            'description': "Uma única frase simples explicando o objetivo central. Comece diretamente com o verbo (ex: 'Cria', 'Proíbe', 'Autoriza'), sem citar 'o projeto'.",
-        },
-        'mudancas': {
-            'type': 'array',
-            'description': 'Lista de mudanças práticas propostas pelo projeto.',
-            'items': {
-                'type': 'object',
-                'properties': {
-                    'texto_simplificado': {
-                        'type': 'string',
-                        'description': "A mudança explicada em linguagem simples. Ex: 'A multa passa a ser R$ 200'.",
-                    },
-                    'trechos_originais': {
-                        'type': 'array',
-                        'description': 'Lista de strings contendo os trechos exatos da lei que fundamentam essa mudança (sem uso de [...]).',
-                        'items': {'type': 'string'},
-                    },
-                },
-                'required': ['texto_simplificado', 'trechos_originais'],
-            },
-        },
-        'justificativas': {
-            'type': 'array',
-            'description': 'Lista dos principais argumentos do autor.',
-            'items': {
-                'type': 'object',
-                'properties': {
-                    'texto_simplificado': {
-                        'type': 'string',
-                        'description': 'O argumento do autor em linguagem simples.',
-                    },
-                    'trechos_originais': {
-                        'type': 'array',
-                        'description': 'Lista de strings contendo os trechos exatos da justificativa original que fundamentam esse argumento.',
-                        'items': {'type': 'string'},
-                    },
-                },
-                'required': ['texto_simplificado', 'trechos_originais'],
-            },
-        },
-        'categorias': {
-            'type': 'array',
-            'description': 'Lista de categorias temáticas onde o projeto se encaixa, com suas evidências no texto.',
-            'items': {
-                'type': 'object',
-                'properties': {
-                    'nome': {
-                        'type': 'string',
-                        'enum': [
-                            'Saúde',
-                            'Educação',
-                            'Transporte',
-                            'Segurança',
-                            'Assistência Social',
-                            'Urbanismo',
-                            'Meio Ambiente',
-                            'Causa Animal',
-                            'Cultura e Turismo',
-                            'Esporte e Lazer',
-                            'Direitos Humanos',
-                            'Ciência e Tecnologia',
-                            'Orçamento e Finanças',
-                            'Servidor Público',
-                            'Homenagens/Datas Comemorativas',
-                            'Administração Pública',
-                        ],
-                    },
-                    'trechos_originais': {
-                        'type': 'array',
-                        'description': 'Trechos do texto que justificam por que esta categoria foi escolhida.',
-                        'items': {'type': 'string'},
-                    },
-                },
-                'required': ['nome', 'trechos_originais'],
-            },
-        },
-    },
-    'required': [
-        'titulo',
-        'resumo',
-        'mudancas',
-        'justificativas',
-        'categorias',
-    ],
-}
+LEGISLATION_SCHEMA = gemini_schema(RespostaAnalise)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -129,38 +44,118 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def generation_config() -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        system_instruction=SYSTEM_PROMPT,
+        response_mime_type='application/json',
+        response_schema=LEGISLATION_SCHEMA,
+    )
+
+
 class LegislationParser:
-    def __init__(self, api_key: str | None = None) -> None:
-        """Initialize the Gemini client. Expects API key via arg or env var."""
+    def __init__(
+        self,
+        api_key: str | None = None,
+        text_cache: PageTextCache | None = None,
+        llm_cache: LLMCache | None = None,
+        max_chunk_tokens: int = MAX_CHUNK_TOKENS,
+        chunk_workers: int = 4,
+        base_url: str | None = None,
+    ) -> None:
+        """Initialize the Gemini client. Expects API key via arg or env var.
+
+        `base_url` points the client at another endpoint, e.g. a stand-in.
+        """
         key = api_key or os.environ.get('GEMINI_API_KEY')
         if not key:
             raise ValueError(
                 'GEMINI_API_KEY must be set in environment or passed as argument.',
             )
-        self.client = genai.Client(api_key=key)
+        self.client = genai.Client(
+            api_key=key,
+            http_options=types.HttpOptions(base_url=base_url) if base_url else None,
+        )
+        self.text_cache = text_cache
+        self.llm_cache = llm_cache
+        self.max_chunk_tokens = max_chunk_tokens
+        self.chunk_workers = chunk_workers
 
+    @timed('extract_text')
     def _extract_text(self, pdf_path: str) -> str:
-        """Extract raw text from PDF using PyMuPDF."""
-        with fitz.open(pdf_path) as doc:
-            return chr(12).join([str(page.get_text()) for page in doc]).strip()
-
-    def parse(self, pdf_path: str) -> dict[str, Any]:
-        """Orchestrate extraction and semantic analysis."""
-        text = self._extract_text(pdf_path)
+        """Extract raw text from PDF using PyMuPDF, through the page cache if set."""
+        if self.text_cache:
+            return self.text_cache.text(pdf_path)
+        return extract_text(pdf_path)
+
+    def analyze(self, text: str, *, use_cache: bool = True) -> dict[str, Any]:
+        """Run the semantic analysis over already extracted text.
+
+        Documents over `max_chunk_tokens` are split into chunks analyzed in
+        parallel, and the partial results merged.
+        """
+        chunks = chunk_prompts(text, self.max_chunk_tokens)
+        if len(chunks) == 1:
+            return self._analyze_chunk(text, use_cache=use_cache)
+
+        logger.info('Documento dividido em %d partes.', len(chunks))
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as pool:
+            results = list(
+                pool.map(
+                    lambda chunk: self._analyze_chunk(chunk, use_cache=use_cache),
+                    chunks,
+                ),
+            )
+        return merge_results(results)
+
+    def _analyze_chunk(self, text: str, *, use_cache: bool = True) -> dict[str, Any]:
+        """Identical requests are answered from the LLM cache, if one is set.
+
+        Responses are validated first, so an invalid one is never cached.
+        """
+        use_cache = use_cache and self.llm_cache is not None
+        if use_cache and (
+            cached := self.llm_cache.get(
+                text,
+                MODEL_NAME,
+                SYSTEM_PROMPT,
+                LEGISLATION_SCHEMA,
+            )
+        ):
+            return cached
+
+        result = validate_response(self._generate(text))
+        if use_cache:
+            self.llm_cache.put(
+                text,
+                MODEL_NAME,
+                SYSTEM_PROMPT,
+                LEGISLATION_SCHEMA,
+                result,
+            )
+        return result
 
+    @timed('generate')
+    def _generate(self, text: str) -> dict[str, Any]:
         response = self.client.models.generate_content(
             model=MODEL_NAME,
             contents=text,
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT,
-                response_mime_type='application/json',
-                response_schema=LEGISLATION_SCHEMA,
-            ),
+            config=generation_config(),
         )
+        record_usage(response.usage_metadata)
 
         # Return parsed object or fallback to raw text parsing if wrapper fails
         return response.parsed if response.parsed else json.loads(response.text)  # type: ignore[attr-defined]
 
+    @timed('parse')
+    def parse(self, pdf_path: str, *, use_cache: bool = True) -> dict[str, Any]:
+        """Orchestrate extraction and semantic analysis."""
+        return self.analyze(self._extract_text(pdf_path), use_cache=use_cache)
+
+
+def extract_text(pdf_path: str) -> str:
+    """Extract raw text from PDF using PyMuPDF, pages separated by form feeds."""
+    return join_pages(extract_pages(pdf_path))
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(
@@ -180,12 +175,29 @@ def main() -> None:
         help='Gemini API key (or set GEMINI_API_KEY env var)',
         required=False,
     )
+    parser.add_argument(
+        '--cache-db',
+        type=Path,
+        default=None,
+        help='SQLite DB holding the text and LLM caches (default: no caching)',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Bypass the LLM cache for this run',
+    )
     args = parser.parse_args()
 
+    text_cache = llm_cache = None
+    if args.cache_db:
+        init_db(args.cache_db)
+        text_cache = PageTextCache(args.cache_db)
+        llm_cache = LLMCache(args.cache_db)
+
     try:
-        analyzer = LegislationParser(args.api_key)
+        analyzer = LegislationParser(args.api_key, text_cache, llm_cache)
         logger.info('Analyzing %s...', args.filepath)
-        result = analyzer.parse(args.filepath)
+        result = analyzer.parse(args.filepath, use_cache=not args.no_cache)
 
         with args.out.open('w', encoding='utf-8') as f:
             json.dump(result, f, indent=2, ensure_ascii=False)
@@ -194,6 +206,11 @@ def main() -> None:
     except Exception:
         logger.exception('Error occurred while processing the PDF.')
         raise
+    finally:
+        if text_cache:
+            text_cache.close()
+        if llm_cache:
+            llm_cache.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,509 @@
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from archive import ResponseArchive
+from blobs import BlobStore
+from db import connect, init_db
+from downloads import Downloader
+from evidence import index_analysis
+from http_cache import HttpCache
+from ingest import ingest_analysis
+from jobs import Job, JobQueue
+from llm_cache import LLMCache
+from metrics import FAILURES, JOB_SECONDS, QUEUE_DEPTH, RETRIES
+from parser import MODEL_NAME, LegislationParser
+from ratelimit import HostRateLimiter
+from render import PageRenderer
+from schemas import TipoProjeto
+from scraper import (
+    ARCHIVE_DIR,
+    BASE_URL,
+    BLOB_DIR,
+    DB_FILE,
+    HTTP_CACHE_DIR,
+    REQUESTS_PER_SECOND,
+    TIPOS,
+    CamaraScraper,
+)
+from search import index_text
+from similarity import REUSE_THRESHOLD, index_project, reusable_analysis
+from text_cache import PageTextCache, join_pages
+
+STAGES = ('discover', 'fetch', 'download', 'render', 'extract', 'analyze', 'locate')
+# Job statuses reported as queue depth
+QUEUED_STATUSES = ('pending', 'running', 'failed')
+DEFAULT_WORKERS = {
+    'discover': 4,
+    'fetch': 4,
+    'download': 4,
+    'render': 1,
+    'extract': 2,
+    'analyze': 2,
+    'locate': 1,
+}
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 5.0
+IDLE_POLL_SECONDS = 1.0
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """Resumable discover → fetch → download → extract → analyze → locate pipeline.
+
+    Every stage pulls jobs from the durable `JobQueue` with its own worker
+    pool, so stages overlap and a restart picks up exactly where it stopped.
+    Main documents are also rendered for the web viewer once downloaded, and
+    a project whose text is near-identical to an analyzed one reuses its
+    analysis instead of calling the model.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: dict[str, int] | None = None,
+        *,
+        sync: bool = False,
+        api_key: str | None = None,
+        use_llm_cache: bool = True,
+        reuse_threshold: float | None = REUSE_THRESHOLD,
+        archive: ResponseArchive | None = None,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = BACKOFF_SECONDS,
+        base_url: str = BASE_URL,
+        llm_url: str | None = None,
+        rate: float = REQUESTS_PER_SECOND,
+    ) -> None:
+        self.queue = queue
+        self.workers = workers or DEFAULT_WORKERS
+        self.sync = sync
+        self.api_key = api_key
+        # Other endpoints for the site and the model, e.g. stand-ins (see bench.py)
+        self.base_url = base_url
+        self.llm_url = llm_url
+        # None: every project gets its own analysis, however close its text
+        self.reuse_threshold = reuse_threshold
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        # Shared so the per-thread scrapers respect a single per-host budget
+        self.rate_limiter = HostRateLimiter(rate)
+        # ...and one connection pool for the download workers
+        self.downloader = Downloader(BlobStore(BLOB_DIR), HttpCache(HTTP_CACHE_DIR))
+        self.archive = archive
+        self.text_cache = PageTextCache(DB_FILE)
+        self.llm_cache = LLMCache(DB_FILE) if use_llm_cache else None
+        self.renderer = PageRenderer()
+        self._extractor: ProcessPoolExecutor | None = None
+        self._render_pool: ProcessPoolExecutor | None = None
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._active = dict.fromkeys(STAGES, 0)
+        self._active_lock = threading.Lock()
+
+    def _scraper(self) -> CamaraScraper:
+        # sqlite3 connections can't cross threads, so each worker gets its own
+        if not hasattr(self._local, 'scraper'):
+            self._local.scraper = CamaraScraper(
+                self.base_url,
+                self.downloader,
+                archive=self.archive,
+            )
+            self._local.scraper.rate_limiter = self.rate_limiter
+        return self._local.scraper
+
+    def _parser(self) -> LegislationParser:
+        if not hasattr(self._local, 'parser'):
+            self._local.parser = LegislationParser(
+                self.api_key,
+                self.text_cache,
+                self.llm_cache,
+                base_url=self.llm_url,
+            )
+        return self._local.parser
+
+    def _conn(self) -> sqlite3.Connection:
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = connect(DB_FILE)
+        return self._local.conn
+
+    def _close_local(self) -> None:
+        if hasattr(self._local, 'scraper'):
+            self._local.scraper.close()
+        if hasattr(self._local, 'conn'):
+            self._local.conn.close()
+
+    def seed(self, max_pages: int | None, tipos: Iterable[TipoProjeto] = TIPOS) -> None:
+        """Queue the first listing page of each type; the rest follow from it."""
+        for tipo in tipos:
+            self._enqueue_page(tipo, 1, max_pages)
+
+    def _enqueue_page(
+        self,
+        tipo: TipoProjeto,
+        page: int,
+        max_pages: int | None,
+        *,
+        last: bool = False,
+    ) -> None:
+        # The cap travels with the job, so a resumed run (`--no-seed`) keeps it
+        self.queue.enqueue(
+            'discover',
+            f'{tipo}:{page}',
+            {'tipo': tipo, 'page': page, 'last': last, 'max_pages': max_pages},
+            requeue=True,
+        )
+
+    def _discover(self, job: Job) -> None:
+        scraper = self._scraper()
+        tipo = TipoProjeto(job.payload.get('tipo', TipoProjeto.PLL))
+        page = job.payload['page']
+        max_pages = job.payload.get('max_pages')
+        soup = scraper._get_listing(page, tipo)
+        items = scraper._extract_page_items(soup, tipo)
+        if items is None:
+            logger.warning('Nenhum artigo encontrado na página %d de %s.', page, tipo)
+            return
+
+        if self.sync:
+            links = scraper._select_changed(items)
+            # Each page queues the next one while it still finds changes
+            if links and (max_pages is None or page < max_pages):
+                self._enqueue_page(tipo, page + 1, max_pages)
+        else:
+            links = [link for link, _ in items if link not in scraper.processed_links]
+            if page == 1 or job.payload.get('last'):
+                # Fan the rest of the listing out to the discover workers. The
+                # last page checks again, as the pagination may only link
+                # nearby pages; without one, pages are queued one at a time.
+                last_page = scraper._extract_page_count(soup) or page + 1
+                if max_pages:
+                    last_page = min(last_page, max_pages)
+                for next_page in range(page + 1, last_page + 1):
+                    self._enqueue_page(tipo, next_page, max_pages, last=next_page == last_page)
+
+        for link in links:
+            self.queue.enqueue('fetch', link, {'url': link, 'tipo': tipo}, requeue=self.sync)
+        logger.info('%s page %d: %d projects queued.', tipo, page, len(links))
+
+    def _fetch(self, job: Job) -> None:
+        scraper = self._scraper()
+        if tipo := job.payload.get('tipo'):
+            scraper.link_types[job.payload['url']] = TipoProjeto(tipo)
+        fetched = scraper.fetch_project(job.payload['url'])
+        if not fetched:
+            return
+
+        data, resp = fetched
+
+        def on_saved() -> None:
+            scraper.http_cache.store(resp)
+            # A quarantined project never gets here, so its files aren't queued
+            for index, file in enumerate(data['files']):
+                self.queue.enqueue(
+                    'download',
+                    # Shared files are fetched per project, but only stored once
+                    f'{data["id"]}:{file["remote_url"]}',
+                    {**file, 'project_id': data['id'], 'principal': index == 0},
+                    requeue=True,
+                )
+
+        # Commit right away: the job must not be marked done before its row is
+        scraper.save_project_to_db(data, on_saved)
+        if not scraper.writer.flush():
+            raise RuntimeError(f'Falha ao salvar o projeto {data["id"]}')
+
+    def _download(self, job: Job) -> None:
+        file = job.payload
+        self._scraper().download_file(file)
+        if file['principal']:
+            # Per content: the render of a changed document gets a new key
+            self.queue.enqueue(
+                'render',
+                file['sha256'],
+                {'sha256': file['sha256'], 'local_path': file['local_path']},
+            )
+            self.queue.enqueue(
+                'extract',
+                # Per project: identical PDFs of two projects still need two analyses
+                file['project_id'],
+                {
+                    'sha256': file['sha256'],
+                    'local_path': file['local_path'],
+                    'project_id': file['project_id'],
+                },
+                requeue=True,
+            )
+
+    def _render(self, job: Job) -> None:
+        self.renderer.render(
+            job.payload['local_path'],
+            job.payload['sha256'],
+            self._render_pool,
+        )
+
+    def _extract(self, job: Job) -> None:
+        sha256, _ = self.text_cache.pages(
+            job.payload['local_path'],
+            self._extractor,
+            job.payload['sha256'],
+        )
+        self.queue.enqueue(
+            'analyze',
+            job.payload['project_id'],
+            {
+                'sha256': sha256,
+                'project_id': job.payload['project_id'],
+                'local_path': job.payload['local_path'],
+            },
+            requeue=True,
+        )
+
+    def _analyze(self, job: Job) -> None:
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT id FROM projetos WHERE id_externo = ?',
+            (job.payload['project_id'],),
+        ).fetchone()
+        if not row:
+            raise RuntimeError(f'Projeto {job.payload["project_id"]} não está no banco')
+
+        pages = self.text_cache.get(job.payload['sha256'])
+        if pages is None:
+            raise RuntimeError(f'Texto de {job.payload["sha256"]} não está no cache')
+        text = join_pages(pages)
+        similares = index_project(conn, row[0], job.payload['sha256'], text)
+        reused = None
+        if self.reuse_threshold is not None:
+            reused = reusable_analysis(conn, similares, MODEL_NAME, text, self.reuse_threshold)
+        if reused:
+            origem, result = reused
+            logger.info(
+                'Projeto %s: análise reaproveitada de um texto quase idêntico (análise %d).',
+                job.payload['project_id'],
+                origem,
+            )
+        else:
+            origem, result = None, self._parser().analyze(text)
+        analise_id = ingest_analysis(conn, row[0], MODEL_NAME, result, origem)
+        if analise_id is None:
+            # Quarantined: the cached chunks would fail the same way on a retry
+            logger.warning('Análise do projeto %s em quarentena.', job.payload['project_id'])
+            return
+        index_text(conn, row[0], text)
+        self.queue.enqueue(
+            'locate',
+            str(analise_id),
+            {**job.payload, 'analise_id': analise_id},
+            requeue=True,
+        )
+
+    def _locate(self, job: Job) -> None:
+        pages = self.text_cache.get(job.payload['sha256'])
+        if pages is None:
+            raise RuntimeError(f'Texto de {job.payload["sha256"]} não está no cache')
+        index_analysis(
+            self._conn(),
+            job.payload['analise_id'],
+            pages,
+            job.payload.get('local_path'),
+        )
+
+    def _worker(self, stage: str, handler: Callable[[Job], None]) -> None:
+        while not self._stop.is_set():
+            with self._active_lock:
+                job = self.queue.lease(stage)
+                if job:
+                    self._active[stage] += 1
+            if not job:
+                self._stop.wait(IDLE_POLL_SECONDS)
+                continue
+
+            try:
+                with JOB_SECONDS.time(stage=stage):
+                    handler(job)
+            except Exception as e:
+                logger.exception('[%s] Falha em %s', stage, job.chave)
+                if job.tentativas < self.max_attempts:
+                    RETRIES.inc(stage=stage)
+                else:
+                    FAILURES.inc(stage=stage)
+                self.queue.fail(
+                    job,
+                    repr(e),
+                    max_attempts=self.max_attempts,
+                    backoff=self.backoff,
+                )
+            else:
+                self.queue.complete(job)
+            finally:
+                with self._active_lock:
+                    self._active[stage] -= 1
+        self._close_local()
+
+    def _is_idle(self, stages: tuple[str, ...]) -> bool:
+        with self._active_lock:
+            if any(self._active[stage] for stage in stages):
+                return False
+            counts = self.queue.counts()
+        for stage in STAGES:
+            for status in QUEUED_STATUSES:
+                QUEUE_DEPTH.set(counts.get(stage, {}).get(status, 0), stage=stage, status=status)
+        return not any(
+            counts.get(stage, {}).get(status)
+            for stage in stages
+            for status in ('pending', 'running')
+        )
+
+    def run(self, stages: tuple[str, ...] = STAGES, *, follow: bool = False) -> None:
+        """Run the stage pools until every queue drains (or forever with `follow`)."""
+        handlers = {
+            'discover': self._discover,
+            'fetch': self._fetch,
+            'download': self._download,
+            'render': self._render,
+            'extract': self._extract,
+            'analyze': self._analyze,
+            'locate': self._locate,
+        }
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(stage, handlers[stage]),
+                name=f'{stage}-{i}',
+                daemon=True,
+            )
+            for stage in stages
+            for i in range(self.workers.get(stage, 1))
+        ]
+        # Extract and render threads hand the CPU-bound PyMuPDF work to process pools
+        self._extractor = ProcessPoolExecutor(max_workers=self.workers.get('extract', 1))
+        self._render_pool = ProcessPoolExecutor(max_workers=self.workers.get('render', 1))
+        for thread in threads:
+            thread.start()
+
+        try:
+            # Polled even with `follow`, as it refreshes the queue depth
+            while not self._is_idle(stages) or follow:
+                time.sleep(IDLE_POLL_SECONDS)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self._extractor.shutdown()
+            self._render_pool.shutdown()
+            self.downloader.close()
+            self.text_cache.close()
+            if self.llm_cache:
+                self.llm_cache.close()
+            logger.info('Fila: %s', self.queue.counts())
+            logger.info('Resumo:\n%s', metrics.summary())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Run the resumable scraping and analysis pipeline.',
+    )
+    parser.add_argument(
+        '--pages',
+        type=int,
+        default=None,
+        help='Maximum number of listing pages to discover per type (default: all)',
+    )
+    parser.add_argument(
+        '--tipos',
+        type=TipoProjeto,
+        nargs='+',
+        choices=TIPOS,
+        default=TIPOS,
+        help='Project types to discover (default: all)',
+    )
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Discover only new or changed projects',
+    )
+    parser.add_argument(
+        '--no-seed',
+        action='store_true',
+        help='Only resume queued jobs, without queueing listing pages',
+    )
+    parser.add_argument(
+        '--stages',
+        nargs='+',
+        choices=STAGES,
+        default=list(STAGES),
+        help='Stages to run',
+    )
+    parser.add_argument(
+        '--follow',
+        action='store_true',
+        help='Keep polling for new jobs instead of exiting once idle',
+    )
+    parser.add_argument(
+        '--api-key',
+        type=str,
+        default=None,
+        help='Gemini API key (or set GEMINI_API_KEY env var)',
+    )
+    parser.add_argument(
+        '--no-llm-cache',
+        action='store_true',
+        help='Always call the model, ignoring cached analyses',
+    )
+    parser.add_argument(
+        '--no-reuse',
+        action='store_true',
+        help='Analyze every project, even if a near-identical one was analyzed',
+    )
+    parser.add_argument(
+        '--no-record',
+        action='store_true',
+        help=f'Do not record the responses into {ARCHIVE_DIR} (see replay.py)',
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics on this local port',
+    )
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
+    init_db(DB_FILE)
+    queue = JobQueue(DB_FILE)
+    archive = None if args.no_record else ResponseArchive(ARCHIVE_DIR)
+    pipeline = Pipeline(
+        queue,
+        sync=args.sync,
+        api_key=args.api_key,
+        use_llm_cache=not args.no_llm_cache,
+        reuse_threshold=None if args.no_reuse else REUSE_THRESHOLD,
+        archive=archive,
+    )
+    try:
+        if not args.no_seed and 'discover' in args.stages:
+            pipeline.seed(args.pages, args.tipos)
+        pipeline.run(tuple(args.stages), follow=args.follow)
+    except KeyboardInterrupt:
+        logger.warning('Interrompido pelo usuário; o progresso fica salvo na fila.')
+    finally:
+        queue.close()
+        if archive:
+            archive.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+
+class TokenBucket:
+    """Token bucket that refills at `rate` tokens/s up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens, returning how long the caller must wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate,
+            )
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def wait(self, amount: float = 1.0) -> None:
+        if delay := self._reserve(amount):
+            time.sleep(delay)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        if delay := self._reserve(amount):
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """One `TokenBucket` per host, created on first use."""
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str | httpx.URL) -> TokenBucket:
+        host = httpx.URL(url).host
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def wait(self, url: str | httpx.URL) -> None:
+        self.bucket(url).wait()
+
+    async def acquire(self, url: str | httpx.URL) -> None:
+        await self.bucket(url).acquire()
+
+
+class AdaptiveLimiter:
+    """Async concurrency limit that adapts to throttling (AIMD).
+
+    The limit grows by one after a full window of successes and is halved when
+    the server signals throttling, at most once per `cooldown` seconds so a
+    burst of 429s from the same window only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        minimum: int = 1,
+        cooldown: float = 1.0,
+    ) -> None:
+        self.limit = initial
+        self.maximum = maximum
+        self.minimum = minimum
+        self.cooldown = cooldown
+        self._active = 0
+        self._successes = 0
+        self._throttled_at = float('-inf')
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def __aexit__(self, *exc: object) -> None:
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+
+    def throttle(self) -> None:
+        now = time.monotonic()
+        if now - self._throttled_at < self.cooldown:
+            return
+        self._throttled_at = now
+        self.limit = max(self.minimum, self.limit // 2)
+        self._successes = 0
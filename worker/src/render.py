@@ -0,0 +1,222 @@
+import argparse
+import importlib.util
+import json
+import logging
+import shutil
+import tempfile
+from collections.abc import Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+import fitz
+
+from db import connect, init_db
+
+DB_FILE = Path('voz_civica.db')
+RENDER_DIR = Path('data/paginas')
+MANIFEST_FILE = 'manifest.json'
+# Zoom over PDF points; the web viewer used to rasterize at 1.5 in the browser
+RENDER_SCALES = (0.75, 1.5, 2.25)
+WEBP_QUALITY = 75
+# Optional: pages are written as PNG without Pillow
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+def page_image(page: fitz.Page, scale: float, image_format: str) -> bytes:
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    if image_format == 'webp':
+        return pixmap.pil_tobytes(format='WEBP', quality=WEBP_QUALITY, method=6)
+    return pixmap.tobytes('png')
+
+
+def text_layer(page: fitz.Page) -> list[dict[str, Any]]:
+    """Positioned text spans (in PDF points) to overlay on the page image."""
+    return [
+        {
+            'texto': span['text'],
+            'bbox': [round(value, 2) for value in span['bbox']],
+            'tamanho': round(span['size'], 2),
+            'fonte': span['font'],
+        }
+        for block in page.get_text('dict')['blocks']
+        for line in block.get('lines', [])
+        for span in line['spans']
+        if span['text'].strip()
+    ]
+
+
+def render_document(
+    pdf_path: str,
+    out_dir: str,
+    scales: tuple[float, ...] = RENDER_SCALES,
+) -> dict[str, Any]:
+    """Render every page of a PDF into `out_dir`; returns its manifest.
+
+    Pages are written to a temporary sibling renamed at the end, so `out_dir`
+    only ever holds a complete render. Runs in process pool workers.
+    """
+    target = Path(out_dir)
+    tmp_dir = Path(tempfile.mkdtemp(dir=target.parent, prefix=f'.{target.name}-'))
+    image_format = 'webp' if HAS_PILLOW else 'png'
+    try:
+        pages = []
+        with fitz.open(pdf_path) as doc:
+            for number, page in enumerate(doc, start=1):
+                images = {}
+                for scale in scales:
+                    name = f'{number}@{scale:g}x.{image_format}'
+                    (tmp_dir / name).write_bytes(page_image(page, scale, image_format))
+                    images[f'{scale:g}'] = name
+                (tmp_dir / f'{number}.json').write_text(
+                    json.dumps(text_layer(page), ensure_ascii=False),
+                    encoding='utf-8',
+                )
+                pages.append(
+                    {
+                        'pagina': number,
+                        'largura': round(page.rect.width, 2),
+                        'altura': round(page.rect.height, 2),
+                        'imagens': images,
+                        'texto': f'{number}.json',
+                    },
+                )
+        manifest = {'formato': image_format, 'escalas': list(scales), 'paginas': pages}
+        (tmp_dir / MANIFEST_FILE).write_text(
+            json.dumps(manifest, ensure_ascii=False),
+            encoding='utf-8',
+        )
+        try:
+            tmp_dir.rename(target)
+        except OSError:
+            # Another worker rendered the same document first
+            if not (target / MANIFEST_FILE).exists():
+                raise
+        return manifest
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class PageRenderer:
+    """Page images and text layers of PDFs, pre-rendered for the web viewer.
+
+    Stored as `<root>/<sha256>/` like the blob store, so a document is only
+    rendered again when its content changes.
+    """
+
+    def __init__(self, root: Path = RENDER_DIR, scales: tuple[float, ...] = RENDER_SCALES) -> None:
+        self.root = root
+        self.scales = scales
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256
+
+    def has(self, sha256: str) -> bool:
+        return (self.path(sha256) / MANIFEST_FILE).exists()
+
+    def render(
+        self,
+        pdf_path: Path | str,
+        sha256: str,
+        executor: Executor | None = None,
+    ) -> bool:
+        """Render a PDF unless already done, optionally in a process pool.
+
+        Returns whether it was rendered now.
+        """
+        if self.has(sha256):
+            return False
+        self.root.mkdir(parents=True, exist_ok=True)
+        args = (str(pdf_path), str(self.path(sha256)), self.scales)
+        if executor:
+            executor.submit(render_document, *args).result()
+        else:
+            render_document(*args)
+        return True
+
+    def render_many(
+        self,
+        documents: Iterable[tuple[str, Path | str]],
+        workers: int | None = None,
+    ) -> int:
+        """Render many (sha256, path) documents in a process pool.
+
+        Returns the number rendered.
+        """
+        pending: dict[str, str] = {}
+        total = 0
+        for sha256, path in documents:
+            total += 1
+            if sha256 not in pending and not self.has(sha256):
+                pending[sha256] = str(path)
+
+        logger.info('%d documentos, %d a renderizar.', total, len(pending))
+        self.root.mkdir(parents=True, exist_ok=True)
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(render_document, path, str(self.path(sha256)), self.scales): sha256
+                for sha256, path in pending.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    rendered += 1
+                except Exception:
+                    logger.exception('Falha ao renderizar %s', pending[futures[future]])
+        return rendered
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Pre-render the main PDF of every project for the web viewer.',
+    )
+    parser.add_argument(
+        '--out',
+        type=Path,
+        default=RENDER_DIR,
+        help='Output directory, one subdirectory per document',
+    )
+    parser.add_argument(
+        '--scales',
+        type=float,
+        nargs='+',
+        default=list(RENDER_SCALES),
+        help='Zoom levels to render each page at',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of rendering processes (default: CPU count)',
+    )
+    args = parser.parse_args()
+
+    init_db(DB_FILE)
+    conn = connect(DB_FILE)
+    try:
+        documents = conn.execute(
+            """
+            SELECT DISTINCT d.sha256, p.link_pdf_principal
+            FROM projetos p
+            JOIN documentos d ON d.projeto_id = p.id AND d.principal
+            WHERE d.sha256 IS NOT NULL AND p.link_pdf_principal IS NOT NULL
+            """,
+        ).fetchall()
+    finally:
+        conn.close()
+
+    renderer = PageRenderer(args.out, tuple(args.scales))
+    rendered = renderer.render_many(documents, args.workers)
+    logger.info('%d documentos renderizados.', rendered)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import logging
+import re
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from archive import ArchiveIndex
+from schemas import TipoProjeto
+from scraper import ARCHIVE_DIR, LISTING_STRAINER, TIPOS, CamaraScraper
+
+PROJECT_PATH_PATTERN = re.compile(r'/processos/\d+')
+# Projects per task sent to a worker process
+CHUNK_SIZE = 16
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by `_init_worker`
+_scraper: CamaraScraper | None = None
+
+
+def _init_worker(index: ArchiveIndex, base_url: str) -> None:
+    global _scraper
+    _scraper = CamaraScraper(base_url, replay=index)
+
+
+def _parse_project(url: str, tipo: TipoProjeto) -> dict[str, Any] | None:
+    """Parse an archived project page and its tabs; runs in a worker process."""
+    _scraper.link_types[url] = tipo
+    try:
+        fetched = _scraper.fetch_project(url)
+    except Exception:
+        logger.exception('Failed to replay %s', url)
+        return None
+    return fetched[0] if fetched else None
+
+
+def archived_types(scraper: CamaraScraper, index: ArchiveIndex) -> dict[str, TipoProjeto]:
+    """Type of each project, from the archived listing pages."""
+    for key, record in index.records.items():
+        url = httpx.URL(key)
+        if url.path != '/processos' or url.params.get('tipo') not in TIPOS:
+            continue
+        if record.meta.get('status') != httpx.codes.OK:
+            continue
+        soup = scraper._make_soup(index.response(httpx.Request('GET', url)), LISTING_STRAINER)
+        scraper._extract_page_items(soup, TipoProjeto(url.params['tipo']))
+    return scraper.link_types
+
+
+def archived_projects(base_url: str, index: ArchiveIndex) -> list[str]:
+    """URLs of the project pages in the archive."""
+    return sorted(
+        key
+        for key, record in index.records.items()
+        if record.meta.get('status') == httpx.codes.OK
+        and key.startswith(base_url)
+        and PROJECT_PATH_PATTERN.fullmatch(httpx.URL(key).path)
+    )
+
+
+def replay(
+    index: ArchiveIndex,
+    workers: int | None = None,
+    tipos: Iterable[TipoProjeto] = TIPOS,
+) -> int:
+    """Parse every archived project again and save it, without the network.
+
+    Pages are parsed in a process pool; files and rows are saved by this
+    process, which holds the only writing connection. Returns the number of
+    projects saved.
+    """
+    scraper = CamaraScraper(replay=index)
+    tipos = set(tipos)
+    saved = 0
+    try:
+        link_types = archived_types(scraper, index)
+        links = [
+            link
+            for link in archived_projects(scraper.base_url, index)
+            if link_types.get(link, TipoProjeto.PLL) in tipos
+        ]
+        logger.info('%d projetos a reprocessar.', len(links))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(index, scraper.base_url),
+        ) as pool:
+            for data in pool.map(
+                _parse_project,
+                links,
+                [link_types.get(link, TipoProjeto.PLL) for link in links],
+                chunksize=CHUNK_SIZE,
+            ):
+                if not data:
+                    continue
+                scraper._process_files(data['files'])
+                scraper.save_project_to_db(data)
+                saved += 1
+    finally:
+        scraper.close()
+    return saved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Rebuild the projects from recorded responses, without the network.',
+    )
+    parser.add_argument(
+        '--archive',
+        type=Path,
+        default=ARCHIVE_DIR,
+        help='Directory of the recorded responses',
+    )
+    parser.add_argument(
+        '--tipos',
+        type=TipoProjeto,
+        nargs='+',
+        choices=TIPOS,
+        default=TIPOS,
+        help='Project types to replay (default: all)',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of parsing processes (default: CPU count)',
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    saved = replay(ArchiveIndex(args.archive), args.workers, args.tipos)
+    logger.info(
+        '%d projetos reprocessados em %.1fs.',
+        saved,
+        time.perf_counter() - start,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -29,14 +29,18 @@ class TipoProjeto(StrEnum):
     PELO = 'PELO'  # Proposta de Emenda à Lei Orgânica
 
 
+# Quotes may be missing (e.g. a category inferred from the whole text), and
+# many bills are filed without a justification. Every bill changes something
+# and fits some category (if only `OUTROS`), so an analysis without either
+# is a bad answer.
 class Classificacao(BaseModel):
     categoria: Categoria
-    fontes: list[str] = Field(min_length=1)
+    fontes: list[str]
 
 
 class PontoAnalise(BaseModel):
     texto: str
-    fontes: list[str] = Field(min_length=1)
+    fontes: list[str]
 
 
 class AnaliseIA(BaseModel):
@@ -44,10 +48,56 @@ class AnaliseIA(BaseModel):
     titulo: str
     resumo: str
     mudancas: list[PontoAnalise] = Field(min_length=1)
-    justificativas: list[PontoAnalise] = Field(min_length=1)
+    justificativas: list[PontoAnalise]
     classificacao: list[Classificacao] = Field(min_length=1)
 
 
+# Response of the model, as requested in `LEGISLATION_SCHEMA` (generated from
+# these classes, so field descriptions are part of the prompt and the classes
+# have no docstrings). Mapped onto `AnaliseIA` once the chunks are merged.
+class RespostaMudanca(BaseModel):
+    texto_simplificado: str = Field(
+        description="A mudança explicada em linguagem simples. Ex: 'A multa passa a ser R$ 200'.",
+    )
+    trechos_originais: list[str] = Field(
+        description='Lista de strings contendo os trechos exatos da lei que fundamentam essa mudança (sem uso de [...]).',
+    )
+
+
+class RespostaJustificativa(BaseModel):
+    texto_simplificado: str = Field(
+        description='O argumento do autor em linguagem simples.',
+    )
+    trechos_originais: list[str] = Field(
+        description='Lista de strings contendo os trechos exatos da justificativa original que fundamentam esse argumento.',
+    )
+
+
+class RespostaCategoria(BaseModel):
+    nome: Categoria
+    trechos_originais: list[str] = Field(
+        description='Trechos do texto que justificam por que esta categoria foi escolhida.',
+    )
+
+
+class RespostaAnalise(BaseModel):
+    titulo: str = Field(
+        description="Título curto e chamativo (máx 10 palavras) explicando o projeto. Ex: 'Proibição de fogos de artifício com ruído'.",
+    )
+    resumo: str = Field(
+        description="Uma única frase simples explicando o objetivo central. Comece diretamente com o verbo (ex: 'Cria', 'Proíbe', 'Autoriza'), sem citar 'o projeto'.",
+    )
+    mudancas: list[RespostaMudanca] = Field(
+        description='Lista de mudanças práticas propostas pelo projeto.',
+    )
+    justificativas: list[RespostaJustificativa] = Field(
+        description='Lista dos principais argumentos do autor.',
+    )
+    categorias: list[RespostaCategoria] = Field(
+        description='Lista de categorias temáticas onde o projeto se encaixa, com suas evidências no texto.',
+    )
+
+
 class Autor(BaseModel):
     nome: str
     slug: str | None = None
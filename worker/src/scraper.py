@@ -1,26 +1,77 @@
-import contextlib
+import argparse
 import logging
 import re
 import sqlite3
 import time
 import unicodedata
 import urllib.parse
-from datetime import UTC, datetime
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, date, datetime
 from pathlib import Path
 from typing import Any
 
 import httpx
-from bs4 import BeautifulSoup, Tag
-
-from db import init_db
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from pydantic import ValidationError
+
+import metrics
+from archive import ArchiveIndex, ReplayTransport, ResponseArchive
+from blobs import BlobStore, page_count
+from db import connect, init_db
+from downloads import Downloader
+from http_cache import HttpCache
+from metrics import record_response, timed
+from ratelimit import HostRateLimiter
+from schemas import TipoProjeto, Tramitacao, Votacao
+from writer import DocumentoRow, ProjectWriter, ProjetoRow
 
 DOWNLOAD_PDFS = True
+REQUESTS_PER_SECOND = 2.0
+# Parallel PDF downloads per project, still within the per-host rate
+DOWNLOAD_WORKERS = 4
 
 DB_FILE = Path('voz_civica.db')
 OUTPUT_DIR = Path('data')
-PDF_DIR = OUTPUT_DIR / 'pdfs'
+BLOB_DIR = OUTPUT_DIR / 'blobs'
+HTTP_CACHE_DIR = OUTPUT_DIR / 'http_cache'
+ARCHIVE_DIR = OUTPUT_DIR / 'arquivo'
 
 BASE_URL = 'https://www.camarapoa.rs.gov.br'
+TIPOS = tuple(TipoProjeto)
+
+HTML_PARSER = 'lxml'
+# Listing articles, the sidebar column so its articles can be told apart, and
+# the pagination
+LISTING_STRAINER = SoupStrainer(
+    ['article', 'div'],
+    class_=re.compile(r'^item$|\bfour\b.*\bwide\b|\bpagination\b'),
+)
+PROJECT_TABS = ['dados', 'documentos', 'votacoes', 'tramitacoes']
+PROJECT_STRAINER = SoupStrainer('div', attrs={'data-tab': PROJECT_TABS})
+
+LAST_MOVEMENT_PATTERN = re.compile(
+    r'[úu]ltima\s+tramita\w*\W*(\d{2}/\d{2}/\d{4})',
+    re.IGNORECASE,
+)
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+PAGE_PARAM_PATTERN = re.compile(r'[?&]page=(\d+)')
+
+# Table headers (in snake case) each field may appear under, in preference order
+VOTACAO_COLUMNS = {
+    'data': ('data', 'data_da_votacao', 'sessao'),
+    'titulo': ('titulo', 'votacao', 'descricao', 'materia', 'objeto'),
+    'votos_sim': ('sim', 'votos_sim', 'favoraveis'),
+    'votos_nao': ('nao', 'votos_nao', 'contrarios'),
+    'abstencoes': ('abstencoes', 'abstencao', 'abst'),
+    'resultado': ('resultado', 'situacao'),
+}
+TRAMITACAO_COLUMNS = {
+    'setor': ('setor', 'local', 'orgao', 'unidade'),
+    'data_chegada': ('data_de_chegada', 'chegada', 'data_de_entrada', 'entrada', 'data'),
+    'data_saida': ('data_de_saida', 'saida'),
+    'situacao': ('situacao', 'acao', 'andamento', 'descricao'),
+}
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,21 +82,66 @@ logger = logging.getLogger(__name__)
 
 
 class CamaraScraper:
-    def __init__(self) -> None:
-        self.client = httpx.Client(headers={'X-Requested-With': 'XMLHttpRequest'})
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        downloader: Downloader | None = None,
+        *,
+        archive: ResponseArchive | None = None,
+        replay: ArchiveIndex | None = None,
+    ) -> None:
+        self.base_url = base_url
+        # Responses are recorded into `archive`; with `replay`, they are all
+        # served from a previous recording instead of the network
+        self.archive = archive
+        self.replay = replay
+        self.client = httpx.Client(
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+            transport=ReplayTransport(replay) if replay else None,
+        )
+        self.rate_limiter = HostRateLimiter(REQUESTS_PER_SECOND)
+        self.http_cache = HttpCache(HTTP_CACHE_DIR)
+        # A downloader passed in is shared, and closed by its owner
+        self._owns_downloader = downloader is None
+        self.downloader = downloader or Downloader(BlobStore(BLOB_DIR), self.http_cache)
+        self.blobs = self.downloader.blobs
 
-        if not DB_FILE.exists():
-            init_db(DB_FILE)
+        init_db(DB_FILE)
 
-        self.conn = sqlite3.connect(DB_FILE)
+        # The async crawler writes through it from its own DB thread
+        self.conn = connect(DB_FILE, check_same_thread=False)
         self.cursor = self.conn.cursor()
 
         self.processed_links = set()
+        self.last_movements: dict[str, date | None] = {}
+        # Type of each known project, as listed (project pages don't show it)
+        self.link_types: dict[str, TipoProjeto] = {}
         try:
-            self.cursor.execute('SELECT id_externo FROM projetos')
+            self.cursor.execute(
+                'SELECT id_externo, data_ultima_tramitacao, tipo FROM projetos',
+            )
             rows = self.cursor.fetchall()
-            for row in rows:
-                self.processed_links.add(f'{BASE_URL}/processos/{row[0]}')
+            for id_externo, ultima_tramitacao, tipo in rows:
+                link = f'{self.base_url}/processos/{id_externo}'
+                self.processed_links.add(link)
+                if tipo in TIPOS:
+                    self.link_types[link] = TipoProjeto(tipo)
+                self.last_movements[link] = (
+                    date.fromisoformat(ultima_tramitacao[:10])
+                    if ultima_tramitacao
+                    else None
+                )
+            # Arrival date of the newest stored movement of each project
+            self.last_tramitacoes: dict[str, date] = {
+                f'{self.base_url}/processos/{id_externo}': date.fromisoformat(chegada)
+                for id_externo, chegada in self.cursor.execute(
+                    """
+                    SELECT p.id_externo, MAX(t.data_chegada) FROM tramitacoes t
+                    JOIN projetos p ON p.id = t.projeto_id
+                    GROUP BY p.id_externo
+                    """,
+                )
+            }
             logger.info(
                 'Carregados %d projetos já salvos do banco.',
                 len(self.processed_links),
@@ -54,6 +150,8 @@ class CamaraScraper:
             logger.exception('Erro ao ler banco de dados. As tabelas existem?')
             raise
 
+        self.writer = ProjectWriter(self.conn)
+
     def _dirty_clean_html(self, text: str) -> str:
         return (
             text.replace("\\'", "'")
@@ -74,19 +172,77 @@ class CamaraScraper:
         text = re.sub(r'[^a-z0-9]', '_', text.lower())
         return re.sub(r'_+', '_', text).strip('_')
 
-    def _get_soup(self, url: str, params: dict | None = None) -> BeautifulSoup:
+    def _listing_params(self, page: int, tipo: TipoProjeto = TipoProjeto.PLL) -> dict:
+        return {
+            'utf8': '✓',
+            'busca': '',
+            'tipo': tipo.value,
+            'autor': '',
+            'andamento': 'todos',
+            'aprovados_em': '',
+            'button': '',
+            'page': str(page),
+        }
+
+    def _make_soup(
+        self,
+        resp: httpx.Response,
+        parse_only: SoupStrainer | None = None,
+    ) -> BeautifulSoup:
+        resp.encoding = 'utf-8'
+        content = resp.text
+
+        if '$(' in content or 'javascript' in resp.headers.get('content-type', ''):
+            content = self._dirty_clean_html(content)
+
+        return BeautifulSoup(content, HTML_PARSER, parse_only=parse_only)
+
+    def _get(
+        self,
+        url: str,
+        params: dict | None = None,
+        *,
+        store: bool = True,
+        conditional: bool = True,
+    ) -> httpx.Response:
+        """Conditional GET through the HTTP cache."""
+        if self.replay:
+            # Archived responses are complete: no rate limit, no revalidation
+            resp = self.client.get(url, params=params)
+            resp.raise_for_status()
+            return resp
+
+        request_url = httpx.URL(url, params=params)
+        self.rate_limiter.wait(url)
+        resp = self.client.get(
+            url,
+            params=params,
+            headers=self.http_cache.conditional_headers(request_url)
+            if conditional
+            else {},
+        )
+        record_response(resp, 'page')
+        resolved = self.http_cache.resolve(resp, store=store)
+        if resolved is None:
+            return self._get(url, params, store=store, conditional=False)
+        resp = resolved
+        resp.raise_for_status()
+        if self.archive:
+            self.archive.record(resp)
+        return resp
+
+    @timed('get_soup')
+    def _get_soup(
+        self,
+        url: str,
+        params: dict | None = None,
+        parse_only: SoupStrainer | None = None,
+    ) -> BeautifulSoup:
         if params:
             params['_'] = int(time.time() * 1000)
         try:
-            resp = self.client.get(url, params=params)
-            resp.encoding = 'utf-8'
-            resp.raise_for_status()
-            content = resp.text
-
-            if '$(' in content or 'javascript' in resp.headers.get('content-type', ''):
-                content = self._dirty_clean_html(content)
-
-            return BeautifulSoup(content, 'html.parser')
+            resp = self._get(url, params)
+            return self._make_soup(resp, parse_only)
         except Exception:
             logger.exception('Erro de conexão ao buscar Soup em %s', url)
             raise
@@ -99,7 +255,7 @@ class CamaraScraper:
                     return True
         return False
 
-    def _extract_link_from_article(self, article: Tag) -> str | None:
+    def _extract_link_from_article(self, article: Tag, tipo: TipoProjeto) -> str | None:
         header = article.find('h2', class_='header') or article.find(
             'h2',
             class_='ui small header',
@@ -107,244 +263,598 @@ class CamaraScraper:
         if not header:
             return None
 
-        title_text = header.get_text(strip=True).upper()
-        if 'PLL' not in title_text:
+        title_text = header.get_text(' ', strip=True).upper()
+        if not re.search(rf'\b{tipo}\b', title_text):
             return None
 
         if not (a_tag := header.find('a')):
             return None
 
-        return urllib.parse.urljoin(BASE_URL, str(a_tag['href']))
-
-    def get_project_links(self, max_pages: int = 1) -> list[str]:
-        logger.info('Searching for PLL projects...')
-        links = set()
-        processed_urls = self.processed_links
-
-        for page in range(1, max_pages + 1):
-            logger.info('Scraping page %d...', page)
-
-            params = {
-                'utf8': '✓',
-                'busca': '',
-                'tipo': 'PLL',
-                'autor': '',
-                'andamento': 'todos',
-                'aprovados_em': '',
-                'button': '',
-                'page': str(page),
-            }
-            soup = self._get_soup(f'{BASE_URL}/processos', params)
-            if not soup:
-                continue
-
-            articles = soup.select('article.item')
-            if not articles:
-                logger.warning('Nenhum artigo encontrado na página %d.', page)
-                break
-
-            page_links_count = 0
-            for article in articles:
-                if self._is_sidebar_article(article):
-                    continue
-
-                full_link = self._extract_link_from_article(article)
-                if (
-                    full_link
-                    and full_link not in links
-                    and full_link not in processed_urls
-                ):
-                    links.add(full_link)
-                    page_links_count += 1
-
-            logger.info(
-                'Found %d NEW valid PLL projects on page %d.',
-                page_links_count,
-                page,
-            )
+        return urllib.parse.urljoin(self.base_url, str(a_tag['href']))
 
-            if page_links_count == 0:
-                pass
+    def _parse_date(self, raw: str) -> date | None:
+        try:
+            return datetime.strptime(raw, '%d/%m/%Y').replace(tzinfo=UTC).date()
+        except ValueError:
+            return None
 
-            time.sleep(0.5)
+    def _find_date(self, raw: str | None) -> date | None:
+        if raw and (match := DATE_PATTERN.search(raw)):
+            return self._parse_date(match.group())
+        return None
+
+    def _find_int(self, raw: str | None) -> int | None:
+        if raw and (digits := re.sub(r'\D', '', raw)):
+            return int(digits)
+        return None
+
+    def _extract_last_movement(self, article: Tag) -> date | None:
+        """Last-movement date shown on a listing item (latest date as fallback)."""
+        text = article.get_text(' ', strip=True)
+        if match := LAST_MOVEMENT_PATTERN.search(text):
+            return self._parse_date(match.group(1))
+        dates = [
+            parsed
+            for raw in DATE_PATTERN.findall(text)
+            if (parsed := self._parse_date(raw))
+        ]
+        return max(dates, default=None)
+
+    def _extract_page_items(
+        self,
+        soup: BeautifulSoup,
+        tipo: TipoProjeto = TipoProjeto.PLL,
+    ) -> list[tuple[str, date | None]] | None:
+        """Return (link, last movement) pairs of a listing page, or None if empty.
+
+        The type of each link is kept in `link_types`.
+        """
+        articles = soup.select('article.item')
+        if not articles:
+            return None
 
-        all_links = list(links)
-        logger.info(
-            'Total new unique PLL projects found to process: %d',
-            len(all_links),
+        items = []
+        for article in articles:
+            if self._is_sidebar_article(article):
+                continue
+            if full_link := self._extract_link_from_article(article, tipo):
+                self.link_types[full_link] = tipo
+                items.append((full_link, self._extract_last_movement(article)))
+        return items
+
+    def _extract_page_links(
+        self,
+        soup: BeautifulSoup,
+        tipo: TipoProjeto = TipoProjeto.PLL,
+    ) -> list[str] | None:
+        """Return the project links of a listing page, or None if it is empty."""
+        items = self._extract_page_items(soup, tipo)
+        return None if items is None else [link for link, _ in items]
+
+    def _extract_page_count(self, soup: BeautifulSoup) -> int | None:
+        """Number of pages of a listing, from the pagination links of a page."""
+        pages = [
+            int(match.group(1))
+            for link in soup.select('.pagination a[href]')
+            if (match := PAGE_PARAM_PATTERN.search(str(link['href'])))
+        ]
+        return max(pages, default=None)
+
+    def _select_changed(self, items: list[tuple[str, date | None]]) -> list[str]:
+        """Links that are new or have moved since they were last saved."""
+        changed = []
+        for link, last_movement in items:
+            if link not in self.processed_links:
+                changed.append(link)
+                continue
+            stored = self.last_movements.get(link)
+            if last_movement and (stored is None or last_movement > stored):
+                changed.append(link)
+        return changed
+
+    def _get_listing(self, page: int, tipo: TipoProjeto) -> BeautifulSoup:
+        logger.info('Scraping %s page %d...', tipo, page)
+        return self._get_soup(
+            f'{self.base_url}/processos',
+            self._listing_params(page, tipo),
+            LISTING_STRAINER,
         )
-        return all_links
 
-    def _extract_metadata(self, soup: BeautifulSoup) -> dict:
+    def get_project_links(
+        self,
+        max_pages: int | None = None,
+        tipos: Iterable[TipoProjeto] = TIPOS,
+    ) -> Iterator[str]:
+        """Yield the new projects of each type as their listing pages are read.
+
+        Every page of a type is read, up to `max_pages`.
+        """
+        links: set[str] = set()
+        for tipo in tipos:
+            page = 1
+            while max_pages is None or page <= max_pages:
+                soup = self._get_listing(page, tipo)
+                page_links = self._extract_page_links(soup, tipo)
+                if page_links is None:
+                    logger.warning('Nenhum artigo encontrado na página %d de %s.', page, tipo)
+                    break
+
+                new_links = [
+                    link
+                    for link in page_links
+                    if link not in links and link not in self.processed_links
+                ]
+                links.update(new_links)
+                logger.info('Found %d NEW valid %s projects on page %d.', len(new_links), tipo, page)
+                yield from new_links
+                # Saves requesting the empty page past the end
+                if page >= (self._extract_page_count(soup) or page + 1):
+                    break
+                page += 1
+
+        logger.info('Total new unique projects found to process: %d', len(links))
+
+    def sync_project_links(
+        self,
+        max_pages: int | None = None,
+        tipos: Iterable[TipoProjeto] = TIPOS,
+    ) -> Iterator[str]:
+        """Page through each type's listing until a page brings nothing new or changed.
+
+        Relies on the listing being ordered by most recent movement.
+        """
+        links: set[str] = set()
+        for tipo in tipos:
+            page = 1
+            while max_pages is None or page <= max_pages:
+                items = self._extract_page_items(self._get_listing(page, tipo), tipo)
+                if items is None:
+                    logger.warning('Nenhum artigo encontrado na página %d de %s.', page, tipo)
+                    break
+
+                changed = [link for link in self._select_changed(items) if link not in links]
+                logger.info(
+                    'Found %d new or changed %s projects on page %d.',
+                    len(changed),
+                    tipo,
+                    page,
+                )
+                if not changed:
+                    break
+                links.update(changed)
+                yield from changed
+                page += 1
+
+        logger.info('Total new or changed projects to sync: %d', len(links))
+
+    def _extract_metadata(self, id_container: Tag) -> dict:
         metadata = {}
-        if id_container := soup.find('div', attrs={'data-tab': 'dados'}):
-            for dt in id_container.select('dl.dados dt'):
-                raw_key = dt.get_text(strip=True)
-                key = self._to_snake_case(raw_key)
-                if dd := dt.find_next_sibling('dd'):
-                    metadata[key] = dd.get_text(strip=True)
+        for dt in id_container.select('dl.dados dt'):
+            raw_key = dt.get_text(strip=True)
+            key = self._to_snake_case(raw_key)
+            if dd := dt.find_next_sibling('dd'):
+                metadata[key] = dd.get_text(strip=True)
         return metadata
 
-    def _process_files(self, soup: BeautifulSoup, project_id: str) -> list[dict]:
-        files = []
-        if not DOWNLOAD_PDFS:
-            return files
+    def _extract_table(self, container: Tag) -> list[dict[str, str]]:
+        """Rows of the tables in a tab as header → cell text dicts.
+
+        The first link of a row is kept under `link`.
+        """
+        rows = []
+        for table in container.find_all('table'):
+            headers = [
+                self._to_snake_case(th.get_text(strip=True))
+                for th in table.select('thead th') or table.select('tr:first-of-type > th')
+            ]
+            for tr in table.find_all('tr'):
+                cells = tr.find_all('td')
+                if not cells:
+                    continue
+                row = dict(
+                    zip(headers, (td.get_text(' ', strip=True) for td in cells), strict=False),
+                )
+                if a_tag := tr.find('a', href=True):
+                    row['link'] = urllib.parse.urljoin(self.base_url, str(a_tag['href']))
+                rows.append(row)
+        return rows
+
+    def _columns(
+        self,
+        row: dict[str, str],
+        columns: dict[str, tuple[str, ...]],
+    ) -> dict[str, str | None]:
+        return {
+            field: next((row[key] for key in keys if row.get(key)), None)
+            for field, keys in columns.items()
+        }
+
+    def _extract_votacoes(self, tab: Tag) -> list[Votacao]:
+        votacoes = []
+        for row in self._extract_table(tab):
+            values = self._columns(row, VOTACAO_COLUMNS)
+            try:
+                votacoes.append(
+                    Votacao(
+                        data=self._find_date(values['data']),
+                        titulo=values['titulo'],
+                        votos_sim=self._find_int(values['votos_sim']),
+                        votos_nao=self._find_int(values['votos_nao']),
+                        abstencoes=self._find_int(values['abstencoes']),
+                        resultado=values['resultado'],
+                        detalhes_url=row.get('link'),
+                    ),
+                )
+            except ValidationError:
+                logger.warning('Votação ignorada, campos inválidos: %s', row)
+        return votacoes
+
+    def _extract_tramitacoes(self, tab: Tag, since: date | None) -> list[Tramitacao]:
+        """Movements that arrived on or after `since` (the newest stored one).
+
+        The newest stored movement is kept so its exit date can still be filled.
+        """
+        tramitacoes = []
+        for row in self._extract_table(tab):
+            values = self._columns(row, TRAMITACAO_COLUMNS)
+            try:
+                tramitacao = Tramitacao(
+                    setor=values['setor'],
+                    data_chegada=self._find_date(values['data_chegada']),
+                    data_saida=self._find_date(values['data_saida']),
+                    situacao=values['situacao'],
+                )
+            except ValidationError:
+                logger.warning('Tramitação ignorada, campos inválidos: %s', row)
+                continue
+            if since is None or tramitacao.data_chegada >= since:
+                tramitacoes.append(tramitacao)
+        return tramitacoes
+
+    def _extract_tab(self, data: dict[str, Any], name: str, tab: Tag) -> None:
+        if name == 'votacoes':
+            data['votacoes'] = self._extract_votacoes(tab)
+        else:
+            data['tramitacoes'] = self._extract_tramitacoes(
+                tab,
+                self.last_tramitacoes.get(data['url']),
+            )
+
+    def _fetch_tabs(self, data: dict[str, Any]) -> None:
+        """Load the tabs whose content the page fetches over XHR."""
+        for name, tab_url in data['tab_urls'].items():
+            self._extract_tab(data, name, self._make_soup(self._get(tab_url)))
 
-        docs_container = soup.find('div', attrs={'data-tab': 'documentos'})
-        if not docs_container:
-            return files
+    def _find_pdf_files(self, docs_container: Tag) -> list[dict]:
+        """Linked PDFs; `local_path` is only known once a file is downloaded."""
+        files: dict[str, dict] = {}
+        if not DOWNLOAD_PDFS:
+            return []
 
-        project_pdf_dir = PDF_DIR / project_id
         pdf_links = docs_container.find_all(
             'a',
             href=re.compile(r'\.pdf', re.IGNORECASE),
         )
-
         for link in pdf_links:
-            if not project_pdf_dir.exists():
-                project_pdf_dir.mkdir(parents=True, exist_ok=True)
-
-            file_url = urllib.parse.urljoin(BASE_URL, str(link['href']))
-            name_text = link.get_text(strip=True) or 'document'
-            filename = re.sub(r'[\\/*?:"<>|]', '', name_text).strip()
-            if not filename.lower().endswith('.pdf'):
-                filename += '.pdf'
-            save_path = project_pdf_dir / filename
-
-            if not save_path.exists():
-                try:
-                    with self.client.stream('GET', file_url) as r:
-                        r.raise_for_status()
-                        with save_path.open('wb') as f:
-                            f.writelines(r.iter_bytes())
-                    logger.info('Downloaded: %s', filename)
-                except Exception:
-                    logger.exception('Failed to download PDF %s', file_url)
-
-            files.append(
+            file_url = urllib.parse.urljoin(self.base_url, str(link['href']))
+            files.setdefault(
+                file_url,
                 {
-                    'name': name_text,
-                    'local_path': str(save_path),
+                    'name': link.get_text(strip=True) or 'document',
                     'remote_url': file_url,
                 },
             )
-        return files
-
-    def save_project_to_db(self, data: dict):
-        try:
-            metadata = data.get('metadata', {})
-            data_abertura = None
-            if raw_data := metadata.get('data_da_abertura'):
-                with contextlib.suppress(ValueError):
-                    data_abertura = (
-                        datetime.strptime(raw_data, '%d/%m/%Y')
-                        .replace(tzinfo=UTC)
-                        .date()
-                    )
-
-            link_pdf = None
-            if data['files']:
-                link_pdf = data['files'][0].get('local_path')
-
-            # Inserir projeto
-            self.cursor.execute(
-                """
-                INSERT OR IGNORE INTO projetos (
-                    id_externo, numero_processo, tipo, ementa,
-                    data_abertura, situacao_tramitacao, situacao_plenaria,
-                    link_pdf_principal, data_ultima_tramitacao
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        return list(files.values())
+
+    def _stored_blob(
+        self,
+        url: str,
+        conn: sqlite3.Connection | None = None,
+    ) -> tuple[str, int | None, int | None] | None:
+        """(sha256, size, pages) last downloaded from a URL, if still stored.
+
+        Given `conn`, it is used instead of the scraper's connection, which
+        belongs to the thread that created it.
+        """
+        row = (conn or self.conn).execute(
+            """
+            SELECT sha256, tamanho, paginas FROM documentos
+            WHERE url = ? AND sha256 IS NOT NULL
+            ORDER BY data_download DESC
+            LIMIT 1
             """,
-                (
-                    data['id'],
-                    metadata.get('processo'),
-                    'PLL',
-                    None,  # O scraper atual não obtém a ementa nos metadados
-                    data_abertura,
-                    metadata.get('situacao'),
-                    metadata.get('situacao_plenaria'),
-                    link_pdf,
-                    datetime.strptime(
-                        metadata.get('ultima_tramitacao'),
-                        '%d/%m/%Y',
-                    )
-                    .replace(
-                        tzinfo=UTC,
-                    )
-                    .date()
-                    if metadata.get('ultima_tramitacao')
-                    else None,
-                ),
+            (url,),
+        ).fetchone()
+        if row and self.blobs.exists(row[0]):
+            return row
+        return None
+
+    def _set_blob(
+        self,
+        file: dict,
+        sha256: str,
+        size: int | None,
+        pages: int | None,
+        *,
+        conn: sqlite3.Connection | None = None,
+    ) -> None:
+        """Point the file, and the documents already saved with its URL, at a blob."""
+        conn = conn or self.conn
+        if self.archive:
+            self.archive.record_blob(file['remote_url'], sha256, size, pages)
+        file.update(
+            sha256=sha256,
+            local_path=str(self.blobs.path(sha256)),
+            tamanho=size,
+            paginas=pages,
+        )
+        with conn:
+            conn.execute(
+                """
+                UPDATE documentos
+                SET sha256 = ?, tamanho = ?, paginas = ?, data_download = CURRENT_TIMESTAMP
+                WHERE url = ?
+                """,
+                (sha256, size, pages, file['remote_url']),
+            )
+            conn.execute(
+                """
+                UPDATE projetos SET link_pdf_principal = ?
+                WHERE id IN (SELECT projeto_id FROM documentos WHERE url = ? AND principal)
+                """,
+                (file['local_path'], file['remote_url']),
             )
 
-            projeto_db_id = self.cursor.lastrowid
-
-            # Inserir autor e relacionamento
-            if projeto_db_id:
-                autores_raw = metadata.get('autores', '')
-                if autores_raw:
-                    nome_autor = autores_raw.strip().upper()
-                    self.cursor.execute(
-                        'INSERT OR IGNORE INTO autores (nome) VALUES (?)',
-                        (nome_autor,),
-                    )
-                    self.cursor.execute(
-                        'SELECT id FROM autores WHERE nome = ?',
-                        (nome_autor,),
-                    )
-                    res = self.cursor.fetchone()
-                    if res:
-                        autor_id = res[0]
-                        self.cursor.execute(
-                            'INSERT OR IGNORE INTO projetos_autores (projeto_id, autor_id) VALUES (?, ?)',
-                            (projeto_db_id, autor_id),
-                        )
-
-            self.conn.commit()
-            logger.info('Projeto %s salvo no banco.', data['id'])
+    def _fetch_file(
+        self,
+        file: dict,
+        stored: tuple[str, int | None, int | None] | None,
+    ) -> tuple[str, int | None, int | None]:
+        """Download a file unless its `stored` blob is still current.
+
+        Returns its (sha256, size, pages). Touches neither the file nor the
+        database, so it can run on any thread.
+        """
+        if self.replay:
+            # The archive only has the blob's address; its content must be stored
+            archived = self.replay.blob(file['remote_url'])
+            if archived and self.blobs.exists(archived[0]):
+                return archived
+            raise LookupError(f'{file["remote_url"]} não está no arquivo')
+
+        headers = {}
+        if stored:
+            headers = self.http_cache.conditional_headers(file['remote_url'])
+            if not headers:
+                return stored
+
+        self.rate_limiter.wait(file['remote_url'])
+        blob = self.downloader.download(file['remote_url'], headers)
+        if not blob:
+            # Only a conditional GET, sent when a blob is stored, gets a 304
+            return stored  # type: ignore[return-value]
+        logger.info(
+            'Downloaded: %s (%s)',
+            file['name'],
+            'novo' if blob.created else 'já armazenado',
+        )
+        return blob.sha256, blob.size, page_count(blob.path)
+
+    def download_file(self, file: dict) -> None:
+        """Download into the blob store, unless the URL's blob is still current.
+
+        Sets `sha256` and `local_path` on the file.
+        """
+        stored = self._stored_blob(file['remote_url'])
+        self._set_blob(file, *self._fetch_file(file, stored))
+
+    @timed('process_files')
+    def _process_files(self, files: list[dict]) -> list[dict]:
+        # Downloads run in parallel; the database is only touched on this thread
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            futures = [
+                (file, pool.submit(self._fetch_file, file, self._stored_blob(file['remote_url'])))
+                for file in files
+            ]
+            for file, future in futures:
+                try:
+                    self._set_blob(file, *future.result())
+                except Exception:
+                    logger.exception('Failed to download PDF %s', file['remote_url'])
+        return files
 
-        except Exception:
-            logger.exception('Erro ao salvar no banco')
-            self.conn.rollback()
+    def _project_row(self, data: dict) -> ProjetoRow:
+        metadata = data.get('metadata', {})
+        data_abertura = None
+        if raw_data := metadata.get('data_da_abertura'):
+            data_abertura = self._parse_date(raw_data)
+        ultima_tramitacao = None
+        if raw_data := metadata.get('ultima_tramitacao'):
+            ultima_tramitacao = self._parse_date(raw_data)
+
+        link_pdf = None
+        if data['files']:
+            link_pdf = data['files'][0].get('local_path')
+
+        autores = []
+        if autores_raw := metadata.get('autores', ''):
+            autores.append(autores_raw.strip().upper())
+
+        return ProjetoRow(
+            id_externo=int(data['id']),
+            numero_processo=metadata.get('processo'),
+            tipo=data['tipo'],
+            ementa=None,  # O scraper atual não obtém a ementa nos metadados
+            data_abertura=data_abertura,
+            situacao_tramitacao=metadata.get('situacao'),
+            situacao_plenaria=metadata.get('situacao_plenaria'),
+            link_pdf_principal=link_pdf,
+            data_ultima_tramitacao=ultima_tramitacao,
+            autores=autores,
+            votacoes=data.get('votacoes'),
+            tramitacoes=data.get('tramitacoes', []),
+            documentos=[
+                DocumentoRow(
+                    url=file['remote_url'],
+                    nome=file['name'],
+                    principal=index == 0,
+                    sha256=file.get('sha256'),
+                    tamanho=file.get('tamanho'),
+                    paginas=file.get('paginas'),
+                )
+                for index, file in enumerate(data['files'])
+            ],
+        )
 
-    def process_project(self, url: str):
-        if url in self.processed_links:
+    @timed('save_project_to_db')
+    def save_project_to_db(
+        self,
+        data: dict,
+        on_saved: Callable[[], None] | None = None,
+    ) -> None:
+        """Buffer a project for the next batch; `on_saved` runs once committed."""
+        row = self._project_row(data)
+
+        def saved() -> None:
+            self.processed_links.add(data['url'])
+            self.last_movements[data['url']] = row.data_ultima_tramitacao
+            if row.tramitacoes:
+                self.last_tramitacoes[data['url']] = max(
+                    tramitacao.data_chegada for tramitacao in row.tramitacoes
+                )
+            if on_saved:
+                on_saved()
+
+        self.writer.add(row, saved)
+
+    def _extract_project(self, url: str, soup: BeautifulSoup) -> dict[str, Any]:
+        """Fill metadata, files and tabs in one pass over a strained page.
+
+        Tabs loaded over XHR (a `data-url` and no table yet) are left in
+        `tab_urls`, to be fetched and parsed with `_extract_tab`.
+        """
+        data: dict[str, Any] = {
+            'url': url,
+            'id': url.split('/')[-1],
+            'metadata': {},
+            'files': [],
+            'has_votacoes': False,
+            'has_tramitacoes': False,
+            'votacoes': None,
+            'tramitacoes': [],
+            'tab_urls': {},
+            'tipo': self.link_types.get(url, TipoProjeto.PLL),
+        }
+        for tab in soup.find_all('div', attrs={'data-tab': PROJECT_TABS}):
+            match tab['data-tab']:
+                case 'dados':
+                    data['metadata'] = self._extract_metadata(tab)
+                case 'documentos':
+                    data['files'] = self._find_pdf_files(tab)
+                case 'votacoes' | 'tramitacoes' as name:
+                    data[f'has_{name}'] = True
+                    if not tab.find('table') and (tab_url := tab.get('data-url')):
+                        data['tab_urls'][name] = urllib.parse.urljoin(url, str(tab_url))
+                    else:
+                        self._extract_tab(data, name, tab)
+        return data
+
+    def fetch_project(self, url: str) -> tuple[dict[str, Any], httpx.Response] | None:
+        """Fetch and parse a project page; None if unchanged since it was saved.
+
+        The caller stores the response in the HTTP cache once the data is saved.
+        """
+        # Pages are cached only once saved, so only revalidate known projects
+        resp = self._get(url, store=False, conditional=url in self.processed_links)
+        if resp.extensions.get('not_modified'):
+            logger.info('Not modified: %s', url)
+            return None
+        soup = BeautifulSoup(resp.text, HTML_PARSER, parse_only=PROJECT_STRAINER)
+        data = self._extract_project(url, soup)
+        self._fetch_tabs(data)
+        return data, resp
+
+    @timed('process_project')
+    def process_project(self, url: str, *, refresh: bool = False):
+        if url in self.processed_links and not refresh:
             logger.info('Skipping %s (already in DB)', url)
             return
 
         try:
             logger.info('Processing: %s', url)
-            resp = self.client.get(url)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            fetched = self.fetch_project(url)
+            if not fetched:
+                return
 
-            data: dict[str, Any] = {'url': url, 'id': url.split('/')[-1]}
-            data['metadata'] = self._extract_metadata(soup)
-            data['has_votacoes'] = bool(
-                soup.find('div', attrs={'data-tab': 'votacoes'}),
-            )
-            data['has_tramitacoes'] = bool(
-                soup.find('div', attrs={'data-tab': 'tramitacoes'}),
-            )
-            data['files'] = self._process_files(soup, data['id'])
+            data, resp = fetched
+            self._process_files(data['files'])
 
-            self.save_project_to_db(data)
+            self.save_project_to_db(data, lambda: self.http_cache.store(resp))
 
         except Exception:
             logger.exception('Failed to process %s', url)
 
     def close(self):
+        self.writer.flush()
         self.client.close()
+        if self._owns_downloader:
+            self.downloader.close()
         self.conn.close()
 
 
 if __name__ == '__main__':
-    scraper = CamaraScraper()
+    arg_parser = argparse.ArgumentParser(
+        description='Scrape projects from camarapoa.rs.gov.br.',
+    )
+    arg_parser.add_argument(
+        '--pages',
+        type=int,
+        default=None,
+        help='Maximum number of listing pages to crawl per type (default: all)',
+    )
+    arg_parser.add_argument(
+        '--tipos',
+        type=TipoProjeto,
+        nargs='+',
+        choices=TIPOS,
+        default=TIPOS,
+        help='Project types to crawl (default: all)',
+    )
+    arg_parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Re-fetch projects whose last movement changed, stopping at the '
+        'first page with nothing newer',
+    )
+    arg_parser.add_argument(
+        '--no-record',
+        action='store_true',
+        help=f'Do not record the responses into {ARCHIVE_DIR} (see replay.py)',
+    )
+    arg_parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics on this local port',
+    )
+    args = arg_parser.parse_args()
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    archive = None if args.no_record else ResponseArchive(ARCHIVE_DIR)
+    scraper = CamaraScraper(archive=archive)
     try:
-        links = scraper.get_project_links(max_pages=2)
+        if args.sync:
+            links = scraper.sync_project_links(args.pages, args.tipos)
+        else:
+            links = scraper.get_project_links(args.pages, args.tipos)
+        # Links are processed as each listing page is read
         for link in links:
-            scraper.process_project(link)
+            scraper.process_project(link, refresh=args.sync)
     except KeyboardInterrupt:
         logger.warning('Interrompido pelo usuário.')
     finally:
         scraper.close()
+        if archive:
+            archive.close()
+        logger.info('Resumo:\n%s', metrics.summary())
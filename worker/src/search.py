@@ -0,0 +1,149 @@
+import argparse
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+
+from db import connect, init_db
+from text_cache import PageTextCache, join_pages
+
+DB_FILE = Path('voz_civica.db')
+
+# bm25 weights of ementa, titulo, resumo and texto: a hit in the title or
+# summary says more about the topic than one deep in the bill's text
+BM25_WEIGHTS = (5.0, 10.0, 5.0, 1.0)
+SNIPPET_TOKENS = 16
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchResult:
+    id_externo: int
+    ementa: str | None
+    titulo: str | None
+    snippet: str
+    rank: float
+
+
+def to_match_query(query: str) -> str:
+    """Turn free text into an FTS5 query: every word, as a prefix, must match.
+
+    Quoting each word keeps user input from being parsed as FTS5 syntax.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+) -> list[SearchResult]:
+    """BM25-ranked projects matching `query`, with a highlighted snippet."""
+    if not (match := to_match_query(query)):
+        return []
+    rows = conn.execute(
+        """
+        SELECT
+            p.id_externo,
+            p.ementa,
+            a.titulo_simplificado,
+            snippet(busca_projetos, -1, '<mark>', '</mark>', '…', ?),
+            bm25(busca_projetos, ?, ?, ?, ?) AS rank
+        FROM busca_projetos
+        JOIN projetos p ON p.id = busca_projetos.rowid
+        LEFT JOIN analises_ia a ON a.projeto_id = p.id
+        WHERE busca_projetos MATCH ?
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+        """,
+        (SNIPPET_TOKENS, *BM25_WEIGHTS, match, limit, offset),
+    ).fetchall()
+    return [SearchResult(*row) for row in rows]
+
+
+def index_text(conn: sqlite3.Connection, projeto_id: int, text: str) -> None:
+    """Index the bill's text; the other columns are kept in sync by triggers."""
+    with conn:
+        conn.execute(
+            'UPDATE busca_projetos SET texto = ? WHERE rowid = ?',
+            (text, projeto_id),
+        )
+
+
+def rebuild(conn: sqlite3.Connection, text_cache: PageTextCache | None = None) -> int:
+    """Recreate the index from the tables, plus PDF text from the page cache."""
+    with conn:
+        conn.execute('DELETE FROM busca_projetos')
+        conn.execute(
+            """
+            INSERT INTO busca_projetos (rowid, ementa, titulo, resumo)
+            SELECT p.id, p.ementa, a.titulo_simplificado, a.resumo_simples
+            FROM projetos p
+            LEFT JOIN analises_ia a ON a.projeto_id = p.id
+            """,
+        )
+    if not text_cache:
+        return 0
+
+    indexed = 0
+    for projeto_id, pdf_path in conn.execute(
+        'SELECT id, link_pdf_principal FROM projetos WHERE link_pdf_principal IS NOT NULL',
+    ).fetchall():
+        if not Path(pdf_path).exists():
+            continue
+        try:
+            _, pages = text_cache.pages(pdf_path)
+        except Exception:
+            logger.exception('Falha ao extrair texto de %s', pdf_path)
+            continue
+        index_text(conn, projeto_id, join_pages(pages))
+        indexed += 1
+    with conn:
+        conn.execute("INSERT INTO busca_projetos (busca_projetos) VALUES ('optimize')")
+    return indexed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Full-text search over the projects.')
+    parser.add_argument('query', type=str, nargs='?', help='Search terms')
+    parser.add_argument('--limit', type=int, default=20, help='Number of results')
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Rebuild the index, including the text of downloaded PDFs',
+    )
+    args = parser.parse_args()
+
+    init_db(DB_FILE)
+    conn = connect(DB_FILE)
+    try:
+        if args.rebuild:
+            text_cache = PageTextCache(DB_FILE)
+            try:
+                indexed = rebuild(conn, text_cache)
+            finally:
+                text_cache.close()
+            logger.info('Índice reconstruído; %d textos de PDF indexados.', indexed)
+        if args.query:
+            for result in search(conn, args.query, args.limit):
+                logger.info(
+                    '[%d] %s (%.2f)\n    %s',
+                    result.id_externo,
+                    result.titulo or result.ementa,
+                    result.rank,
+                    result.snippet,
+                )
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+import zlib
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from db import connect, init_db
+from text_cache import PageTextCache, join_pages
+
+DB_FILE = Path('voz_civica.db')
+
+# Words per shingle: long enough that two unrelated bills share few of them
+SHINGLE_SIZE = 5
+# 32 bands of 4 rows: pairs above ~0.42 Jaccard are likely to share a band
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# Changing the seed (or any of the above) requires `--rebuild`
+MINHASH_SEED = 1
+MERSENNE_PRIME = (1 << 61) - 1
+# Estimated Jaccard of projects shown as related, and of texts close enough
+# (re-filings, typo fixes) to take over another project's analysis
+RELATED_THRESHOLD = 0.5
+REUSE_THRESHOLD = 0.9
+
+_rng = random.Random(MINHASH_SEED)
+PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Similar:
+    projeto_id: int
+    similaridade: float
+
+
+@dataclass
+class RelatedProject:
+    id_externo: int
+    ementa: str | None
+    titulo: str | None
+    similaridade: float
+
+
+def shingles(text: str) -> set[int]:
+    """Hashes of the text's overlapping `SHINGLE_SIZE`-word sequences.
+
+    Case and punctuation are ignored, so reformatting alone doesn't count as a
+    difference.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return set()
+    # crc32 is enough here: a rare collision only nudges the estimate
+    return {
+        zlib.crc32(' '.join(words[i : i + SHINGLE_SIZE]).encode())
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    }
+
+
+def signature(text: str) -> list[int] | None:
+    """MinHash signature of a text; None if it has no words."""
+    if not (hashes := shingles(text)):
+        return None
+    return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+
+def similarity(first: list[int], second: list[int]) -> float:
+    """Jaccard similarity of two texts, estimated from their signatures."""
+    return sum(x == y for x, y in zip(first, second, strict=True)) / len(first)
+
+
+def band_hashes(sig: list[int]) -> list[int]:
+    """One (signed 64-bit, as SQLite stores it) hash per band of a signature."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                array('Q', sig[start : start + LSH_ROWS]).tobytes(),
+                digest_size=8,
+            ).digest(),
+            'little',
+            signed=True,
+        )
+        for start in range(0, NUM_PERM, LSH_ROWS)
+    ]
+
+
+def candidates(
+    conn: sqlite3.Connection,
+    sig: list[int],
+    threshold: float = RELATED_THRESHOLD,
+    exclude: int | None = None,
+) -> list[Similar]:
+    """Indexed projects similar to a signature, most similar first.
+
+    Only projects sharing a band are compared, so the cost follows the
+    number of near matches rather than the size of the index.
+    """
+    rows = conn.execute(
+        """
+        SELECT projeto_id, assinatura FROM assinaturas_minhash
+        WHERE projeto_id IN (
+            SELECT b.projeto_id FROM json_each(?) j
+            JOIN bandas_minhash b ON b.banda = j.key AND b.hash = j.value
+        )
+        AND projeto_id IS NOT ?
+        """,
+        (json.dumps(band_hashes(sig)), exclude),
+    ).fetchall()
+    found = [
+        Similar(projeto_id, score)
+        for projeto_id, blob in rows
+        if (score := similarity(sig, array('Q', blob).tolist())) >= threshold
+    ]
+    return sorted(found, key=lambda item: -item.similaridade)
+
+
+def index_project(
+    conn: sqlite3.Connection,
+    projeto_id: int,
+    sha256: str,
+    text: str,
+) -> list[Similar]:
+    """Index the text of a project, replacing its previous entry.
+
+    Returns the indexed projects similar to it (above `RELATED_THRESHOLD`).
+    """
+    sig = signature(text)
+    with conn:
+        conn.execute('DELETE FROM bandas_minhash WHERE projeto_id = ?', (projeto_id,))
+        conn.execute(
+            'DELETE FROM projetos_similares WHERE projeto_id = ? OR similar_id = ?',
+            (projeto_id, projeto_id),
+        )
+        if not sig:
+            conn.execute('DELETE FROM assinaturas_minhash WHERE projeto_id = ?', (projeto_id,))
+            return []
+
+        similares = candidates(conn, sig, exclude=projeto_id)
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO assinaturas_minhash (projeto_id, sha256, assinatura)
+            VALUES (?, ?, ?)
+            """,
+            (projeto_id, sha256, array('Q', sig).tobytes()),
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO bandas_minhash (banda, hash, projeto_id) VALUES (?, ?, ?)',
+            [(banda, value, projeto_id) for banda, value in enumerate(band_hashes(sig))],
+        )
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO projetos_similares (projeto_id, similar_id, similaridade)
+            VALUES (?, ?, ?)
+            """,
+            [
+                pair
+                for item in similares
+                for pair in (
+                    (projeto_id, item.projeto_id, item.similaridade),
+                    (item.projeto_id, projeto_id, item.similaridade),
+                )
+            ],
+        )
+    return similares
+
+
+def related(conn: sqlite3.Connection, id_externo: int, limit: int = 10) -> list[RelatedProject]:
+    """Projects whose text is similar to that of a project, most similar first."""
+    rows = conn.execute(
+        """
+        SELECT r.id_externo, r.ementa, a.titulo_simplificado, s.similaridade
+        FROM projetos p
+        JOIN projetos_similares s ON s.projeto_id = p.id
+        JOIN projetos r ON r.id = s.similar_id
+        LEFT JOIN analises_ia a ON a.projeto_id = r.id
+        WHERE p.id_externo = ?
+        ORDER BY s.similaridade DESC, r.id_externo DESC
+        LIMIT ?
+        """,
+        (id_externo, limit),
+    ).fetchall()
+    return [RelatedProject(*row) for row in rows]
+
+
+def load_analysis(conn: sqlite3.Connection, analise_id: int) -> dict[str, Any]:
+    """A saved analysis in the model's response format (`RespostaAnalise`)."""
+    titulo, resumo = conn.execute(
+        'SELECT titulo_simplificado, resumo_simples FROM analises_ia WHERE id = ?',
+        (analise_id,),
+    ).fetchone()
+    items = {}
+    for key, field, sql in (
+        (
+            'mudancas',
+            'texto_simplificado',
+            'SELECT texto_simplificado, trechos_originais FROM analise_mudancas '
+            'WHERE analise_id = ? ORDER BY id',
+        ),
+        (
+            'justificativas',
+            'texto_simplificado',
+            'SELECT texto_simplificado, trechos_originais FROM analise_justificativas '
+            'WHERE analise_id = ? ORDER BY id',
+        ),
+        (
+            'categorias',
+            'nome',
+            'SELECT nome_categoria, trechos_originais FROM analise_categorias '
+            'WHERE analise_id = ? ORDER BY id',
+        ),
+    ):
+        items[key] = [
+            {field: texto, 'trechos_originais': json.loads(trechos)}
+            for texto, trechos in conn.execute(sql, (analise_id,))
+        ]
+    return {'titulo': titulo, 'resumo': resumo, **items}
+
+
+def adapt_analysis(result: dict[str, Any], text: str) -> dict[str, Any] | None:
+    """Fit another project's analysis to a text: quotes it lacks are dropped.
+
+    Items left without quotes are dropped too. None if a whole section would
+    be left empty, i.e. the texts differ where it matters.
+    """
+    normalized = ' '.join(text.split())
+    adapted: dict[str, Any] = {'titulo': result['titulo'], 'resumo': result['resumo']}
+    for key in ('mudancas', 'justificativas', 'categorias'):
+        adapted[key] = [
+            {**item, 'trechos_originais': trechos}
+            for item in result[key]
+            if (
+                trechos := [
+                    trecho
+                    for trecho in item['trechos_originais']
+                    if ' '.join(trecho.split()) in normalized
+                ]
+            )
+        ]
+        if not adapted[key]:
+            return None
+    return adapted
+
+
+def reusable_analysis(
+    conn: sqlite3.Connection,
+    similares: list[Similar],
+    modelo: str,
+    text: str,
+    threshold: float = REUSE_THRESHOLD,
+) -> tuple[int, dict[str, Any]] | None:
+    """(analysis id, adapted result) of the most similar project that fits the text.
+
+    Only analyses of `modelo` generated for their own project are reused.
+    """
+    for item in similares:
+        if item.similaridade < threshold:
+            break
+        row = conn.execute(
+            """
+            SELECT id FROM analises_ia
+            WHERE projeto_id = ? AND modelo_utilizado = ? AND reaproveitada_de IS NULL
+            """,
+            (item.projeto_id, modelo),
+        ).fetchone()
+        if row and (result := adapt_analysis(load_analysis(conn, row[0]), text)):
+            return row[0], result
+    return None
+
+
+def rebuild(conn: sqlite3.Connection, text_cache: PageTextCache) -> int:
+    """Recreate the index from the cached text of every project's main PDF."""
+    with conn:
+        conn.execute('DELETE FROM projetos_similares')
+        conn.execute('DELETE FROM bandas_minhash')
+        conn.execute('DELETE FROM assinaturas_minhash')
+
+    indexed = 0
+    for projeto_id, pdf_path in conn.execute(
+        'SELECT id, link_pdf_principal FROM projetos WHERE link_pdf_principal IS NOT NULL',
+    ).fetchall():
+        if not Path(pdf_path).exists():
+            continue
+        try:
+            sha256, pages = text_cache.pages(pdf_path)
+        except Exception:
+            logger.exception('Falha ao extrair texto de %s', pdf_path)
+            continue
+        index_project(conn, projeto_id, sha256, join_pages(pages))
+        indexed += 1
+    return indexed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Near-duplicate index (MinHash/LSH) over the projects.',
+    )
+    parser.add_argument('projeto', type=int, nargs='?', help='List projects related to this one')
+    parser.add_argument('--limit', type=int, default=10, help='Number of results')
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Rebuild the index from the text of downloaded PDFs',
+    )
+    args = parser.parse_args()
+
+    init_db(DB_FILE)
+    conn = connect(DB_FILE)
+    try:
+        if args.rebuild:
+            text_cache = PageTextCache(DB_FILE)
+            try:
+                indexed = rebuild(conn, text_cache)
+            finally:
+                text_cache.close()
+            pairs = conn.execute('SELECT COUNT(*) FROM projetos_similares').fetchone()[0]
+            logger.info('%d projetos indexados, %d pares similares.', indexed, pairs // 2)
+        if args.projeto is not None:
+            for result in related(conn, args.projeto, args.limit):
+                logger.info(
+                    '[%d] %s (%.2f)',
+                    result.id_externo,
+                    result.titulo or result.ementa,
+                    result.similaridade,
+                )
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import logging
+import threading
+import zlib
+from collections.abc import Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import fitz
+
+from db import connect, init_db
+
+DB_FILE = Path('voz_civica.db')
+HASH_CHUNK_SIZE = 1 << 20
+PAGE_SEPARATOR = chr(12)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S',
+)
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: Path | str) -> str:
+    digest = hashlib.sha256()
+    with Path(path).open('rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_pages(pdf_path: Path | str) -> list[str]:
+    """Extract the text of every page with PyMuPDF."""
+    with fitz.open(pdf_path) as doc:
+        return [str(page.get_text()) for page in doc]
+
+
+def join_pages(pages: list[str]) -> str:
+    return PAGE_SEPARATOR.join(pages).strip()
+
+
+class PageTextCache:
+    """Per-page PDF text stored zlib-compressed in `textos_pdf`.
+
+    Keyed by the file's SHA-256, so renamed or re-downloaded copies of the same
+    document hit the cache, and a changed document never reads stale text.
+    """
+
+    def __init__(self, db_path: Path = DB_FILE) -> None:
+        self.conn = connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def get(self, sha256: str) -> list[str] | None:
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT texto FROM textos_pdf WHERE sha256 = ? ORDER BY pagina',
+                (sha256,),
+            ).fetchall()
+        if not rows:
+            return None
+        return [zlib.decompress(row[0]).decode('utf-8') for row in rows]
+
+    def put(self, sha256: str, pages: list[str]) -> None:
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM textos_pdf WHERE sha256 = ?', (sha256,))
+            self.conn.executemany(
+                'INSERT INTO textos_pdf (sha256, pagina, texto) VALUES (?, ?, ?)',
+                [
+                    (sha256, number, zlib.compress(text.encode('utf-8')))
+                    for number, text in enumerate(pages, start=1)
+                ],
+            )
+
+    def has(self, sha256: str) -> bool:
+        with self._lock:
+            return bool(
+                self.conn.execute(
+                    'SELECT 1 FROM textos_pdf WHERE sha256 = ? LIMIT 1',
+                    (sha256,),
+                ).fetchone(),
+            )
+
+    def pages(
+        self,
+        pdf_path: Path | str,
+        executor: Executor | None = None,
+        sha256: str | None = None,
+    ) -> tuple[str, list[str]]:
+        """Return (sha256, pages) for a PDF, extracting it on a cache miss.
+
+        Files from the blob store pass their known `sha256`, skipping the hash.
+        """
+        sha256 = sha256 or file_sha256(pdf_path)
+        if (cached := self.get(sha256)) is not None:
+            return sha256, cached
+
+        if executor:
+            pages = executor.submit(extract_pages, str(pdf_path)).result()
+        else:
+            pages = extract_pages(pdf_path)
+        self.put(sha256, pages)
+        return sha256, pages
+
+    def text(self, pdf_path: Path | str) -> str:
+        return join_pages(self.pages(pdf_path)[1])
+
+    def extract_many(
+        self,
+        pdf_paths: Iterable[Path | str],
+        workers: int | None = None,
+    ) -> dict[str, str]:
+        """Warm the cache for many PDFs in a process pool.
+
+        Returns a path → sha256 map of every PDF that could be read.
+        """
+        hashes: dict[str, str] = {}
+        misses: dict[str, str] = {}
+        queued: set[str] = set()
+        for path in map(str, pdf_paths):
+            try:
+                sha256 = file_sha256(path)
+            except OSError:
+                logger.exception('Não foi possível ler %s', path)
+                continue
+            hashes[path] = sha256
+            if sha256 not in queued and not self.has(sha256):
+                misses[path] = sha256
+                queued.add(sha256)
+
+        logger.info('%d PDFs, %d a extrair.', len(hashes), len(misses))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(extract_pages, path): path for path in misses}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    self.put(misses[path], future.result())
+                except Exception:
+                    logger.exception('Falha ao extrair texto de %s', path)
+                    hashes.pop(path)
+        return hashes
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Extract and cache the text of many PDFs in parallel.',
+    )
+    parser.add_argument(
+        'paths',
+        type=Path,
+        nargs='+',
+        help='PDF files or directories to scan recursively',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of extraction processes (default: CPU count)',
+    )
+    args = parser.parse_args()
+
+    pdf_paths = [
+        pdf
+        for path in args.paths
+        for pdf in (path.rglob('*.pdf') if path.is_dir() else [path])
+    ]
+
+    init_db(DB_FILE)
+    cache = PageTextCache(DB_FILE)
+    try:
+        cache.extract_many(pdf_paths, args.workers)
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+import json
+import logging
+import sqlite3
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Annotated
+
+from pydantic import ConfigDict, Field, TypeAdapter
+
+from ingest import quarantine, release, validate_batch
+from metrics import timed
+from schemas import TipoProjeto, Tramitacao, Votacao
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+@dataclass
+class DocumentoRow:
+    url: str
+    nome: str | None
+    principal: bool = False
+    # Known once downloaded; kept as stored otherwise
+    sha256: str | None = None
+    tamanho: int | None = None
+    paginas: int | None = None
+
+
+@dataclass
+class ProjetoRow:
+    # Constraints match `schemas.Projeto`; checked by the writer for each batch
+    id_externo: Annotated[int, Field(gt=0)]
+    numero_processo: Annotated[str | None, Field(pattern=r'^\d{5}/\d{2}$')]
+    tipo: TipoProjeto
+    ementa: str | None
+    data_abertura: date | None
+    situacao_tramitacao: str | None
+    situacao_plenaria: str | None
+    link_pdf_principal: str | None
+    data_ultima_tramitacao: date | None
+    autores: list[str] = field(default_factory=list)
+    # None when the tab wasn't scraped, so the stored rows are kept as they are
+    votacoes: list[Votacao] | None = None
+    # Only the movements newer than the stored ones; they are upserted
+    tramitacoes: list[Tramitacao] = field(default_factory=list)
+    documentos: list[DocumentoRow] = field(default_factory=list)
+
+
+# Rows are dataclass instances, so they must be revalidated, not passed through
+PROJETO_ROWS = TypeAdapter(
+    list[ProjetoRow],
+    config=ConfigDict(revalidate_instances='always'),
+)
+
+
+class ProjectWriter:
+    """Buffers projects and writes each batch in a single transaction.
+
+    Author ids are cached in memory, so a known author costs no round trip.
+    Callbacks passed to `add` run once their project's batch is committed.
+    Rows failing validation go to `quarentena` instead (without callbacks).
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        self.conn = conn
+        self.batch_size = batch_size
+        self._rows: dict[int, ProjetoRow] = {}
+        self._callbacks: dict[int, list[Callable[[], None]]] = {}
+        self._author_ids: dict[str, int] = dict(
+            conn.execute('SELECT nome, id FROM autores').fetchall(),
+        )
+
+    def add(self, row: ProjetoRow, on_saved: Callable[[], None] | None = None) -> None:
+        self._rows[row.id_externo] = row
+        if on_saved:
+            self._callbacks.setdefault(row.id_externo, []).append(on_saved)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def _author_id(self, cursor: sqlite3.Cursor, nome: str) -> int:
+        if nome not in self._author_ids:
+            # DO UPDATE (instead of DO NOTHING) so RETURNING also yields existing ids
+            self._author_ids[nome] = cursor.execute(
+                """
+                INSERT INTO autores (nome) VALUES (?)
+                ON CONFLICT (nome) DO UPDATE SET nome = excluded.nome
+                RETURNING id
+                """,
+                (nome,),
+            ).fetchone()[0]
+        return self._author_ids[nome]
+
+    @timed('write_batch')
+    def flush(self) -> bool:
+        """Write the buffered projects; returns False if the batch was rolled back."""
+        if not self._rows:
+            return True
+
+        rows, rejected = validate_batch(PROJETO_ROWS, list(self._rows.values()))
+        callbacks = self._callbacks
+        self._rows = {}
+        self._callbacks = {}
+
+        cursor = self.conn.cursor()
+        try:
+            quarantine(
+                self.conn,
+                'projeto',
+                [(row.id_externo, row, errors) for row, errors in rejected],
+            )
+            release(self.conn, 'projeto', [row.id_externo for row in rows])
+            cursor.executemany(
+                """
+                INSERT INTO projetos (
+                    id_externo, numero_processo, tipo, ementa,
+                    data_abertura, situacao_tramitacao, situacao_plenaria,
+                    link_pdf_principal, data_ultima_tramitacao
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id_externo) DO UPDATE SET
+                    numero_processo = excluded.numero_processo,
+                    tipo = excluded.tipo,
+                    ementa = COALESCE(excluded.ementa, projetos.ementa),
+                    data_abertura = excluded.data_abertura,
+                    situacao_tramitacao = excluded.situacao_tramitacao,
+                    situacao_plenaria = excluded.situacao_plenaria,
+                    link_pdf_principal = COALESCE(
+                        excluded.link_pdf_principal,
+                        projetos.link_pdf_principal
+                    ),
+                    data_ultima_tramitacao = excluded.data_ultima_tramitacao,
+                    data_atualizacao = CURRENT_TIMESTAMP
+                """,
+                [
+                    (
+                        row.id_externo,
+                        row.numero_processo,
+                        row.tipo,
+                        row.ementa,
+                        row.data_abertura,
+                        row.situacao_tramitacao,
+                        row.situacao_plenaria,
+                        row.link_pdf_principal,
+                        row.data_ultima_tramitacao,
+                    )
+                    for row in rows
+                ],
+            )
+
+            projeto_ids = dict(
+                cursor.execute(
+                    """
+                    SELECT id_externo, id FROM projetos
+                    WHERE id_externo IN (SELECT value FROM json_each(?))
+                    """,
+                    (json.dumps([row.id_externo for row in rows]),),
+                ).fetchall(),
+            )
+
+            # Only the authors that changed are written: every row inserted or
+            # deleted rebuilds the project's listing row (see the triggers)
+            autor_ids = {
+                row.id_externo: [self._author_id(cursor, nome) for nome in row.autores]
+                for row in rows
+            }
+            cursor.executemany(
+                """
+                DELETE FROM projetos_autores
+                WHERE projeto_id = ? AND autor_id NOT IN (SELECT value FROM json_each(?))
+                """,
+                [
+                    (projeto_ids[row.id_externo], json.dumps(autor_ids[row.id_externo]))
+                    for row in rows
+                ],
+            )
+            cursor.executemany(
+                'INSERT OR IGNORE INTO projetos_autores (projeto_id, autor_id) VALUES (?, ?)',
+                [
+                    (projeto_ids[row.id_externo], autor_id)
+                    for row in rows
+                    for autor_id in autor_ids[row.id_externo]
+                ],
+            )
+
+            cursor.executemany(
+                'DELETE FROM votacoes WHERE projeto_id = ?',
+                [(projeto_ids[row.id_externo],) for row in rows if row.votacoes is not None],
+            )
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO votacoes (
+                    projeto_id, data, titulo, votos_sim, votos_nao, abstencoes,
+                    resultado, detalhes_url
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        projeto_ids[row.id_externo],
+                        votacao.data,
+                        votacao.titulo,
+                        votacao.votos_sim,
+                        votacao.votos_nao,
+                        votacao.abstencoes,
+                        votacao.resultado,
+                        str(votacao.detalhes_url) if votacao.detalhes_url else None,
+                    )
+                    for row in rows
+                    for votacao in row.votacoes or []
+                ],
+            )
+            cursor.executemany(
+                """
+                INSERT INTO tramitacoes (
+                    projeto_id, setor, data_chegada, data_saida, situacao
+                ) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (projeto_id, data_chegada, setor) DO UPDATE SET
+                    data_saida = excluded.data_saida,
+                    situacao = excluded.situacao
+                WHERE tramitacoes.data_saida IS NOT excluded.data_saida
+                   OR tramitacoes.situacao IS NOT excluded.situacao
+                """,
+                [
+                    (
+                        projeto_ids[row.id_externo],
+                        tramitacao.setor,
+                        tramitacao.data_chegada,
+                        tramitacao.data_saida,
+                        tramitacao.situacao,
+                    )
+                    for row in rows
+                    for tramitacao in row.tramitacoes
+                ],
+            )
+            # Files the project page no longer lists
+            cursor.executemany(
+                """
+                DELETE FROM documentos
+                WHERE projeto_id = ? AND url NOT IN (SELECT value FROM json_each(?))
+                """,
+                [
+                    (
+                        projeto_ids[row.id_externo],
+                        json.dumps([documento.url for documento in row.documentos]),
+                    )
+                    for row in rows
+                ],
+            )
+            cursor.executemany(
+                """
+                INSERT INTO documentos (
+                    projeto_id, url, nome, principal, sha256, tamanho, paginas,
+                    data_download
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, IIF(?5 IS NULL, NULL, CURRENT_TIMESTAMP))
+                ON CONFLICT (projeto_id, url) DO UPDATE SET
+                    nome = excluded.nome,
+                    principal = excluded.principal,
+                    sha256 = COALESCE(excluded.sha256, documentos.sha256),
+                    tamanho = COALESCE(excluded.tamanho, documentos.tamanho),
+                    paginas = COALESCE(excluded.paginas, documentos.paginas),
+                    data_download = COALESCE(excluded.data_download, documentos.data_download)
+                """,
+                [
+                    (
+                        projeto_ids[row.id_externo],
+                        documento.url,
+                        documento.nome,
+                        documento.principal,
+                        documento.sha256,
+                        documento.tamanho,
+                        documento.paginas,
+                    )
+                    for row in rows
+                    for documento in row.documentos
+                ],
+            )
+            self.conn.commit()
+        except Exception:
+            logger.exception('Erro ao salvar lote de %d projetos no banco', len(rows))
+            self.conn.rollback()
+            # Ids cached during the failed transaction may not exist anymore
+            self._author_ids = dict(
+                self.conn.execute('SELECT nome, id FROM autores').fetchall(),
+            )
+            return False
+
+        logger.info('%d projetos salvos no banco.', len(rows))
+        for row in rows:
+            for callback in callbacks.get(row.id_externo, []):
+                callback()
+        return True
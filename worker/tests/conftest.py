@@ -0,0 +1,14 @@
+from pathlib import Path
+
+import pytest
+
+from db import init_db
+
+
+@pytest.fixture
+def db_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A migrated database, as `voz_civica.db` in the (temporary) working directory."""
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'voz_civica.db'
+    init_db(path)
+    return path
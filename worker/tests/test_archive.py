@@ -0,0 +1,52 @@
+import httpx
+
+from archive import ArchiveIndex, ResponseArchive
+
+URL = 'https://example.org/processos/1'
+
+
+def response(text: str, *, not_modified: bool = False) -> httpx.Response:
+    extensions = {'not_modified': True} if not_modified else {}
+    return httpx.Response(
+        200,
+        headers={'content-type': 'text/html', 'etag': '"v1"'},
+        text=text,
+        request=httpx.Request('GET', f'{URL}?_=123'),
+        extensions=extensions,
+    )
+
+
+def test_revalidated_response_is_archived_when_missing(tmp_path):
+    archive = ResponseArchive(tmp_path)
+    archive.record(response('<p>do cache</p>', not_modified=True))
+    archive.close()
+
+    resp = ArchiveIndex(tmp_path).response(httpx.Request('GET', URL))
+
+    assert resp.status_code == 200
+    assert resp.text == '<p>do cache</p>'
+
+
+def test_revalidated_response_is_not_archived_again(tmp_path):
+    # A previous run, then one with a warm HTTP cache
+    archive = ResponseArchive(tmp_path)
+    archive.record(response('<p>v1</p>'))
+    archive.close()
+    archive = ResponseArchive(tmp_path)
+    archive.record(response('<p>v1</p>', not_modified=True))
+    archive.record(response('<p>v1</p>', not_modified=True))
+    archive.close()
+
+    assert len(list(tmp_path.glob('*.arq'))) == 1
+    assert ArchiveIndex(tmp_path).response(httpx.Request('GET', URL)).text == '<p>v1</p>'
+
+
+def test_blob_record_does_not_count_as_archived_response(tmp_path):
+    archive = ResponseArchive(tmp_path)
+    archive.record_blob(URL, 'abc', 10, 1)
+    archive.record(response('<p>página</p>', not_modified=True))
+    archive.close()
+
+    index = ArchiveIndex(tmp_path)
+
+    assert index.response(httpx.Request('GET', URL)).text == '<p>página</p>'
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+
+import fitz
+import pytest
+
+from batch import BatchAnalyzer, analyze_files, output_paths
+
+ANALYSIS = {
+    'titulo': 'Programa de hortas',
+    'resumo': 'Cria um programa municipal de hortas comunitárias.',
+    'mudancas': [
+        {
+            'texto_simplificado': 'Cria o programa.',
+            'trechos_originais': ['Fica instituído o programa'],
+        },
+    ],
+    'justificativas': [
+        {
+            'texto_simplificado': 'Segundo o autor, melhora a alimentação.',
+            'trechos_originais': ['Fica instituído o programa'],
+        },
+    ],
+    'categorias': [
+        {
+            'nome': 'Meio Ambiente',
+            'trechos_originais': ['Fica instituído o programa'],
+        },
+    ],
+}
+
+
+class Backend:
+    model = 'modelo-teste'
+
+    async def generate(self, text: str) -> dict:
+        return ANALYSIS
+
+    async def aclose(self) -> None:
+        pass
+
+
+def write_pdf(path, text: str = 'Art. 1º Fica instituído o programa municipal de hortas.'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with fitz.open() as doc:
+        doc.new_page().insert_text((72, 72), text)
+        doc.save(path)
+    return path
+
+
+def test_same_named_pdfs_keep_their_folders(tmp_path):
+    pdfs = tmp_path / 'pdfs'
+    first = write_pdf(pdfs / '101' / 'Projeto.pdf')
+    second = write_pdf(pdfs / '102' / 'Projeto.pdf')
+    single = write_pdf(tmp_path / 'avulso.pdf')
+
+    outputs = output_paths([pdfs, single], tmp_path / 'out')
+
+    assert outputs == {
+        first: tmp_path / 'out' / '101' / 'Projeto.json',
+        second: tmp_path / 'out' / '102' / 'Projeto.json',
+        single: tmp_path / 'out' / 'avulso.json',
+    }
+
+
+def test_clashing_outputs_are_rejected(tmp_path):
+    first = write_pdf(tmp_path / '101' / 'Projeto.pdf')
+    second = write_pdf(tmp_path / '102' / 'Projeto.pdf')
+
+    with pytest.raises(ValueError, match='Projeto.json'):
+        output_paths([first, second], tmp_path / 'out')
+
+
+def test_analyze_files_writes_one_result_per_pdf(tmp_path):
+    pdfs = tmp_path / 'pdfs'
+    write_pdf(pdfs / '101' / 'Projeto.pdf')
+    write_pdf(pdfs / '102' / 'Projeto.pdf')
+
+    ok, failed = asyncio.run(analyze_files(BatchAnalyzer(Backend()), [pdfs], tmp_path / 'out'))
+
+    assert (ok, failed) == (2, 0)
+    for folder in ('101', '102'):
+        result = json.loads((tmp_path / 'out' / folder / 'Projeto.json').read_text())
+        assert result['titulo'] == ANALYSIS['titulo']
+
+
+def test_callbacks_run_off_the_event_loop(tmp_path):
+    pdfs = [write_pdf(tmp_path / f'{n}.pdf') for n in range(3)]
+    threads = []
+
+    def reuse(key, text):
+        threads.append(threading.current_thread())
+        return key == 0
+
+    def on_result(key, result):
+        threads.append(threading.current_thread())
+
+    ok, failed = asyncio.run(
+        BatchAnalyzer(Backend()).run(
+            ((n, str(pdf)) for n, pdf in enumerate(pdfs)),
+            on_result,
+            use_cache=False,
+            reuse=reuse,
+        ),
+    )
+
+    assert (ok, failed) == (3, 0)
+    # One reuse check per file, and a result for each file not reused
+    assert len(threads) == 5
+    # A single writer thread, so callbacks never run at the same time
+    assert len(set(threads)) == 1
+    assert threads[0] is not threading.main_thread()
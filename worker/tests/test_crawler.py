@@ -0,0 +1,192 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from crawler import AsyncCrawler
+from http_cache import HttpCache
+from schemas import TipoProjeto
+
+
+class Listing:
+    """Stand-in for the listing pages: `pages` pages of two links each."""
+
+    def __init__(self, pages: int, failing: dict[int, int] | None = None) -> None:
+        self.pages = pages
+        # Page -> number of reads that fail before it loads
+        self.failing = failing or {}
+        self.reads: list[int] = []
+
+    async def __call__(self, page: int, tipo: TipoProjeto):
+        self.reads.append(page)
+        if self.failing.get(page):
+            self.failing[page] -= 1
+            raise ConnectionError(f'page {page}')
+        if page > self.pages:
+            return None, None
+        items = [(f'https://example.org/processos/{page}{i}', None) for i in range(2)]
+        return items, self.pages
+
+
+def discover(listing: Listing, max_pages: int | None) -> list[str]:
+    crawler = AsyncCrawler(SimpleNamespace(processed_links=set()), backoff=0)
+    found: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def run() -> None:
+        # Replaces the retrying HTTP read, so retries are tested separately
+        crawler._get_page_items = listing
+        await crawler._discover_type(TipoProjeto.PLL, max_pages, found)
+        await crawler.aclose()
+
+    asyncio.run(run())
+    links = []
+    while not found.empty():
+        links.append(found.get_nowait())
+    return links
+
+
+@pytest.mark.parametrize('max_pages', [1, 2, 4])
+def test_discover_stops_at_max_pages(max_pages):
+    listing = Listing(pages=5)
+
+    links = discover(listing, max_pages)
+
+    assert sorted(listing.reads) == list(range(1, max_pages + 1))
+    assert len(links) == 2 * max_pages
+
+
+def test_discover_reads_every_page_without_max_pages():
+    listing = Listing(pages=5)
+
+    links = discover(listing, None)
+
+    assert sorted(listing.reads) == [1, 2, 3, 4, 5]
+    assert len(links) == 10
+
+
+def test_discover_skips_a_failed_page():
+    listing = Listing(pages=4, failing={2: 1})
+
+    links = discover(listing, None)
+
+    assert sorted(listing.reads) == [1, 2, 3, 4]
+    assert len(links) == 6
+
+
+def test_get_page_items_retries_then_raises(monkeypatch):
+    crawler = AsyncCrawler(
+        SimpleNamespace(base_url='https://example.org', _listing_params=lambda page, tipo: {}),
+        max_attempts=3,
+        backoff=0,
+    )
+    calls = []
+
+    async def get_soup(url, params=None, parse_only=None):
+        calls.append(url)
+        raise ConnectionError(url)
+
+    monkeypatch.setattr(crawler, '_get_soup', get_soup)
+
+    async def run() -> None:
+        try:
+            await crawler._get_page_items(1, TipoProjeto.PLL)
+        finally:
+            await crawler.aclose()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+    assert len(calls) == 3
+
+
+def test_get_page_items_recovers_after_a_failure(monkeypatch):
+    scraper = SimpleNamespace(
+        base_url='https://example.org',
+        _listing_params=lambda page, tipo: {},
+        _extract_page_items=lambda soup, tipo: [('link', None)],
+        _extract_page_count=lambda soup: 3,
+    )
+    crawler = AsyncCrawler(scraper, backoff=0)
+    calls = []
+
+    async def get_soup(url, params=None, parse_only=None):
+        calls.append(url)
+        if len(calls) == 1:
+            raise ConnectionError(url)
+        return 'soup'
+
+    monkeypatch.setattr(crawler, '_get_soup', get_soup)
+
+    async def run():
+        try:
+            return await crawler._get_page_items(1, TipoProjeto.PLL)
+        finally:
+            await crawler.aclose()
+
+    assert asyncio.run(run()) == ([('link', None)], 3)
+    assert len(calls) == 2
+
+
+def test_project_is_saved_off_the_event_loop(monkeypatch):
+    threads = {}
+    scraper = SimpleNamespace(
+        processed_links=set(),
+        _extract_project=lambda url, soup: {'url': url, 'tab_urls': {}, 'files': []},
+        save_project_to_db=lambda data, on_saved: threads.update(save=threading.current_thread()),
+    )
+    crawler = AsyncCrawler(scraper)
+
+    async def get(url, params=None, *, store=True, conditional=True):
+        threads['loop'] = threading.current_thread()
+        return httpx.Response(200, text='<html></html>')
+
+    monkeypatch.setattr(crawler, '_get', get)
+
+    async def run() -> None:
+        try:
+            await crawler.process_project('https://example.org/processos/1')
+        finally:
+            await crawler.aclose()
+
+    asyncio.run(run())
+    assert threads['save'] is not threads['loop']
+    assert threads['save'].name.startswith('crawler-db')
+
+
+def test_get_refetches_when_the_cached_body_is_gone(tmp_path):
+    http_cache = HttpCache(tmp_path)
+    crawler = AsyncCrawler(SimpleNamespace(http_cache=http_cache, archive=None))
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if 'if-none-match' in request.headers:
+            return httpx.Response(304)
+        return httpx.Response(200, headers={'etag': '"v2"'}, text='<p>v2</p>')
+
+    async def run() -> httpx.Response:
+        await crawler.client.aclose()
+        crawler.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await crawler._get('https://example.org/processos/1')
+        finally:
+            await crawler.aclose()
+
+    http_cache.store(
+        httpx.Response(
+            200,
+            headers={'etag': '"v1"'},
+            text='<p>v1</p>',
+            request=httpx.Request('GET', 'https://example.org/processos/1'),
+        ),
+    )
+    http_cache._paths('https://example.org/processos/1')[1].unlink()
+
+    resp = asyncio.run(run())
+
+    assert resp.text == '<p>v2</p>'
+    assert [r.headers.get('if-none-match') for r in requests] == ['"v1"', None]
+    assert http_cache.conditional_headers('https://example.org/processos/1') == {
+        'If-None-Match': '"v2"',
+    }
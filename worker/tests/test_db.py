@@ -0,0 +1,57 @@
+import zlib
+
+from db import connect, migrate
+from search import search
+from text_cache import PAGE_SEPARATOR
+
+
+def test_search_index_is_backfilled_on_upgrade(db_path):
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(
+            'INSERT INTO projetos (id, id_externo, ementa) VALUES (?, ?, ?)',
+            [(1, 101, 'Denomina rua no bairro Centro'), (2, 102, 'Institui o dia do ciclista')],
+        )
+        conn.execute(
+            """
+            INSERT INTO analises_ia (projeto_id, titulo_simplificado, resumo_simples)
+            VALUES (2, 'Dia do ciclista', 'Cria uma data comemorativa')
+            """,
+        )
+        conn.execute(
+            'INSERT INTO documentos (projeto_id, url, principal, sha256) VALUES (1, ?, 1, ?)',
+            ('https://example.org/1.pdf', 'abc'),
+        )
+        conn.executemany(
+            'INSERT INTO textos_pdf (sha256, pagina, texto) VALUES (?, ?, ?)',
+            [
+                ('abc', 2, zlib.compress('segunda página sobre calçadas'.encode())),
+                ('abc', 1, zlib.compress('primeira página'.encode())),
+            ],
+        )
+        # As a database from before the search index: rows the triggers never saw
+        conn.execute('DELETE FROM busca_projetos')
+        conn.execute('DELETE FROM schema_version WHERE versao = 11')
+
+    assert migrate(conn, batch_size=1) == [11]
+
+    assert [r.id_externo for r in search(conn, 'ciclista')] == [102]
+    assert [r.id_externo for r in search(conn, 'calcadas')] == [101]
+    texto = conn.execute('SELECT texto FROM busca_projetos WHERE rowid = 1').fetchone()[0]
+    assert texto == f'primeira página{PAGE_SEPARATOR}segunda página sobre calçadas'
+    assert conn.execute(
+        'SELECT backfill_pendente FROM schema_version WHERE versao = 11',
+    ).fetchone() == (0,)
+    conn.close()
+
+
+def test_migrations_are_idempotent(db_path):
+    conn = connect(db_path)
+    versions = [row[0] for row in conn.execute('SELECT versao FROM schema_version')]
+
+    assert migrate(conn) == []
+    assert versions == sorted(versions)
+    assert {'tarefas', 'textos_pdf', 'cache_llm', 'trechos_localizacao', 'busca_projetos'} <= {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    conn.close()
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import fitz
+import pytest
+
+from evidence import locate_quotes
+
+EXAMPLE_PDF = Path(__file__).parents[2] / 'web' / 'static' / 'pl_example.pdf'
+
+
+@pytest.mark.parametrize(
+    'pages',
+    [
+        ['Art. 1º Fica instituído\no programa\n', 'municipal de hortas.\n'],
+        # Without the trailing line break PyMuPDF usually leaves
+        ['Art. 1º Fica instituído\no programa', 'municipal de hortas.'],
+    ],
+)
+def test_quote_across_a_page_break(pages):
+    start = pages[0].index('o programa')
+
+    assert locate_quotes(pages, ['o programa municipal']) == [
+        [[(1, start, start + len('o programa')), (2, 0, len('municipal'))]],
+    ]
+
+
+def test_quote_ignores_case_hyphenation_and_line_breaks():
+    pages = ['O trans-\nporte  COLETIVO\né gratuito.\n']
+
+    assert locate_quotes(pages, ['“o transporte coletivo”', 'não consta']) == [
+        [[(1, 0, len(pages[0]) - len('\né gratuito.\n'))]],
+        [],
+    ]
+
+
+def test_quote_across_pages_of_a_real_pdf():
+    with fitz.open(EXAMPLE_PDF) as doc:
+        pages = [page.get_text() for page in doc]
+    quote = (
+        '104/24 Determina o fornecimento gratuito de água potável a clientes e '
+        'frequentadores dos locais que'
+    )
+
+    [[segments]] = locate_quotes(pages, [quote])
+
+    assert [page for page, *_ in segments] == [1, 2]
+    (_, start, end), (_, next_start, next_end) = segments
+    assert pages[0][start:end].startswith('104/24')
+    assert pages[1][next_start:next_end] == 'clientes e frequentadores dos locais que'
@@ -0,0 +1,125 @@
+import json
+from datetime import date
+
+import pytest
+
+from db import connect
+from export import MANIFEST_FILE, SnapshotExporter
+from schemas import TipoProjeto
+from writer import ProjectWriter, ProjetoRow
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+
+def projeto(id_externo: int, **changes) -> ProjetoRow:
+    fields = {
+        'id_externo': id_externo,
+        'numero_processo': f'{id_externo:05}/25',
+        'tipo': TipoProjeto.PLL,
+        'ementa': f'Ementa do projeto {id_externo}',
+        'data_abertura': date(2025, 1, id_externo),
+        'situacao_tramitacao': 'Em tramitação',
+        'situacao_plenaria': None,
+        'link_pdf_principal': None,
+        'data_ultima_tramitacao': None,
+        'autores': ['ANA'],
+    }
+    return ProjetoRow(**(fields | changes))
+
+
+def save(conn, *rows: ProjetoRow) -> None:
+    writer = ProjectWriter(conn)
+    for row in rows:
+        writer.add(row)
+    assert writer.flush()
+
+
+def export(conn, out_dir) -> tuple[int, int]:
+    return SnapshotExporter(conn, out_dir, page_size=2).export()
+
+
+def snapshot(out_dir) -> dict[str, object]:
+    return {
+        str(path.relative_to(out_dir)): json.loads(path.read_text(encoding='utf-8'))
+        for path in out_dir.rglob('*.json')
+        if path.name != MANIFEST_FILE
+    }
+
+
+@pytest.fixture
+def exported(conn, tmp_path):
+    # Listed newest first: pages [5, 4], [3, 2], [1]
+    save(conn, *(projeto(i) for i in range(1, 6)))
+    out_dir = tmp_path / 'export'
+    assert export(conn, out_dir) == (9, 0)
+    return out_dir
+
+
+def test_unchanged_catalog_writes_nothing(conn, exported):
+    assert export(conn, exported) == (0, 0)
+
+
+def test_resaving_unchanged_projects_writes_nothing(conn, exported):
+    save(conn, *(projeto(i) for i in range(1, 6)))
+
+    assert export(conn, exported) == (0, 0)
+
+
+def test_changed_project_rewrites_its_detail_and_page(conn, exported):
+    save(conn, projeto(3, ementa='Nova ementa'))
+    # Only its detail file changes: the ementa isn't in the listing
+    assert export(conn, exported) == (1, 0)
+
+    save(conn, projeto(3, autores=['BRUNO']))
+    assert export(conn, exported) == (2, 0)
+    assert snapshot(exported)['listagem/2.json'][0]['autores'] == ['BRUNO']
+
+
+def test_new_project_shifts_the_pages_after_it(conn, exported):
+    save(conn, projeto(6))
+
+    # Its detail file, every page and the index
+    assert export(conn, exported) == (5, 0)
+
+
+def test_removed_project_files_are_removed(conn, exported):
+    with conn:
+        conn.execute('DELETE FROM projetos WHERE id_externo = 1')
+
+    # The index changes; page 3 and the project's detail file are gone
+    assert export(conn, exported) == (1, 2)
+    assert not (exported / 'projetos/1.json').exists()
+    assert not (exported / 'listagem/3.json.gz').exists()
+
+
+def test_incremental_export_matches_a_full_one(conn, exported, tmp_path):
+    save(conn, projeto(2, autores=['BRUNO']), projeto(6))
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO tramitacoes (projeto_id, setor, data_chegada, situacao)
+            SELECT id, 'CCJ', '2025-02-01', 'Em análise' FROM projetos WHERE id_externo = 4
+            """,
+        )
+        conn.execute('DELETE FROM projetos WHERE id_externo = 5')
+    export(conn, exported)
+
+    full = tmp_path / 'full'
+    export(conn, full)
+
+    assert snapshot(exported) == snapshot(full)
+
+
+def test_manifest_from_before_versions_exports_everything(conn, exported):
+    manifest_path = exported / MANIFEST_FILE
+    files = json.loads(manifest_path.read_text(encoding='utf-8'))['arquivos']
+    manifest_path.write_text(json.dumps(files), encoding='utf-8')
+    (exported / 'projetos/2.json').unlink()
+
+    # Everything is rebuilt, but only the missing file is rewritten
+    assert export(conn, exported) == (1, 0)
@@ -0,0 +1,46 @@
+import httpx
+
+from http_cache import HttpCache
+
+URL = 'https://example.org/processos/1'
+
+
+def response(status_code: int, text: str = '') -> httpx.Response:
+    return httpx.Response(
+        status_code,
+        headers={'content-type': 'text/html', 'etag': '"v1"'},
+        text=text,
+        request=httpx.Request('GET', f'{URL}?_=123'),
+    )
+
+
+def test_not_modified_is_served_from_the_cache(tmp_path):
+    cache = HttpCache(tmp_path)
+    cache.resolve(response(200, '<p>v1</p>'))
+
+    resp = cache.resolve(response(304))
+
+    assert resp.status_code == 200
+    assert resp.text == '<p>v1</p>'
+    assert resp.extensions['not_modified']
+
+
+def test_not_modified_without_cached_body_drops_the_entry(tmp_path):
+    cache = HttpCache(tmp_path)
+    cache.resolve(response(200, '<p>v1</p>'))
+    meta_path, body_path = cache._paths(URL)
+    body_path.unlink()
+
+    assert cache.resolve(response(304)) is None
+    assert not meta_path.exists()
+    assert cache.conditional_headers(URL) == {}
+
+
+def test_not_modified_without_cached_meta_drops_the_entry(tmp_path):
+    cache = HttpCache(tmp_path)
+    cache.resolve(response(200, '<p>v1</p>'))
+    meta_path, body_path = cache._paths(URL)
+    meta_path.write_text('{', encoding='utf-8')
+
+    assert cache.resolve(response(304)) is None
+    assert not body_path.exists()
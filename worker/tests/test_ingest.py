@@ -0,0 +1,62 @@
+import pytest
+
+from db import connect
+from ingest import ingest_analysis
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO projetos (id, id_externo, tipo) VALUES (1, 101, 'PLL')")
+    yield conn
+    conn.close()
+
+
+def resultado(**changes) -> dict:
+    fields = {
+        'titulo': 'Denominação de rua',
+        'resumo': 'Dá o nome de Maria da Silva à Rua Quatro.',
+        'mudancas': [
+            {
+                'texto_simplificado': 'A Rua Quatro passa a se chamar Rua Maria da Silva.',
+                'trechos_originais': ['Fica denominado Rua Maria da Silva'],
+            },
+        ],
+        'justificativas': [
+            {
+                'texto_simplificado': 'Homenageia uma moradora do bairro.',
+                'trechos_originais': ['moradora do bairro'],
+            },
+        ],
+        'categorias': [{'nome': 'Homenagens e Festividades', 'trechos_originais': []}],
+    }
+    return fields | changes
+
+
+def quarantined(conn) -> int:
+    return conn.execute("SELECT COUNT(*) FROM quarentena WHERE origem = 'analise'").fetchone()[0]
+
+
+@pytest.mark.parametrize(
+    'changes',
+    [
+        {'justificativas': []},
+        {
+            'justificativas': [
+                {'texto_simplificado': 'Homenageia uma moradora.', 'trechos_originais': []},
+            ],
+        },
+    ],
+)
+def test_analysis_without_justification_or_quotes_is_saved(conn, changes):
+    analise_id = ingest_analysis(conn, 1, 'modelo', resultado(**changes))
+
+    assert analise_id is not None
+    assert quarantined(conn) == 0
+
+
+@pytest.mark.parametrize('field', ['mudancas', 'categorias'])
+def test_analysis_without_changes_or_categories_is_quarantined(conn, field):
+    assert ingest_analysis(conn, 1, 'modelo', resultado(**{field: []})) is None
+    assert quarantined(conn) == 1
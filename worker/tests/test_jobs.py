@@ -0,0 +1,133 @@
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(db_path, clock):
+    queue = JobQueue(db_path, lease_seconds=60)
+    yield queue
+    queue.close()
+
+
+def status(queue: JobQueue, chave: str) -> tuple:
+    return queue.conn.execute(
+        'SELECT status, tentativas, disponivel_em, ultimo_erro FROM tarefas WHERE chave = ?',
+        (chave,),
+    ).fetchone()
+
+
+def test_lease_takes_each_job_once(queue):
+    queue.enqueue('fetch', 'a', {'url': 'a'})
+    queue.enqueue('fetch', 'b', {'url': 'b'})
+
+    first, second = queue.lease('fetch'), queue.lease('fetch')
+
+    assert {first.chave, second.chave} == {'a', 'b'}
+    assert first.payload == {'url': first.chave}
+    assert first.tentativas == 1
+    assert queue.lease('fetch') is None
+    assert queue.lease('download') is None
+
+
+def test_expired_lease_is_taken_again(queue, clock):
+    queue.enqueue('fetch', 'a')
+    job = queue.lease('fetch')
+
+    clock.now += 59
+    assert queue.lease('fetch') is None
+
+    clock.now += 2
+    again = queue.lease('fetch')
+    assert again.id == job.id
+    assert again.tentativas == 2
+
+
+def test_complete(queue):
+    queue.enqueue('fetch', 'a')
+    queue.complete(queue.lease('fetch'))
+
+    assert status(queue, 'a')[0] == 'done'
+    assert queue.lease('fetch') is None
+    assert queue.counts() == {'fetch': {'done': 1}}
+
+
+def test_enqueue_leaves_existing_jobs_alone(queue):
+    queue.enqueue('fetch', 'a', {'v': 1})
+    queue.complete(queue.lease('fetch'))
+
+    queue.enqueue('fetch', 'a', {'v': 2})
+
+    assert status(queue, 'a')[0] == 'done'
+    assert queue.lease('fetch') is None
+
+
+def test_requeue_resets_a_finished_job(queue, clock):
+    queue.enqueue('fetch', 'a', {'v': 1})
+    job = queue.lease('fetch')
+    queue.fail(job, 'boom', max_attempts=1, backoff=1)
+    assert status(queue, 'a')[0] == 'failed'
+
+    queue.enqueue('fetch', 'a', {'v': 2}, requeue=True)
+
+    assert status(queue, 'a') == ('pending', 0, clock.now, None)
+    job = queue.lease('fetch')
+    assert job.payload == {'v': 2}
+    assert job.tentativas == 1
+
+
+def test_requeue_leaves_running_jobs_alone(queue):
+    queue.enqueue('fetch', 'a', {'v': 1})
+    job = queue.lease('fetch')
+
+    queue.enqueue('fetch', 'a', {'v': 2}, requeue=True)
+
+    assert status(queue, 'a')[:2] == ('running', 1)
+    queue.complete(job)
+    assert status(queue, 'a')[0] == 'done'
+
+
+def test_fail_backs_off_exponentially(queue, clock):
+    queue.enqueue('fetch', 'a')
+    start = clock.now
+
+    for attempt in range(1, 4):
+        job = queue.lease('fetch')
+        assert job.tentativas == attempt
+        queue.fail(job, 'boom', max_attempts=5, backoff=10)
+        delay = 10 * 2 ** (attempt - 1)
+        assert status(queue, 'a') == ('pending', attempt, clock.now + delay, 'boom')
+
+        clock.now += delay - 1
+        assert queue.lease('fetch') is None
+        clock.now += 1
+
+    assert clock.now == start + 10 + 20 + 40
+
+
+def test_fail_gives_up_after_max_attempts(queue):
+    queue.enqueue('fetch', 'a')
+    for _ in range(2):
+        queue.fail(queue.lease('fetch'), 'boom', max_attempts=3, backoff=0)
+
+    queue.fail(queue.lease('fetch'), 'boom', max_attempts=3, backoff=0)
+
+    assert status(queue, 'a')[:2] == ('failed', 3)
+    assert queue.lease('fetch') is None
+    assert queue.counts() == {'fetch': {'failed': 1}}
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+
+from jobs import JobQueue
+from pipeline import Pipeline
+from schemas import TipoProjeto
+
+
+class Listing:
+    """Stand-in scraper for the discover stage: `pages` pages of one link each."""
+
+    def __init__(self, pages: int) -> None:
+        self.pages = pages
+        self.processed_links: set[str] = set()
+
+    def _get_listing(self, page, tipo):
+        return page
+
+    def _extract_page_items(self, page, tipo):
+        return [(f'https://example.org/processos/{page}', None)]
+
+    def _extract_page_count(self, page):
+        return self.pages
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def queue(db_path):
+    queue = JobQueue(db_path)
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def make_pipeline():
+    pipelines = []
+
+    def make(queue: JobQueue, pages: int) -> Pipeline:
+        pipeline = Pipeline(queue, use_llm_cache=False)
+        pipeline._local.scraper = Listing(pages)
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.downloader.close()
+        pipeline.text_cache.close()
+
+
+def drain_discover(pipeline: Pipeline) -> None:
+    while job := pipeline.queue.lease('discover'):
+        pipeline._discover(job)
+        pipeline.queue.complete(job)
+
+
+def keys(queue: JobQueue, etapa: str) -> list[str]:
+    return sorted(
+        row[0]
+        for row in queue.conn.execute('SELECT chave FROM tarefas WHERE etapa = ?', (etapa,))
+    )
+
+
+def test_discover_stops_at_max_pages(queue, make_pipeline):
+    pipeline = make_pipeline(queue, pages=5)
+
+    pipeline.seed(2, [TipoProjeto.PLL])
+    drain_discover(pipeline)
+
+    assert keys(queue, 'discover') == ['PLL:1', 'PLL:2']
+    assert len(keys(queue, 'fetch')) == 2
+
+
+def test_resumed_run_keeps_max_pages(queue, make_pipeline):
+    # Seeded with --pages 3, then interrupted before any page was read
+    make_pipeline(queue, pages=10).seed(3, [TipoProjeto.PLL])
+
+    # A restart with --no-seed: this pipeline never learns the cap but from the queue
+    resumed = make_pipeline(queue, pages=10)
+    drain_discover(resumed)
+
+    assert keys(queue, 'discover') == ['PLL:1', 'PLL:2', 'PLL:3']
+    assert keys(queue, 'fetch') == [f'https://example.org/processos/{page}' for page in (1, 2, 3)]
+
+
+def test_resumed_run_keeps_max_pages_in_sync_mode(queue, make_pipeline):
+    pipeline = make_pipeline(queue, pages=10)
+    pipeline.seed(2, [TipoProjeto.PLL])
+
+    resumed = make_pipeline(queue, pages=10)
+    resumed.sync = True
+    resumed._local.scraper._select_changed = lambda items: [link for link, _ in items]
+    drain_discover(resumed)
+
+    assert keys(queue, 'discover') == ['PLL:1', 'PLL:2']
+
+
+def test_discover_without_max_pages(queue, make_pipeline):
+    pipeline = make_pipeline(queue, pages=4)
+
+    pipeline.seed(None, [TipoProjeto.PLL])
+    drain_discover(pipeline)
+
+    assert keys(queue, 'discover') == ['PLL:1', 'PLL:2', 'PLL:3', 'PLL:4']
@@ -0,0 +1,177 @@
+import asyncio
+
+import fitz
+import pytest
+
+import similarity
+from batch import BatchAnalyzer, analyze_backlog
+from db import connect
+from ingest import ingest_analysis
+from similarity import REUSE_THRESHOLD, index_project, reusable_analysis, signature
+from text_cache import PageTextCache, file_sha256
+
+MODEL = 'modelo-teste'
+
+STREET_BILL = """PROJETO DE LEI DO LEGISLATIVO
+Denomina Rua {nome} o logradouro público cadastrado conhecido como Rua Quatro, localizado no
+Bairro Restinga.
+Art. 1º Fica denominado Rua {nome} o logradouro público cadastrado conhecido como Rua Quatro,
+localizado no Bairro Restinga.
+Art. 2º Esta Lei entra em vigor na data de sua publicação.
+EXPOSIÇÃO DE MOTIVOS
+O presente Projeto de Lei tem por objetivo homenagear {nome}, {bio}, denominando o logradouro
+em que viveu por mais de trinta anos.
+Atendidos os requisitos da Lei Complementar nº 320, de 2 de maio de 1994, contamos com o apoio
+dos nobres colegas para a aprovação deste Projeto de Lei.
+"""
+MARIA = STREET_BILL.format(
+    nome='Maria da Silva Pereira',
+    bio='líder comunitária e fundadora da associação de moradores do bairro',
+)
+JOAO = STREET_BILL.format(
+    nome='João Carlos Fernandes',
+    bio='professor da rede municipal e fundador do clube de mães do bairro',
+)
+# Re-filed with a wording fix only
+MARIA_REFILED = MARIA.replace('nobres colegas', 'nobres Vereadores')
+
+ANALYSIS = {
+    'titulo': 'Rua Maria da Silva Pereira na Restinga',
+    'resumo': 'Dá o nome de Maria da Silva Pereira a uma rua da Restinga.',
+    'mudancas': [
+        {
+            'texto_simplificado': 'A Rua Quatro passa a se chamar Rua Maria da Silva Pereira.',
+            'trechos_originais': ['Fica denominado Rua Maria da Silva Pereira o logradouro'],
+        },
+    ],
+    'justificativas': [
+        {
+            'texto_simplificado': 'Homenageia uma líder comunitária do bairro.',
+            'trechos_originais': ['homenagear Maria da Silva Pereira'],
+        },
+    ],
+    'categorias': [
+        {
+            'nome': 'Urbanismo e Infraestrutura',
+            'trechos_originais': ['Denomina Rua Maria da Silva Pereira o logradouro'],
+        },
+    ],
+}
+
+
+def estimate(first: str, second: str) -> float:
+    return similarity.similarity(signature(first), signature(second))
+
+
+def test_reuse_threshold():
+    # Tuning this changes which projects show another project's titulo/resumo
+    assert REUSE_THRESHOLD == 0.9
+
+
+def test_refiled_bill_is_above_reuse_threshold():
+    assert estimate(MARIA, MARIA_REFILED) >= REUSE_THRESHOLD
+
+
+def test_bills_differing_in_honoree_are_below_reuse_threshold():
+    assert estimate(MARIA, JOAO) < REUSE_THRESHOLD
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(
+            'INSERT INTO projetos (id, id_externo, link_pdf_principal) VALUES (?, ?, ?)',
+            [(1, 101, '1.pdf'), (2, 102, '2.pdf'), (3, 103, '3.pdf')],
+        )
+    yield conn
+    conn.close()
+
+
+def analyzed(conn, projeto_id: int, text: str) -> int:
+    index_project(conn, projeto_id, f'sha-{projeto_id}', text)
+    return ingest_analysis(conn, projeto_id, MODEL, ANALYSIS)
+
+
+def test_refiled_bill_reuses_analysis(conn):
+    origem = analyzed(conn, 1, MARIA)
+
+    similares = index_project(conn, 2, 'sha-2', MARIA_REFILED)
+    reused = reusable_analysis(conn, similares, MODEL, MARIA_REFILED)
+
+    assert reused is not None
+    assert reused[0] == origem
+    assert reused[1]['titulo'] == ANALYSIS['titulo']
+
+
+def test_bill_differing_in_honoree_does_not_reuse_analysis(conn):
+    analyzed(conn, 1, MARIA)
+
+    similares = index_project(conn, 2, 'sha-2', JOAO)
+
+    assert reusable_analysis(conn, similares, MODEL, JOAO) is None
+
+
+def test_analysis_of_another_model_is_not_reused(conn):
+    analyzed(conn, 1, MARIA)
+
+    similares = index_project(conn, 2, 'sha-2', MARIA_REFILED)
+
+    assert reusable_analysis(conn, similares, 'outro-modelo', MARIA_REFILED) is None
+
+
+class Backend:
+    model = MODEL
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+
+    async def generate(self, text: str) -> dict:
+        self.texts.append(text)
+        return ANALYSIS
+
+    async def aclose(self) -> None:
+        pass
+
+
+@pytest.fixture
+def text_cache(conn, db_path):
+    text_cache = PageTextCache(db_path)
+    for projeto_id, text in ((1, MARIA), (2, MARIA_REFILED), (3, JOAO)):
+        path = db_path.parent / f'{projeto_id}.pdf'
+        with fitz.open() as doc:
+            doc.new_page().insert_textbox(fitz.Rect(36, 36, 576, 756), text, fontsize=9)
+            doc.save(path)
+        # The text as written, rather than as extracted with the PDF's line breaks
+        text_cache.put(file_sha256(path), [text])
+    yield text_cache
+    text_cache.close()
+
+
+def test_backlog_reuses_near_identical_analysis(db_path, conn, text_cache):
+    origem = analyzed(conn, 1, MARIA)
+    backend = Backend()
+    analyzer = BatchAnalyzer(backend, text_cache=text_cache)
+
+    ok, failed = asyncio.run(analyze_backlog(analyzer, db_path, None, use_cache=False))
+
+    assert (ok, failed) == (2, 0)
+    assert backend.texts == [JOAO.strip()]
+    rows = dict(conn.execute('SELECT projeto_id, reaproveitada_de FROM analises_ia'))
+    assert rows == {1: None, 2: origem, 3: None}
+
+
+def test_backlog_without_reuse_calls_the_model(db_path, conn, text_cache):
+    analyzed(conn, 1, MARIA)
+    backend = Backend()
+    analyzer = BatchAnalyzer(backend, text_cache=text_cache)
+
+    ok, failed = asyncio.run(
+        analyze_backlog(analyzer, db_path, None, use_cache=False, reuse_threshold=None),
+    )
+
+    assert (ok, failed) == (2, 0)
+    assert sorted(backend.texts) == sorted([MARIA_REFILED.strip(), JOAO.strip()])
+    assert conn.execute(
+        'SELECT COUNT(*) FROM analises_ia WHERE reaproveitada_de IS NOT NULL',
+    ).fetchone() == (0,)
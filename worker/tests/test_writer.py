@@ -0,0 +1,130 @@
+from datetime import date
+
+import pytest
+
+from db import connect
+from schemas import TipoProjeto
+from writer import DocumentoRow, ProjectWriter, ProjetoRow
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+
+def projeto(**changes) -> ProjetoRow:
+    fields = {
+        'id_externo': 101,
+        'numero_processo': '00123/25',
+        'tipo': TipoProjeto.PLL,
+        'ementa': 'Denomina Rua Maria da Silva o logradouro conhecido como Rua Quatro',
+        'data_abertura': date(2025, 3, 10),
+        'situacao_tramitacao': 'Em tramitação',
+        'situacao_plenaria': None,
+        'link_pdf_principal': None,
+        'data_ultima_tramitacao': date(2025, 4, 2),
+        'autores': ['ANA', 'BRUNO'],
+        'documentos': [
+            DocumentoRow('https://example.org/1.pdf', 'Projeto', principal=True, sha256='aaa'),
+            DocumentoRow('https://example.org/2.pdf', 'Parecer'),
+        ],
+    }
+    return ProjetoRow(**(fields | changes))
+
+
+def save(conn, *rows: ProjetoRow) -> list[int]:
+    writer = ProjectWriter(conn)
+    saved = []
+    for row in rows:
+        writer.add(row, lambda id_externo=row.id_externo: saved.append(id_externo))
+    assert writer.flush()
+    return saved
+
+
+def autores(conn) -> set[str]:
+    return {
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT a.nome FROM projetos_autores pa
+            JOIN autores a ON a.id = pa.autor_id
+            JOIN projetos p ON p.id = pa.projeto_id
+            WHERE p.id_externo = 101
+            """,
+        )
+    }
+
+
+def test_resaving_a_changed_project(conn):
+    save(conn, projeto())
+
+    save(
+        conn,
+        projeto(
+            tipo=TipoProjeto.PLE,
+            ementa='Denomina Rua Maria da Silva Pereira o logradouro',
+            autores=['BRUNO', 'CARLA'],
+            documentos=[DocumentoRow('https://example.org/1.pdf', 'Projeto', principal=True)],
+        ),
+    )
+
+    assert conn.execute('SELECT tipo, ementa FROM projetos').fetchall() == [
+        ('PLE', 'Denomina Rua Maria da Silva Pereira o logradouro'),
+    ]
+    assert autores(conn) == {'BRUNO', 'CARLA'}
+    # The removed file is gone; the kept one keeps its blob
+    assert conn.execute('SELECT url, sha256 FROM documentos').fetchall() == [
+        ('https://example.org/1.pdf', 'aaa'),
+    ]
+    tipo, nomes = conn.execute('SELECT tipo, autores FROM projetos_listagem').fetchone()
+    assert tipo == 'PLE'
+    assert nomes == '["BRUNO","CARLA"]'
+
+
+def test_resaving_leaves_unchanged_authors_alone(conn):
+    save(conn, projeto())
+    conn.executescript(
+        """
+        CREATE TEMP TABLE escritas (operacao TEXT);
+        CREATE TEMP TRIGGER autores_insert AFTER INSERT ON projetos_autores
+        BEGIN INSERT INTO escritas VALUES ('insert'); END;
+        CREATE TEMP TRIGGER autores_delete AFTER DELETE ON projetos_autores
+        BEGIN INSERT INTO escritas VALUES ('delete'); END;
+        """,
+    )
+
+    save(conn, projeto())
+    assert conn.execute('SELECT operacao FROM escritas').fetchall() == []
+
+    save(conn, projeto(autores=['ANA', 'CARLA']))
+    assert sorted(conn.execute('SELECT operacao FROM escritas').fetchall()) == [
+        ('delete',),
+        ('insert',),
+    ]
+    assert autores(conn) == {'ANA', 'CARLA'}
+
+
+def test_invalid_row_goes_to_quarentena(conn):
+    saved = save(
+        conn,
+        projeto(),
+        projeto(id_externo=102, numero_processo='123/2025'),
+    )
+
+    assert saved == [101]
+    assert conn.execute('SELECT id_externo FROM projetos').fetchall() == [(101,)]
+    origem, chave, erros = conn.execute('SELECT origem, chave, erros FROM quarentena').fetchone()
+    assert (origem, chave) == ('projeto', '102')
+    assert 'numero_processo' in erros
+
+
+def test_valid_save_releases_quarantined_row(conn):
+    save(conn, projeto(numero_processo='bad'))
+    assert conn.execute('SELECT COUNT(*) FROM quarentena').fetchone() == (1,)
+
+    save(conn, projeto())
+
+    assert conn.execute('SELECT COUNT(*) FROM quarentena').fetchone() == (0,)
+    assert conn.execute('SELECT COUNT(*) FROM projetos').fetchone() == (1,)